@@ -0,0 +1,331 @@
+# actions_mirror.py
+# Local DuckDB mirror of dbo.bitcorr_daily_actions for the BitCorr analyzers (no Streamlit import).
+#
+# The analyzers used to re-query SQL Server on every cache miss and then filter / group the whole
+# pull in pandas. With the mirror, one embedded columnar file per (server, database) holds a copy of
+# the table, and the analyzers' filters, Buy×Sell heatmaps, groupbys and daily-winner picks run as
+# queries against it, so only the (small) result reaches pandas.
+#
+# Sync is incremental on a (user_id, et_date) watermark: the mirror keeps the row count and a content
+# fingerprint (CHECKSUM_AGG of BINARY_CHECKSUM over the row values) for each user and day. A sync
+# reads the source's per-day row counts (GROUP BY on the key columns of ix_bitcorr_actions_user_date,
+# so no base-table rows are read), and fingerprints only the days that can have changed unseen: days
+# at or after the watermark (the latest stored day), days whose count moved, and the date ranges of
+# bitcorr_run_log entries that ended since the previous sync (a --force rerun with other settings
+# keeps counts but changes values). The fingerprint query reads the base rows of those days only.
+# Days that are new or changed are re-pulled in runs of consecutive days via
+# bitcorr_actions.fetch_actions, and days that disappeared from the source are dropped.
+# sync(full=True), behind the analyzers' "Sync mirror now" button, fingerprints every day instead.
+#
+# Each process keeps one read-write connection per mirror file and runs every query on its own
+# cursor (DuckDB refuses a read-only and a read-write connection to one file in the same process).
+# Another process holding the file's lock raises MirrorUnavailable; the analyzers then fall back to
+# SQL Server.
+#
+#  - mirror_path():     mirror file for a server / database
+#  - connection():      this process's shared connection to a mirror file
+#  - sync():            bring one user's rows up to date (full=True: fingerprint every day)
+#  - action_filter():   the analyzers' sidebar filters as one dict (pushed down as a WHERE clause)
+#  - load_actions():    filtered rows, typed like bitcorr_actions.fetch_actions
+#  - heatmap():         mean day_return pivot (buy_pct rows × sell_pct columns)
+#  - group_stats():     GROUP BY keys with pandas-style named aggregations
+#  - daily_winners():   best row per (symbol, session, et_date)
+#  - date_bounds() / distinct_values() / mirror_status(): sidebar metadata
+#
+# Environment:
+#   BITCORR_MIRROR_DIR   folder for the mirror files (default: ~/.bitcorr_mirror)
+
+import os
+import re
+import threading
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except Exception:
+    duckdb = None
+
+from bitcorr_actions import CATEGORY_COLUMNS, INT16_COLUMNS, KEY_FLOAT_COLUMNS, column_dtype, fetch_actions
+from bitcorr_builder import ACTION_COLUMNS
+
+RUN_DAYS = 31  # source days fetched per pull (bounds the frame held in memory during a sync)
+
+def available() -> bool:
+    return duckdb is not None
+
+def mirror_path(server: str, db: str) -> str:
+    root = Path(os.environ.get("BITCORR_MIRROR_DIR") or Path.home() / ".bitcorr_mirror")
+    root.mkdir(parents=True, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{server}__{db}").strip("_") or "default"
+    return str(root / f"{name}.duckdb")
+
+# ---------------- Schema ----------------
+def _sql_type(name: str) -> str:
+    if name in CATEGORY_COLUMNS:
+        return "VARCHAR"
+    if name == "et_date":
+        return "DATE"
+    if name in KEY_FLOAT_COLUMNS:
+        return "DOUBLE"
+    if name in INT16_COLUMNS:
+        return "SMALLINT"
+    return "REAL"
+
+SCHEMA_SQL = (
+    "CREATE TABLE IF NOT EXISTS actions ("
+    + ", ".join(f"{c} {_sql_type(c)}" for c in ACTION_COLUMNS)
+    + ");\n"
+    "CREATE TABLE IF NOT EXISTS day_counts (user_id VARCHAR, et_date DATE, n BIGINT, synced_utc TIMESTAMP, "
+    "fp BIGINT, PRIMARY KEY (user_id, et_date));\n"
+    # Mirrors created before the fingerprint column: NULL fingerprints re-pull a day once it is checked
+    "ALTER TABLE day_counts ADD COLUMN IF NOT EXISTS fp BIGINT;\n"
+    # start time of each user's last completed sync (run log entries ending later are checked)
+    "CREATE TABLE IF NOT EXISTS sync_state (user_id VARCHAR PRIMARY KEY, started_utc TIMESTAMP);"
+)
+
+class MirrorUnavailable(RuntimeError):
+    """The mirror file cannot be opened, usually because another process holds its lock."""
+
+_CONNECTIONS: Dict[str, object] = {}
+_CONNECT_LOCK = threading.Lock()
+_SYNC_LOCK = threading.Lock()
+
+def connection(path: str):
+    """This process's read-write connection to the mirror at path, opened on first use; query on .cursor()."""
+    if duckdb is None:
+        raise RuntimeError("duckdb not installed. Install with: pip install duckdb")
+    with _CONNECT_LOCK:
+        db = _CONNECTIONS.get(path)
+        if db is None:
+            try:
+                db = duckdb.connect(path)
+            except (duckdb.IOException, duckdb.ConnectionException) as e:
+                raise MirrorUnavailable(str(e)) from e
+            db.execute(SCHEMA_SQL)
+            _CONNECTIONS[path] = db
+        return db
+
+def close(path: Optional[str] = None) -> None:
+    """Close this process's connection to path (every mirror when None), releasing the file lock."""
+    with _CONNECT_LOCK:
+        for p in ([path] if path is not None else list(_CONNECTIONS)):
+            db = _CONNECTIONS.pop(p, None)
+            if db is not None:
+                db.close()
+
+# ---------------- Sync ----------------
+def _runs(days: Sequence[date], stale: set, max_days: int) -> List[Tuple[date, date]]:
+    """(first, last) runs of consecutive stale days in the sorted source day list."""
+    out, cur = [], []
+    for d in days:
+        if d in stale and len(cur) < max_days:
+            cur.append(d)
+            continue
+        if cur:
+            out.append((cur[0], cur[-1]))
+        cur = [d] if d in stale else []
+    if cur:
+        out.append((cur[0], cur[-1]))
+    return out
+
+def _as_date(v) -> date:
+    return v if type(v) is date else pd.Timestamp(v).date()
+
+def _source_rows(cn, sql: str, params: tuple) -> list:
+    cur = cn.cursor()
+    try:
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+def sync(cn, path: str, user_id: str, run_days: int = RUN_DAYS, full: bool = False) -> Dict[str, object]:
+    """
+    Bring the mirror's rows for user_id in line with the source over an open DB-API connection.
+    Only days that can have changed are fingerprinted (see the header); full=True checks every day.
+    Returns {"days": source days, "days_checked": days fingerprinted, "days_synced", "days_removed",
+    "rows": rows inserted, "synced_utc"}. Raises MirrorUnavailable when another process holds the file.
+    """
+    value_cols = ", ".join(c for c in ACTION_COLUMNS if c not in ("user_id", "et_date"))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    conn = connection(path)
+    with _SYNC_LOCK, conn.cursor() as db:
+        local = {_as_date(d): (int(n), None if fp is None else int(fp)) for d, n, fp in db.execute(
+            "SELECT et_date, n, fp FROM day_counts WHERE user_id = ?", [user_id]).fetchall()}
+        last = db.execute("SELECT started_utc FROM sync_state WHERE user_id = ?", [user_id]).fetchone()
+
+        counts = {_as_date(d): int(n) for d, n in _source_rows(
+            cn, "SELECT et_date, COUNT(*) FROM dbo.bitcorr_daily_actions WITH (NOLOCK) "
+                "WHERE user_id = ? GROUP BY et_date;", (user_id,))}
+        days = sorted(counts)
+        if full or last is None or not local:
+            check = set(days)
+        else:
+            mark = max(local)
+            check = {d for d in days if d >= mark or local.get(d, (None,))[0] != counts[d]}
+            for a, b in _source_rows(cn, "SELECT date_start, date_end FROM dbo.bitcorr_run_log WITH (NOLOCK) "
+                                         "WHERE user_id = ? AND ended_utc >= ?;", (user_id, last[0])):
+                a, b = _as_date(a), _as_date(b)
+                check.update(d for d in days if a <= d <= b)
+        fps: Dict[date, Optional[int]] = {}
+        for a, b in _runs(days, check, len(days)):
+            for d, fp in _source_rows(
+                    cn, f"SELECT et_date, CHECKSUM_AGG(BINARY_CHECKSUM({value_cols})) "
+                        "FROM dbo.bitcorr_daily_actions WITH (NOLOCK) "
+                        "WHERE user_id = ? AND et_date BETWEEN ? AND ? GROUP BY et_date;",
+                    (user_id, str(a), str(b))):
+                fps[_as_date(d)] = None if fp is None else int(fp)
+
+        stale = {d for d in check if local.get(d) != (counts[d], fps.get(d))}
+        gone = sorted(d for d in local if d not in counts)
+        for d in gone:
+            db.execute("DELETE FROM actions WHERE user_id = ? AND et_date = ?", [user_id, d])
+            db.execute("DELETE FROM day_counts WHERE user_id = ? AND et_date = ?", [user_id, d])
+
+        select = ", ".join(f"CAST({c} AS {_sql_type(c)})" for c in ACTION_COLUMNS)
+        inserted = 0
+        for a, b in _runs(days, stale, int(run_days)):
+            chunk = fetch_actions(cn, user_id, a, b)
+            got = chunk.groupby("et_date").size()
+            db.execute("BEGIN TRANSACTION")
+            try:
+                db.execute("DELETE FROM actions WHERE user_id = ? AND et_date BETWEEN ? AND ?", [user_id, a, b])
+                db.execute("DELETE FROM day_counts WHERE user_id = ? AND et_date BETWEEN ? AND ?", [user_id, a, b])
+                db.register("chunk", chunk)
+                db.execute(f"INSERT INTO actions SELECT {select} FROM chunk")
+                db.unregister("chunk")
+                db.executemany("INSERT INTO day_counts (user_id, et_date, n, synced_utc, fp) VALUES (?, ?, ?, ?, ?)",
+                               [[user_id, d, int(n), now, fps.get(_as_date(d))] for d, n in got.items()])
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            inserted += len(chunk)
+        db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", [user_id, now])
+    return {"days": len(days), "days_checked": len(check), "days_synced": len(stale), "days_removed": len(gone),
+            "rows": inserted, "synced_utc": now}
+
+def mirror_status(path: str, user_id: str) -> Dict[str, object]:
+    """{"rows", "days", "last_day", "synced_utc"} held for user_id (zeros / None before the first sync)."""
+    with connection(path).cursor() as db:
+        n, days, last, synced = db.execute(
+            "SELECT COALESCE(SUM(n), 0), COUNT(*), MAX(et_date), MAX(synced_utc) FROM day_counts "
+            "WHERE user_id = ?", [user_id]).fetchone()
+    return {"rows": int(n), "days": int(days), "last_day": last, "synced_utc": synced}
+
+# ---------------- Filters ----------------
+def action_filter(user_id: str, d0: Optional[date] = None, d1: Optional[date] = None,
+                  symbols: Optional[Sequence[str]] = None, sessions: Optional[Sequence[str]] = None,
+                  methods: Optional[Sequence[str]] = None,
+                  buy_min: Optional[float] = None, buy_max: Optional[float] = None,
+                  sell_min: Optional[float] = None, sell_max: Optional[float] = None) -> Dict[str, object]:
+    """Filter dict for the query helpers; None / empty lists mean "no filter" (as in filter_actions)."""
+    return {"user_id": user_id, "d0": d0, "d1": d1,
+            "symbols": list(symbols or []), "sessions": list(sessions or []), "methods": list(methods or []),
+            "buy_min": buy_min, "buy_max": buy_max, "sell_min": sell_min, "sell_max": sell_max}
+
+def _where(flt: Dict[str, object]) -> Tuple[str, list]:
+    parts, params = ["user_id = ?"], [flt["user_id"]]
+    for col, lo, hi in (("et_date", "d0", "d1"), ("buy_pct", "buy_min", "buy_max"),
+                        ("sell_pct", "sell_min", "sell_max")):
+        if flt.get(lo) is not None:
+            parts.append(f"{col} >= ?")
+            params.append(flt[lo] if col == "et_date" else float(flt[lo]))
+        if flt.get(hi) is not None:
+            parts.append(f"{col} <= ?")
+            params.append(flt[hi] if col == "et_date" else float(flt[hi]))
+    for col, key in (("symbol", "symbols"), ("session", "sessions"), ("method", "methods")):
+        vals = [str(v) for v in flt.get(key) or []]
+        if vals:
+            parts.append(f"{col} IN ({', '.join('?' for _ in vals)})")
+            params.extend(vals)
+    return " WHERE " + " AND ".join(parts), params
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Query result with the dtypes fetch_actions() produces (categoricals, shared date objects)."""
+    for c in df.columns:
+        if c in CATEGORY_COLUMNS:
+            df[c] = df[c].astype("category")
+        elif c == "et_date":
+            codes, uniq = pd.factorize(df[c])
+            days = np.empty(len(uniq) + 1, dtype=object)
+            days[:-1] = pd.DatetimeIndex(uniq).date
+            days[-1] = None
+            df[c] = days[codes]
+        elif c in INT16_COLUMNS:
+            df[c] = df[c].fillna(0).astype(np.int16)
+        elif c in ACTION_COLUMNS:
+            df[c] = df[c].astype(column_dtype(c))
+    return df
+
+def _query(path: str, sql: str, params: list) -> pd.DataFrame:
+    with connection(path).cursor() as db:
+        return db.execute(sql, params).df()
+
+# ---------------- Queries ----------------
+def load_actions(path: str, flt: Dict[str, object], columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    cols = [c for c in (columns or ACTION_COLUMNS) if c in ACTION_COLUMNS]
+    where, params = _where(flt)
+    return _typed(_query(path, f"SELECT {', '.join(cols)} FROM actions{where}", params))
+
+def heatmap(path: str, flt: Dict[str, object], value: str = "day_return") -> pd.DataFrame:
+    """Mean of value by buy_pct (index) × sell_pct (columns), both sorted, like pivot_table(aggfunc="mean")."""
+    where, params = _where(flt)
+    g = _query(path, f"SELECT buy_pct, sell_pct, AVG({value}) AS v FROM actions{where} "
+                     f"GROUP BY buy_pct, sell_pct HAVING COUNT({value}) > 0", params)
+    pivot = g.pivot(index="buy_pct", columns="sell_pct", values="v")
+    return pivot.sort_index().sort_index(axis=1)
+
+_AGG_SQL = {
+    "mean": "AVG({c})",
+    "sum": "SUM({c})",
+    "min": "MIN({c})",
+    "max": "MAX({c})",
+    "size": "COUNT(*)",
+    "count": "COUNT({c})",
+    "nunique": "COUNT(DISTINCT {c})",
+    # sharpe_like(): mean / population stdev, 0 when the stdev is 0 or undefined
+    "sharpe": "COALESCE(AVG({c}) / NULLIF(STDDEV_POP({c}), 0), 0)",
+}
+
+def group_stats(path: str, flt: Dict[str, object], keys: Sequence[str],
+                aggs: Dict[str, Tuple[str, str]]) -> pd.DataFrame:
+    """
+    GROUP BY keys with aggs {out_name: (column, func)}, func in _AGG_SQL; one row per group,
+    sorted by keys, like groupby(keys, as_index=False, observed=True).agg(**aggs).
+    """
+    where, params = _where(flt)
+    sel = [f"{_AGG_SQL[fn].format(c=col)} AS {name}" for name, (col, fn) in aggs.items()]
+    k = ", ".join(keys)
+    df = _query(path, f"SELECT {k}, {', '.join(sel)} FROM actions{where} GROUP BY {k} ORDER BY {k}", params)
+    for name, (col, fn) in aggs.items():
+        if fn in ("size", "count", "nunique"):
+            df[name] = df[name].astype(np.int64)
+    return _typed(df)
+
+def daily_winners(path: str, flt: Dict[str, object], columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Row with the highest day_return per (symbol, session, et_date), ordered by those keys."""
+    cols = [c for c in (columns or ACTION_COLUMNS) if c in ACTION_COLUMNS]
+    where, params = _where(flt)
+    # DISTINCT ON rather than QUALIFY ROW_NUMBER() = 1, which duckdb 1.5 can plan into a wrong pick
+    sql = (f"SELECT DISTINCT ON (symbol, session, et_date) {', '.join(cols)} FROM actions{where} "
+           "ORDER BY symbol, session, et_date, day_return DESC NULLS LAST")
+    return _typed(_query(path, sql, params))
+
+def date_bounds(path: str, user_id: str) -> Tuple[Optional[date], Optional[date]]:
+    with connection(path).cursor() as db:
+        lo, hi = db.execute("SELECT MIN(et_date), MAX(et_date) FROM day_counts WHERE user_id = ?",
+                            [user_id]).fetchone()
+    return lo, hi
+
+def distinct_values(path: str, user_id: str, column: str) -> List[str]:
+    if column not in CATEGORY_COLUMNS:
+        raise ValueError(f"Not a key column: {column}")
+    rows = _query(path, f"SELECT DISTINCT {column} FROM actions WHERE user_id = ? AND {column} IS NOT NULL "
+                        f"ORDER BY 1", [user_id])
+    return [str(v) for v in rows.iloc[:, 0].tolist()]
@@ -0,0 +1,789 @@
+# baseline_engine.py
+# Pure NumPy/pandas kernels shared by the Baseline Lab apps.
+# No Streamlit and no SQL in here, so the module can be imported from worker
+# processes and scripts as well as from `streamlit run ...`.
+#
+#  - Day-partition index: sorted day keys + row offsets, O(1) per-day and lookback slices
+#  - Multi-method baseline kernel: one pass over a lookback frame for every method
+#  - All-pairs threshold grid: one walk over the minutes advances every (buy, sell) pair
+#  - Isolated-day grid: every day x method x pair from a fresh wallet in one batch, best per day by argmax
+#  - Target-notional grid: the Threshold Grid tab's sizing (incl. surge tiers) for every pair at once
+#  - Split RTH/AH grid: the same walk for every (b_rth, s_rth, b_ah, s_ah) combination
+#  - Threshold-crossing jumps: single-pair simulation that only visits qualifying minutes
+#  - Trade detail: multi-day trade log from the same jumps, ±5-minute liquidity sums from one cumsum
+#  - Signal correlation: Pearson / Spearman / confidence for several horizons with one signal sort
+
+import math
+from datetime import date
+from typing import Dict, List, Tuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from jit_kernels import (HAVE_JIT, grid_day_kernel, grid_day_surge_kernel, isolated_grid_kernel, split_grid_day_kernel,
+                         curve_grid_kernel)
+
+
+# ---------------- Frame helpers ----------------
+def stock_vol_col(df: pd.DataFrame) -> str:
+    return "stock_v" if "stock_v" in df.columns else ("v" if "v" in df.columns else "stock_v")
+
+def baseline_arrays(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """Convert a joined-minute frame to (stock_c, btc_c, stock_v, btc_v) float arrays once.
+    btc_v is None when the frame carries no BTC volume."""
+    vcol = stock_vol_col(df)
+    stock_c = df["stock_c"].to_numpy(dtype=np.float64)
+    btc_c = df["btc_c"].to_numpy(dtype=np.float64)
+    stock_v = (df[vcol].to_numpy(dtype=np.float64) if vcol in df.columns
+               else np.zeros(len(df), dtype=np.float64))
+    btc_v = df["btc_v"].to_numpy(dtype=np.float64) if "btc_v" in df.columns else None
+    return stock_c, btc_c, stock_v, btc_v
+
+# ---------------- Day-partition index ----------------
+class DayIndex:
+    """
+    Row offsets of every trading day in a joined-minute frame, built once per fetched frame.
+
+    The et_date column is parsed a single time and the frame is (stably) sorted by day, so each
+    day is one contiguous block [starts[i], ends[i]) and a lookback window of N previous days is
+    the block from starts[i - N] to starts[i]. `day` and `lookback` return iloc views of that
+    block (row order within a day and index labels are the frame's own), replacing per-day
+    boolean masks over the whole frame and `list.index` lookups.
+    """
+
+    def __init__(self, df: pd.DataFrame, date_col: str = "et_date"):
+        ts = pd.to_datetime(df[date_col]) if len(df) else pd.Series([], dtype="datetime64[ns]")
+        if getattr(ts.dt, "tz", None) is not None:
+            ts = ts.dt.tz_localize(None)
+        keys = ts.to_numpy().astype("datetime64[D]")
+        ok = ~np.isnat(keys)
+        if not ok.all():
+            df, keys = df[ok], keys[ok]
+        if len(keys) > 1 and (keys[1:] < keys[:-1]).any():
+            order = np.argsort(keys, kind="stable")
+            df, keys = df.iloc[order], keys[order]
+        cut = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        self.frame = df
+        self.starts = np.r_[0, cut].astype(np.int64) if len(keys) else np.zeros(0, dtype=np.int64)
+        self.ends = np.r_[cut, len(keys)].astype(np.int64) if len(keys) else np.zeros(0, dtype=np.int64)
+        self.days: List[date] = keys[self.starts].astype(object).tolist()
+        self._pos: Dict[date, int] = {d: i for i, d in enumerate(self.days)}
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __contains__(self, d) -> bool:
+        return d in self._pos
+
+    def position(self, d) -> Optional[int]:
+        """Position of day d in the sorted day list (None when the frame has no rows that day)."""
+        return self._pos.get(d)
+
+    def day(self, d) -> pd.DataFrame:
+        """Rows of day d (an empty frame with the same columns when absent)."""
+        i = self._pos.get(d)
+        if i is None:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[self.starts[i]:self.ends[i]]
+
+    def prev_days(self, d, n: int) -> List[date]:
+        """The n trading days before d, or [] when d is absent or fewer than n precede it."""
+        i = self._pos.get(d)
+        if i is None or n <= 0 or i < n:
+            return []
+        return self.days[i - n:i]
+
+    def lookback(self, d, n: int) -> pd.DataFrame:
+        """Rows of the n trading days before d as one block (empty when prev_days(d, n) is [])."""
+        i = self._pos.get(d)
+        if i is None or n <= 0 or i < n:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[self.starts[i - n]:self.starts[i]]
+
+# ---------------- Multi-method baseline kernels ----------------
+def baseline_values_multi(stock_c: np.ndarray, btc_c: np.ndarray,
+                          stock_v: np.ndarray, btc_v: Optional[np.ndarray],
+                          methods: Sequence[str],
+                          winsor_low: float = 0.01, winsor_high: float = 0.99) -> Tuple[Dict[str, float], int]:
+    """
+    All requested methods over one lookback frame, with the same semantics as
+    `baseline_value` (Batch / Daily tabs): rows missing price or stock volume are dropped,
+    ratio and weights are built once and shared by every method.
+    Returns ({method: value}, n_samples).
+    """
+    out = {m: np.nan for m in methods}
+    keep = ~(np.isnan(stock_c) | np.isnan(btc_c) | np.isnan(stock_v))
+    n = int(keep.sum())
+    if n == 0:
+        return out, 0
+
+    c = stock_c[keep]
+    bc = btc_c[keep]
+    w = stock_v[keep]
+    bv = btc_v[keep] if btc_v is not None else np.zeros(n, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = bc / c
+    w_sum = w.sum()
+
+    if "VWAP_RATIO" in out:
+        stock_vwap = (c * w).sum() / w_sum if w_sum > 0 else c.mean()
+        bv_sum = np.nansum(bv)
+        btc_vwap = np.nansum(bc * bv) / bv_sum if bv_sum > 0 else bc.mean()
+        ok = stock_vwap and not math.isclose(stock_vwap, 0.0)
+        out["VWAP_RATIO"] = float(btc_vwap / stock_vwap) if ok else np.nan
+
+    if "VOL_WEIGHTED" in out:
+        out["VOL_WEIGHTED"] = float(np.nanmean(ratio)) if w_sum <= 0 else float(np.average(ratio, weights=w))
+
+    if "WINSORIZED" in out:
+        lo, hi = np.nanpercentile(ratio, [winsor_low * 100.0, winsor_high * 100.0])
+        # NaN bounds (inf ratios from zero prices) leave that side unclipped, as Series.clip does
+        clipped = ratio if (np.isnan(lo) and np.isnan(hi)) else np.clip(
+            ratio, None if np.isnan(lo) else lo, None if np.isnan(hi) else hi)
+        out["WINSORIZED"] = float(np.mean(clipped)) if w_sum <= 0 else float(np.average(clipped, weights=w))
+
+    if "WEIGHTED_MEDIAN" in out:
+        s = np.argsort(ratio)
+        ws = w[s]
+        i = np.searchsorted(np.cumsum(ws), 0.5 * ws.sum())
+        out["WEIGHTED_MEDIAN"] = float(ratio[s][min(max(i, 0), n - 1)])
+
+    if "EQUAL_MEAN" in out:
+        out["EQUAL_MEAN"] = float(np.nanmean(ratio))
+
+    return out, n
+
+def day_method_values_multi(stock_c: np.ndarray, btc_c: np.ndarray,
+                            stock_v: np.ndarray, btc_v: Optional[np.ndarray],
+                            methods: Sequence[str]) -> Tuple[Dict[str, float], int]:
+    """
+    All requested methods over one day's minutes, with the same semantics as
+    `compute_day_method` (Baseline / Threshold Grid / Daily Curve tabs):
+    zero stock prices become NaN ratios, volumes are clipped at zero, and any
+    method name that is not recognised falls back to EQUAL_MEAN.
+    Returns ({METHOD: value}, n_samples).
+    """
+    mU = [m.upper() for m in methods]
+    out = {m: np.nan for m in mU}
+    n = len(stock_c)
+    if n == 0:
+        return out, 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = btc_c / np.where(stock_c == 0, np.nan, stock_c)
+    w = np.where(stock_v < 0, 0.0, stock_v)
+    w_nansum = np.nansum(w)
+    has_ratio = bool((~np.isnan(r)).any())
+    n_valid = int(np.isfinite(r).sum())
+
+    for m in mU:
+        if m == "VWAP_RATIO":
+            bv = np.where(btc_v < 0, 0.0, btc_v) if btc_v is not None else np.zeros(n, dtype=np.float64)
+            bv_sum = np.nansum(bv)
+            if bv_sum == 0 or w_nansum == 0:
+                out[m] = np.nan
+                continue
+            btc_vwap = float(np.nansum(btc_c * bv) / bv_sum)
+            stk_vwap = float(np.nansum(stock_c * w) / w_nansum)
+            out[m] = (btc_vwap / stk_vwap) if stk_vwap > 0 else np.nan
+        elif m in ("VOL_WEIGHTED", "WINSORIZED"):
+            rr = r
+            if m == "WINSORIZED" and has_ratio:
+                lo, hi = np.nanpercentile(r, [1.0, 99.0])
+                rr = np.clip(r, lo, hi)
+            out[m] = float(np.nansum(rr * w) / w_nansum) if w_nansum > 0 else np.nan
+        elif m == "WEIGHTED_MEDIAN":
+            if np.all(np.isnan(r)) or w.sum() == 0:
+                out[m] = np.nan
+                continue
+            order = np.argsort(r)
+            cw = np.cumsum(np.nan_to_num(w[order]))
+            idx = min(np.searchsorted(cw, 0.5 * w_nansum, side="left"), n - 1)
+            out[m] = float(r[order][idx])
+        else:
+            out[m] = float(np.nanmean(r)) if has_ratio else np.nan
+
+    return out, n_valid
+
+# ---------------- Surge tiers (vectorized surge_extra_on_base) ----------------
+def surge_table(base_budget: float, t1_bonus: float, t2_bonus: float, cap_pct: float) -> np.ndarray:
+    """Surge extra for each tier code: bit 1 = tier-1 multiple reached, bit 2 = tier-2 (codes 0..3)."""
+    out = np.zeros(4)
+    for code in range(4):
+        extra = 0.0
+        if code & 1:
+            extra += base_budget * (t1_bonus / 100.0)
+        if code & 2:
+            extra += base_budget * (t2_bonus / 100.0)
+        out[code] = min(extra, base_budget * (cap_pct / 100.0))
+    return out
+
+def surge_tiers(ratios: np.ndarray, baseline, buy_vals: Sequence[float],
+                t1_mult: float, t2_mult: float) -> np.ndarray:
+    """
+    int8 tier codes, shape (len(buy_vals), len(ratios)), from surge_extra_on_base's multiple
+    m = (ratio / baseline - 1) / (buy% / 100). `baseline` is a scalar or one value per minute;
+    minutes with no usable baseline (and buy% <= 0) get code 0 (no extra).
+    """
+    ratios = np.asarray(ratios, dtype=float)
+    base = np.broadcast_to(np.asarray(baseline, dtype=float), ratios.shape)
+    b = np.asarray(buy_vals, dtype=float)[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ok = (np.isfinite(base) & (base > 0))[None, :] & (b > 0)
+        m = ((ratios / base) - 1.0)[None, :] / (b / 100.0)
+        codes = (m >= t1_mult).astype(np.int8) | ((m >= t2_mult).astype(np.int8) << 1)
+    return np.where(ok, codes, 0).astype(np.int8)
+
+def pair_surge(buy_k: Sequence[float], base_budget: float,
+               t1_mult: float, t1_bonus: float, t2_mult: float, t2_bonus: float, cap_pct: float) -> dict:
+    """Surge settings for simulate_grid_day over explicit pairs (buy_k = each pair's buy%)."""
+    buy_vals, buy_idx = np.unique(np.asarray(buy_k, dtype=float), return_inverse=True)
+    return {
+        "buy_vals": buy_vals,
+        "buy_idx": buy_idx.astype(np.int64).ravel(),
+        "t1_mult": float(t1_mult),
+        "t2_mult": float(t2_mult),
+        "table": surge_table(float(base_budget), float(t1_bonus), float(t2_bonus), float(cap_pct)),
+        "base_budget": float(base_budget),
+    }
+
+def grid_surge(buy_list: Sequence[float], sell_list: Sequence[float], base_budget: float,
+               t1_mult: float, t1_bonus: float, t2_mult: float, t2_bonus: float, cap_pct: float) -> dict:
+    """Surge settings for simulate_grid_day / simulate_curve_grid over grid_pairs(buy_list, sell_list)."""
+    return pair_surge(grid_pairs(buy_list, sell_list)[0], base_budget, t1_mult, t1_bonus, t2_mult, t2_bonus, cap_pct)
+
+# ---------------- All-pairs threshold grid (long-only state machine) ----------------
+def day_arrays(cj: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(price, stock volume, ratio) float arrays for one day's minutes, as `simulate_day_fast` reads them."""
+    px = cj["stock_c"].to_numpy(float, copy=False)
+    vol = cj[stock_vol_col(cj)].to_numpy(float, copy=False)
+    R = (cj["ratio"] if "ratio" in cj.columns else (cj["btc_c"] / cj["stock_c"])).to_numpy(float, copy=False)
+    return px, vol, R
+
+def grid_pairs(buy_list: Sequence[float], sell_list: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Flattened (buy, sell) grid in loop order: pair k = (buy_list[k // nS], sell_list[k % nS])."""
+    bb, ss = np.meshgrid(np.asarray(buy_list, dtype=float), np.asarray(sell_list, dtype=float), indexing="ij")
+    return bb.ravel(), ss.ravel()
+
+def simulate_grid_day(px: np.ndarray, vol: np.ndarray, R: np.ndarray, base_val: float,
+                      buy_pcts: np.ndarray, sell_pcts: np.ndarray,
+                      cash: np.ndarray, shares: np.ndarray, trades: np.ndarray,
+                      participation_cap_pct: int = 0,
+                      export_log: bool = False,
+                      surge: Optional[dict] = None) -> List[Tuple[int, int, str, int]]:
+    """
+    One day of `simulate_day_fast` for every (buy%, sell%) pair at once.
+    cash / shares / trades are per-pair state arrays, carried between days and updated in place.
+    Minutes are walked once; at each minute the pairs that buy and the pairs that sell are
+    picked with masks (the two sets are disjoint: buying needs shares <= 0, selling shares > 0).
+    Minutes where the ratio is inside every pair's band are skipped up front.
+    surge (from grid_surge) switches buys from all-in to base_budget + surge extra, capped by cash.
+    Returns [(pair, minute index, "BUY"/"SELL", shares)] in minute order when export_log.
+    """
+    events: List[Tuple[int, int, str, int]] = []
+    if len(px) == 0 or not np.isfinite(base_val):
+        return events
+    tiers = None
+    if surge is not None:
+        tiers = surge_tiers(R, float(base_val), surge["buy_vals"], surge["t1_mult"], surge["t2_mult"])
+    if HAVE_JIT and not export_log:
+        if surge is None:
+            grid_day_kernel(px, vol, R, float(base_val), buy_pcts, sell_pcts, cash, shares, trades,
+                            float(participation_cap_pct or 0))
+        else:
+            grid_day_surge_kernel(px, vol, R, float(base_val), buy_pcts, sell_pcts, surge["buy_idx"], tiers,
+                                  surge["table"], surge["base_budget"], cash, shares, trades,
+                                  float(participation_cap_pct or 0))
+        return events
+
+    buy_thr = base_val * (1.0 + buy_pcts / 100.0)
+    sell_thr = base_val * (1.0 - sell_pcts / 100.0)
+    with np.errstate(invalid="ignore"):
+        ok = np.isfinite(px) & (px > 0) & np.isfinite(R)
+        active = ok & ((R >= buy_thr.min()) | (R <= sell_thr.max()))
+    use_cap = bool(participation_cap_pct and participation_cap_pct > 0)
+    cap_frac = (participation_cap_pct / 100.0) if use_cap else 0.0
+
+    for i in np.flatnonzero(active):
+        p = px[i]
+        r = R[i]
+        buy = (r >= buy_thr) & (shares <= 0) & (cash > 0)
+        sell = (r <= sell_thr) & (shares > 0.0)
+        if buy.any():
+            if tiers is None:
+                qty = np.floor(cash[buy] / p)
+            else:
+                target = surge["base_budget"] + surge["table"][tiers[surge["buy_idx"][buy], i]]
+                qty = np.floor(np.where(target < cash[buy], target, cash[buy]) / p)
+            if use_cap:
+                v = vol[i]
+                lim = math.trunc(v * cap_frac) if np.isfinite(v) else 0
+                qty = np.minimum(qty, lim)
+            idx = np.flatnonzero(buy)[qty > 0]
+            if idx.size:
+                qty = qty[qty > 0]
+                cash[idx] -= qty * p
+                shares[idx] = qty
+                trades[idx] += 1
+                if export_log:
+                    events.extend((int(k), int(i), "BUY", int(q)) for k, q in zip(idx, qty))
+        if sell.any():
+            idx = np.flatnonzero(sell)
+            if export_log:
+                events.extend((int(k), int(i), "SELL", int(shares[k])) for k in idx)
+            cash[idx] += shares[idx] * p
+            shares[idx] = 0.0
+            trades[idx] += 1
+    return events
+
+# ---------------- Isolated-day grid (fresh wallet each day) ----------------
+def simulate_isolated_days(px: np.ndarray, vol: np.ndarray, R: np.ndarray, day_starts: np.ndarray,
+                           base: np.ndarray, buy_pcts: np.ndarray, sell_pcts: np.ndarray,
+                           start_capital: float,
+                           participation_cap_pct: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    `simulate_day_fast` from (cash=start_capital, shares=0) for every day x method x pair at once.
+    px / vol / R hold all days back to back, day d being [day_starts[d], day_starts[d + 1]);
+    base is (days, methods) with NaN where a method has no baseline that day.
+    Returns (cash, shares, trades), each shaped (days, methods, pairs).
+
+    Days never carry state, so the NumPy path walks minute offset t of every day at the same
+    time: one step updates all (day, method, pair) cells whose day is still running and whose
+    ratio at that minute is outside the day's loosest band.
+    """
+    n_days, n_methods, n_pairs = len(day_starts), base.shape[1], len(buy_pcts)
+    cash = np.full((n_days, n_methods, n_pairs), float(start_capital))
+    shares = np.zeros((n_days, n_methods, n_pairs))
+    trades = np.zeros((n_days, n_methods, n_pairs), dtype=np.int64)
+    if n_days == 0 or n_methods == 0 or n_pairs == 0:
+        return cash, shares, trades
+    starts = np.asarray(day_starts, dtype=np.int64)
+    ends = np.r_[starts[1:], len(px)].astype(np.int64)
+    base = np.asarray(base, dtype=float)
+    if HAVE_JIT:
+        isolated_grid_kernel(px, vol, R, starts, ends, base, buy_pcts, sell_pcts, float(start_capital),
+                             float(participation_cap_pct or 0), cash, shares, trades)
+        return cash, shares, trades
+
+    buy_thr = base[:, :, None] * (1.0 + buy_pcts / 100.0)
+    sell_thr = base[:, :, None] * (1.0 - sell_pcts / 100.0)
+    # Loosest band per day: minutes inside it cannot trigger any cell of that day
+    lo_buy = np.where(np.isfinite(buy_thr), buy_thr, np.inf).reshape(n_days, -1).min(axis=1)
+    hi_sell = np.where(np.isfinite(sell_thr), sell_thr, -np.inf).reshape(n_days, -1).max(axis=1)
+    use_cap = bool(participation_cap_pct and participation_cap_pct > 0)
+    cap_frac = (participation_cap_pct / 100.0) if use_cap else 0.0
+    lengths = ends - starts
+
+    for t in range(int(lengths.max())):
+        live = np.flatnonzero(lengths > t)
+        i = starts[live] + t
+        p, r = px[i], R[i]
+        with np.errstate(invalid="ignore"):
+            ok = np.isfinite(p) & (p > 0) & np.isfinite(r) & ((r >= lo_buy[live]) | (r <= hi_sell[live]))
+        if not ok.any():
+            continue
+        dd, i, p, r = live[ok], i[ok], p[ok], r[ok]
+        c, s = cash[dd], shares[dd]
+        buy = (r[:, None, None] >= buy_thr[dd]) & (s <= 0) & (c > 0)
+        sell = (r[:, None, None] <= sell_thr[dd]) & (s > 0.0)
+        if buy.any():
+            qty = np.floor(c / p[:, None, None])
+            if use_cap:
+                v = vol[i]
+                lim = np.zeros(len(v))
+                fin = np.isfinite(v)
+                lim[fin] = np.trunc(v[fin] * cap_frac)
+                qty = np.minimum(qty, lim[:, None, None])
+            buy &= qty > 0
+            c = np.where(buy, c - qty * p[:, None, None], c)
+            s = np.where(buy, qty, s)
+            trades[dd] += buy
+        if sell.any():
+            c = np.where(sell, c + s * p[:, None, None], c)
+            s = np.where(sell, 0.0, s)
+            trades[dd] += sell
+        cash[dd], shares[dd] = c, s
+    return cash, shares, trades
+
+def best_per_day(cash: np.ndarray, shares: np.ndarray, last_px: np.ndarray, base: np.ndarray,
+                 start_capital: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Each day's winning cell of simulate_isolated_days in one reduction.
+    Equity marks open shares at the day's last price (0 when it is not finite). Cells are ranked
+    in (method, pair) loop order and ties go to the first one, as a strict `>` scan would pick.
+    Returns (flat index method * pairs + pair, or -1 when no method has a baseline; day return).
+    """
+    n_days = cash.shape[0]
+    lp = np.where(np.isfinite(last_px), last_px, 0.0)
+    ret = (cash + shares * lp[:, None, None]) / float(start_capital) - 1.0
+    ret = ret.reshape(n_days, -1)
+    valid = np.broadcast_to(np.isfinite(base)[:, :, None], cash.shape).reshape(n_days, -1)
+    if ret.shape[1] == 0:
+        return np.full(n_days, -1, dtype=np.int64), np.full(n_days, np.nan)
+    k = np.argmax(np.where(valid, ret, -np.inf), axis=1)
+    best = np.where(valid.any(axis=1), k, -1).astype(np.int64)
+    return best, ret[np.arange(n_days), k]
+
+# ---------------- Target-notional grid (Threshold Grid tab) ----------------
+def simulate_curve_grid(prices: np.ndarray, ratios: np.ndarray, baseline_minute: np.ndarray,
+                        buy_list: Sequence[float], sell_list: Sequence[float],
+                        init_cap: float, reinvest: bool,
+                        surge: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The Threshold Grid tab's continuous run (curve_kernel with day_starts=[0]) for every
+    grid_pairs(buy_list, sell_list) pair at once -> per-pair (cash, shares, trades).
+    Surge extras come from precomputed tier codes per buy% (surge from grid_surge with
+    base_budget = init_cap), so a surge-enabled grid costs about the same as a plain one.
+    """
+    buy_k, sell_k = grid_pairs(buy_list, sell_list)
+    cash = np.full(len(buy_k), float(init_cap))
+    shares = np.zeros(len(buy_k))
+    trades = np.zeros(len(buy_k), dtype=np.int64)
+    if len(prices) == 0 or len(buy_k) == 0:
+        return cash, shares, trades
+    if surge is not None:
+        tiers = surge_tiers(ratios, baseline_minute, surge["buy_vals"], surge["t1_mult"], surge["t2_mult"])
+        buy_idx, table = surge["buy_idx"], surge["table"]
+    else:
+        tiers = np.zeros((1, 1), dtype=np.int8)
+        buy_idx, table = np.zeros(len(buy_k), dtype=np.int64), np.zeros(4)
+    if HAVE_JIT:
+        curve_grid_kernel(prices, ratios, baseline_minute, buy_k, sell_k, buy_idx, tiers, table,
+                          surge is not None, float(init_cap), bool(reinvest), cash, shares, trades)
+        return cash, shares, trades
+
+    buy_mult = 1.0 + buy_k / 100.0
+    sell_mult = 1.0 - sell_k / 100.0
+    with np.errstate(invalid="ignore"):
+        lo_buy = np.minimum(baseline_minute * buy_mult.min(), baseline_minute * buy_mult.max())
+        hi_sell = np.maximum(baseline_minute * sell_mult.min(), baseline_minute * sell_mult.max())
+        active = np.isfinite(baseline_minute) & ((ratios >= lo_buy) | (ratios <= hi_sell))
+
+    for i in np.flatnonzero(active):
+        p = prices[i]
+        r = ratios[i]
+        base = baseline_minute[i]
+        buy = (r >= base * buy_mult) & (shares <= 0.0)
+        sell = (r <= base * sell_mult) & (shares > 0.0)
+        if buy.any():
+            idx = np.flatnonzero(buy)
+            base_target = (cash[idx] + shares[idx] * p) if reinvest else np.full(idx.size, float(init_cap))
+            if surge is not None:
+                base_target = base_target + table[tiers[buy_idx[idx], i]]
+            target = np.where(base_target > 0.0, base_target, 0.0)
+            to_spend = target - shares[idx] * p
+            to_spend = np.where(to_spend > 0.0, to_spend, 0.0)
+            ok = (to_spend > 0.0) & (cash[idx] > 0.0)
+            qty = np.floor(np.where(to_spend < cash[idx], to_spend, cash[idx]) / p)
+            ok &= qty > 0
+            idx, qty = idx[ok], qty[ok]
+            if idx.size:
+                cash[idx] -= qty * p
+                shares[idx] += qty
+                trades[idx] += 1
+        if sell.any():
+            idx = np.flatnonzero(sell)
+            cash[idx] += shares[idx] * p
+            shares[idx] = 0.0
+            trades[idx] += 1
+    return cash, shares, trades
+
+# ---------------- Split RTH/AH grid (4-D) ----------------
+def split_combos(buy_rth: Sequence[float], sell_rth: Sequence[float],
+                 buy_ah: Sequence[float], sell_ah: Sequence[float]) -> np.ndarray:
+    """(n, 4) rows of (b_rth, s_rth, b_ah, s_ah) in nested-loop order (AH sell varies fastest)."""
+    axes = [np.asarray(x if x is not None else [], dtype=float) for x in (buy_rth, sell_rth, buy_ah, sell_ah)]
+    grids = np.meshgrid(*axes, indexing="ij")
+    return np.stack([g.ravel() for g in grids], axis=1)
+
+def simulate_split_grid_day(px: np.ndarray, vol: np.ndarray, R: np.ndarray, is_rth: np.ndarray,
+                            base_rth: float, base_ah: float, combos: np.ndarray,
+                            cash: np.ndarray, shares: np.ndarray, trades: np.ndarray,
+                            participation_cap_pct: int = 0):
+    """
+    One day of the split RTH/AH state machine for every (b_rth, s_rth, b_ah, s_ah) row of `combos`.
+    Same contract as simulate_grid_day: per-combination state arrays updated in place, minutes
+    walked once. Each minute compares against its session's thresholds; a session whose baseline
+    is missing does not trade. is_rth must be an int64 array (1 = RTH).
+    """
+    rth_ok, ah_ok = np.isfinite(base_rth), np.isfinite(base_ah)
+    if len(px) == 0 or len(combos) == 0 or not (rth_ok or ah_ok):
+        return
+    if HAVE_JIT:
+        split_grid_day_kernel(px, vol, R, is_rth, float(base_rth), float(base_ah), combos,
+                              cash, shares, trades, float(participation_cap_pct or 0))
+        return
+
+    thr = {}
+    if rth_ok:
+        thr[1] = (base_rth * (1.0 + combos[:, 0] / 100.0), base_rth * (1.0 - combos[:, 1] / 100.0))
+    if ah_ok:
+        thr[0] = (base_ah * (1.0 + combos[:, 2] / 100.0), base_ah * (1.0 - combos[:, 3] / 100.0))
+    sess = (is_rth == 1).astype(np.int64)
+    with np.errstate(invalid="ignore"):
+        active = np.isfinite(px) & (px > 0) & np.isfinite(R)
+        for s in (0, 1):
+            in_s = sess == s
+            if s in thr:
+                b_thr, s_thr = thr[s]
+                active[in_s] &= (R[in_s] >= b_thr.min()) | (R[in_s] <= s_thr.max())
+            else:
+                active[in_s] = False
+    use_cap = bool(participation_cap_pct and participation_cap_pct > 0)
+    cap_frac = (participation_cap_pct / 100.0) if use_cap else 0.0
+
+    for i in np.flatnonzero(active):
+        p = px[i]
+        r = R[i]
+        buy_thr, sell_thr = thr[sess[i]]
+        buy = (r >= buy_thr) & (shares <= 0.0) & (cash > 0.0)
+        sell = (r <= sell_thr) & (shares > 0.0)
+        if buy.any():
+            qty = np.floor(cash[buy] / p)
+            if use_cap:
+                v = vol[i]
+                qty = np.minimum(qty, math.trunc(v * cap_frac) if np.isfinite(v) else 0)
+            idx = np.flatnonzero(buy)[qty > 0]
+            if idx.size:
+                qty = qty[qty > 0]
+                cash[idx] -= qty * p
+                shares[idx] += qty
+                trades[idx] += 1
+        if sell.any():
+            idx = np.flatnonzero(sell)
+            cash[idx] += np.trunc(shares[idx]) * p
+            shares[idx] = 0.0
+            trades[idx] += 1
+
+# ---------------- Threshold-crossing jumps (single pair) ----------------
+def next_trigger(idx: np.ndarray, start: int, stop: Optional[int] = None) -> int:
+    """First qualifying minute index >= start (and < stop) from a sorted index array, or -1."""
+    k = int(np.searchsorted(idx, start, side="left"))
+    if k >= len(idx):
+        return -1
+    j = int(idx[k])
+    return j if (stop is None or j < stop) else -1
+
+def simulate_day_jump(px: np.ndarray, vol: np.ndarray, R: np.ndarray, base_val: float,
+                      buy_pct: float, sell_pct: float,
+                      cash: float, shares: float,
+                      participation_cap_pct: int = 0,
+                      export_log: bool = False) -> Tuple[float, float, int, List[Tuple[int, str, int]]]:
+    """
+    Event-driven `simulate_day_fast`: state only changes when a flat book sees ratio >= buy_thr
+    or a long book sees ratio <= sell_thr, so the qualifying minutes are indexed once and the
+    walk jumps between them with searchsorted. Cost scales with trades, not minutes.
+    Returns (cash, shares, trades, [(minute index, "BUY"/"SELL", shares)]).
+    """
+    events: List[Tuple[int, str, int]] = []
+    trades = 0
+    if len(px) == 0 or not np.isfinite(base_val):
+        return cash, shares, trades, events
+
+    buy_thr = base_val * (1.0 + buy_pct / 100.0)
+    sell_thr = base_val * (1.0 - sell_pct / 100.0)
+    with np.errstate(invalid="ignore"):
+        ok = np.isfinite(px) & (px > 0) & np.isfinite(R)
+        buy_idx = np.flatnonzero(ok & (R >= buy_thr))
+        sell_idx = np.flatnonzero(ok & (R <= sell_thr))
+    use_cap = bool(participation_cap_pct and participation_cap_pct > 0)
+
+    i = 0
+    while True:
+        if shares <= 0:
+            if cash <= 0:
+                break  # flat with no cash: nothing can happen for the rest of the day
+            j = next_trigger(buy_idx, i)
+            if j < 0:
+                break
+            p = px[j]
+            qty = math.floor(cash / p)
+            if use_cap:
+                v = vol[j]
+                qty = min(qty, int(v * (participation_cap_pct / 100.0)) if np.isfinite(v) else 0)
+            if qty > 0:
+                cash -= qty * p
+                shares = float(qty)
+                trades += 1
+                if export_log:
+                    events.append((j, "BUY", int(qty)))
+        else:
+            j = next_trigger(sell_idx, i)
+            if j < 0:
+                break
+            if export_log:
+                events.append((j, "SELL", int(shares)))
+            cash += shares * px[j]
+            shares = 0.0
+            trades += 1
+        i = j + 1
+    return cash, shares, trades, events
+
+# ---------------- Trade detail (continuous wallet, liquidity context) ----------------
+DETAIL_COLUMNS = ["symbol", "et_date", "et_time", "action", "price", "ratio", "base",
+                  "shares_traded", "buy_pct", "sell_pct", "method",
+                  "day_total_shares", "day_total_value",
+                  "minute_shares", "minute_value",
+                  "ten_min_shares", "ten_min_value"]
+
+def centered_sums(x: np.ndarray, half: int = 5) -> np.ndarray:
+    """
+    Sum of x over rows [i - half, i + half] (clipped to the array) excluding row i, from one cumsum.
+    A window holding a NaN is NaN, as the slice sum would be; NaNs are counted separately so one
+    missing value does not poison the running sum for every later row.
+    """
+    n = len(x)
+    bad = np.isnan(x)
+    cs = np.concatenate(([0.0], np.cumsum(np.where(bad, 0.0, x), dtype=np.float64)))
+    cn = np.concatenate(([0], np.cumsum(bad)))
+    i = np.arange(n)
+    lo = np.maximum(0, i - half)
+    hi = np.minimum(n, i + half + 1)
+    return np.where(cn[hi] > cn[lo], np.nan, cs[hi] - cs[lo] - x)
+
+def simulate_trade_log(px: np.ndarray, R: np.ndarray, base: np.ndarray, day_starts: np.ndarray,
+                       buy_pct: float, sell_pct: float, init_cap: float,
+                       flatten_eod: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One wallet carried across every day of px / R (days back to back from day_starts), long-only,
+    all-in on ratio >= base * (1 + buy%) and all-out on ratio <= base * (1 - sell%); base is per row.
+    With flatten_eod an open position is sold at the last minute of its day (except the final day).
+    Jumps between qualifying minutes like simulate_day_jump, so cost scales with trades.
+    Returns (row index, is_buy, shares) per trade in execution order.
+    """
+    n = len(px)
+    rows: List[int] = []
+    buys: List[bool] = []
+    qtys: List[int] = []
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+
+    with np.errstate(invalid="ignore"):
+        fin = np.isfinite(base)
+        buy_idx = np.flatnonzero(fin & (R >= base * (1.0 + buy_pct / 100.0)))
+        sell_idx = np.flatnonzero(fin & (R <= base * (1.0 - sell_pct / 100.0)))
+    starts = np.asarray(day_starts, dtype=np.int64)
+    last_rows = np.r_[starts[1:], n] - 1
+
+    cash, shares, i = float(init_cap), 0, 0
+    while i < n:
+        if shares <= 0:
+            if cash <= 0:
+                break
+            j = next_trigger(buy_idx, i)
+            if j < 0:
+                break
+            q = np.floor(cash / px[j])
+            if np.isfinite(q) and q > 0:
+                shares = int(q)
+                cash -= shares * px[j]
+                rows.append(j)
+                buys.append(True)
+                qtys.append(shares)
+            i = j + 1
+        else:
+            # Position opened at i - 1: it closes on the next sell trigger, or at its day's close
+            end = int(last_rows[np.searchsorted(starts, i - 1, side="right") - 1])
+            stop = end + 1 if (flatten_eod and end < n - 1) else None
+            j = next_trigger(sell_idx, i, stop)
+            if j < 0:
+                if stop is None:
+                    break
+                j = end
+            cash += shares * px[j]
+            rows.append(j)
+            buys.append(False)
+            qtys.append(shares)
+            shares = 0
+            i = j + 1
+    return np.asarray(rows, dtype=np.int64), np.asarray(buys, dtype=bool), np.asarray(qtys, dtype=np.int64)
+
+# ---------------- Signal correlation (multi-horizon) ----------------
+CORR_FIELDS = ("n", "pearson", "spearman", "confidence")
+
+def signal_arrays(cj: pd.DataFrame, base_val: float,
+                  use_dollar_weights: bool = True) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """(price, signal = ratio / base - 1, dollar-volume weights or None) for one day's minutes."""
+    px = cj["stock_c"].to_numpy(float, copy=False)
+    ratio = cj["btc_c"].to_numpy(float, copy=False) / np.maximum(px, 1e-12)
+    sig = (ratio / float(base_val)) - 1.0
+    w = None
+    if use_dollar_weights and "dollar_volume" in cj.columns:
+        w = cj["dollar_volume"].to_numpy(float, copy=False)
+    return px, sig, w
+
+def weighted_corr(x: np.ndarray, y: np.ndarray, w: Optional[np.ndarray] = None) -> float:
+    """Pearson r over the finite (x, y) pairs, dollar-weighted when w is given (w > 0 only)."""
+    mask = np.isfinite(x) & np.isfinite(y)
+    if w is not None:
+        mask &= np.isfinite(w) & (w > 0)
+    x = x[mask]; y = y[mask]; w = (w[mask] if w is not None else None)
+    n = len(x)
+    if n < 3:
+        return float("nan")
+    if w is None:
+        xm, ym = x.mean(), y.mean()
+        cov = ((x - xm) * (y - ym)).mean()
+        vx = ((x - xm)**2).mean(); vy = ((y - ym)**2).mean()
+    else:
+        ws = w.sum()
+        xm = (w * x).sum() / ws; ym = (w * y).sum() / ws
+        cov = (w * (x - xm) * (y - ym)).sum() / ws
+        vx = (w * (x - xm)**2).sum() / ws
+        vy = (w * (y - ym)**2).sum() / ws
+    denom = float(np.sqrt(vx * vy))
+    return float(cov / denom) if denom > 0 else float("nan")
+
+def fisher_confidence(r: float, n: int) -> float:
+    """0..100 score from the Fisher z of r with n samples (0 for n < 5 or r missing)."""
+    if not np.isfinite(r) or n < 5:
+        return 0.0
+    r = float(np.clip(r, -0.999999, 0.999999))
+    z = np.arctanh(r) * np.sqrt(max(n - 3, 1))
+    score = 100.0 * (1.0 - np.exp(-abs(z)))  # 0..100
+    return float(np.clip(score, 0.0, 100.0))
+
+def window_ranks(order: np.ndarray, values: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """
+    pd.Series(values[lo:hi]).rank(method="average") read off order = np.argsort(values), so
+    several windows of one array share a single sort. NaN stays NaN.
+    """
+    sel = order[(order >= lo) & (order < hi)]
+    v = values[sel]
+    keep = ~np.isnan(v)
+    sel, v = sel[keep], v[keep]
+    out = np.full(hi - lo, np.nan)
+    if len(v):
+        new = np.r_[True, v[1:] != v[:-1]]
+        first = np.flatnonzero(new)
+        last = np.r_[first[1:], len(v)] - 1
+        out[sel - lo] = ((first + last + 2) / 2.0)[np.cumsum(new) - 1]
+    return out
+
+def signal_correlations(px: np.ndarray, sig: np.ndarray, w: Optional[np.ndarray],
+                        horizons: Sequence[int]) -> np.ndarray:
+    """
+    Signal vs. return correlation of one day for every horizon -> (len(horizons), 4) array with
+    columns CORR_FIELDS (n = 0, r = NaN, confidence = 0 when the day is too short).
+    Horizon h > 0 pairs sig[i] with the forward return (px[i+h] - px[i]) / px[i] (as
+    day_signal_correlation does); h == 0 pairs it with the same minute's return
+    (px[i] - px[i-1]) / px[i-1]. The signal is sorted once and its Spearman ranks for each
+    horizon's window come from that single order.
+    """
+    n = len(px)
+    out = np.zeros((len(horizons), len(CORR_FIELDS)))
+    out[:, 1:3] = np.nan
+    order = np.argsort(sig, kind="stable")
+    for j, h in enumerate(horizons):
+        k = max(int(h), 1)
+        if n <= k:
+            continue
+        base = np.maximum(px[:-k], 1e-12)
+        ret = (px[k:] - px[:-k]) / base
+        lo, hi = (0, n - k) if int(h) > 0 else (1, n)
+        x = sig[lo:hi]
+        ww = w[lo:hi] if w is not None else None
+        pear = weighted_corr(x, ret, ww)
+        spear = weighted_corr(window_ranks(order, sig, lo, hi), window_ranks(np.argsort(ret), ret, 0, len(ret)), ww)
+        out[j] = (hi - lo, pear, spear, fisher_confidence(pear, hi - lo))
+    return out
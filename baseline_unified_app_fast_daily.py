@@ -14,6 +14,8 @@
 
 import os
 import math
+import shutil
+import time
 import warnings
 from datetime import datetime, timedelta, timezone, date, time as dtime
 from zoneinfo import ZoneInfo
@@ -28,6 +30,17 @@ import pyodbc
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine, text
 
+from baseline_engine import (DayIndex, stock_vol_col, baseline_arrays, baseline_values_multi, day_method_values_multi,
+                             day_arrays, grid_pairs, next_trigger, simulate_day_jump, grid_surge,
+                             simulate_curve_grid, simulate_isolated_days, best_per_day,
+                             signal_arrays, signal_correlations,
+                             DETAIL_COLUMNS, centered_sums, simulate_trade_log)
+from disk_cache import disk_cached, cache_summary, clear_disk_cache
+from jit_kernels import HAVE_JIT, day_kernel, curve_kernel
+from grid_runner import grid_inputs, scan_grid, empty_grid, iter_batch_parallel, StopAt
+from trade_log_sink import trade_log_dir, merge_trade_logs, trade_log_rows
+from result_browser import save_results, query_page, column_profile
+
 warnings.filterwarnings("ignore", category=UserWarning, module="pandas.io.sql")
 st.set_page_config(page_title="Baseline Lab — FAST", layout="wide")
 
@@ -591,9 +604,6 @@ def filter_window_time(df: pd.DataFrame, window: str, t0: dtime = None, t1: dtim
 def is_rth_time(t: dtime) -> bool:
     return (t >= dtime(9, 30, 0)) and (t <= dtime(16, 0, 0))
 
-def stock_vol_col(df: pd.DataFrame) -> str:
-    return "stock_v" if "stock_v" in df.columns else ("v" if "v" in df.columns else "stock_v")
-
 # ---------------- Baseline calculators ----------------
 def vwap_ratio(df: pd.DataFrame) -> float:
     btc_v = df.get("btc_v", pd.Series(0, index=df.index)).astype(float).clip(lower=0)
@@ -657,6 +667,7 @@ def prev_n_days_for(server: str, db: str, user_id: str, sym: str, ref_date: date
 
 # ---------------- Cached baseline map (day -> baseline value) ----------------
 @st.cache_data(show_spinner=False)
+@disk_cached()
 def compute_daily_baselines(server: str, db: str, user_id: str, sym: str,
                             start_date: date, end_date: date,
                             window: str, cstart: Optional[str], cend: Optional[str],
@@ -678,21 +689,23 @@ def compute_daily_baselines(server: str, db: str, user_id: str, sym: str,
         return out
 
     # We'll fetch joined minutes day-by-day for baseline windows
-    per_day_cache: Dict[Tuple[date, str], float] = {}
+    # Each previous day is fetched once and all methods are computed in a single pass
+    methods_u = tuple(dict.fromkeys(m.upper() for m in methods))
+    per_day_cache: Dict[date, Dict[str, float]] = {}
     for d in pd.to_datetime(dfd["et_date"]).dt.date:
         prev_days = prev_n_days_for(server, db, user_id, sym, d, n_prev)
         if not prev_days:
             continue
-        for m in methods:
+        for pd_ in prev_days:
+            if pd_ not in per_day_cache:
+                dfp = fetch_join_minutes(server, db, user_id, sym, pd_, pd_)
+                dfp = filter_window_str(dfp, window, cstart, cend)
+                per_day_cache[pd_] = (day_method_values_multi(*baseline_arrays(dfp), methods_u)[0]
+                                      if not dfp.empty else {})
+        for mU in methods_u:
             vals = []
-            mU = m.upper()
             for pd_ in prev_days:
-                key = (pd_, mU)
-                if key not in per_day_cache:
-                    dfp = fetch_join_minutes(server, db, user_id, sym, pd_, pd_)
-                    dfp = filter_window_str(dfp, window, cstart, cend)
-                    per_day_cache[key] = compute_day_method(dfp, mU) if not dfp.empty else float("nan")
-                v = per_day_cache[key]
+                v = per_day_cache[pd_].get(mU, float("nan"))
                 if np.isfinite(v):
                     vals.append(v)
             if len(vals) > 0:
@@ -721,6 +734,7 @@ def surge_extra_on_base(base_budget: float,
 
 # ---------------- Daily curve (no risk gates) ----------------
 @st.cache_data(show_spinner=False)
+@disk_cached()
 def compute_daily_curve(server: str, db: str, user_id: str, sym: str,
                         start_date: date, end_date: date,
                         window: str, cstart: Optional[str], cend: Optional[str],
@@ -777,42 +791,74 @@ def compute_daily_curve(server: str, db: str, user_id: str, sym: str,
         day_equity_start = cash + shares * prev_price
         day_trades = day_buys = day_sells = 0
 
-    for i in range(len(prices)):
-        if et_dates[i] != curr_day:
-            close_day(prices[i - 1], curr_day)
-            curr_day = et_dates[i]
-
-        if not finite_mask[i]:
-            continue
-
-        base_target = (cash + shares * prices[i]) if sizing_mode.startswith("REINVEST") else float(init_cap)
-        extra = surge_extra_on_base(
-            base_budget=float(init_cap),
-            ratio_now=float(ratios[i]),
-            baseline_ratio=float(baseline_minute[i]),
-            buy_pct=float(buy_pct),
-            enable=surge_enable,
-            tier1_mult=float(t1_mult), tier1_bonus_pct=float(t1_bonus),
-            tier2_mult=float(t2_mult), tier2_bonus_pct=float(t2_bonus),
-            cap_pct=float(surge_cap_pct)
-        )
+    # State only changes on a buy trigger while flat or a sell trigger while long:
+    # index those minutes once and jump between them day by day.
+    buy_idx = np.flatnonzero(buy_trig)
+    sell_idx = np.flatnonzero(sell_trig)
+    day_starts = np.r_[0, np.flatnonzero(et_dates[1:] != et_dates[:-1]) + 1]
+    day_ends = np.r_[day_starts[1:], len(prices)]
+
+    if HAVE_JIT:
+        eq_s, eq_e, n_tr, n_buy, n_sell, _, _ = curve_kernel(
+            prices, ratios, baseline_minute, buy_trig, sell_trig, day_starts.astype(np.int64),
+            float(init_cap), sizing_mode.startswith("REINVEST"), bool(surge_enable), float(buy_pct),
+            float(t1_mult), float(t1_bonus), float(t2_mult), float(t2_bonus), float(surge_cap_pct),
+            bool(force_flat_eod))
+        out = pd.DataFrame({
+            "et_date": et_dates[day_starts],
+            "equity_start": eq_s,
+            "equity_end": eq_e,
+            "day_return": (eq_e / eq_s) - 1.0,
+            "cum_return": (eq_e / float(init_cap)) - 1.0,
+            "trades": n_tr,
+            "buys": n_buy,
+            "sells": n_sell,
+        })
+        out["day_return_%"] = (out["day_return"] * 100.0).round(2)
+        out["cum_return_%"] = (out["cum_return"] * 100.0).round(2)
+        return out
 
-        if buy_trig[i] and shares <= 0.0:
-            target_notional = max(0.0, base_target + (extra if surge_enable else 0.0))
-            pos_notional = shares * prices[i]
-            to_spend = max(0.0, target_notional - pos_notional)
-            if to_spend > 0.0 and cash > 0.0:
-                qty = int(math.floor(min(cash, to_spend) / prices[i]))
-                if qty > 0:
-                    cash -= qty * prices[i]
-                    shares += qty
-                    day_trades += 1
-                    day_buys += 1
-        elif sell_trig[i] and shares > 0.0:
-            cash += shares * prices[i]
-            shares = 0.0
-            day_trades += 1
-            day_sells += 1
+    for a, z in zip(day_starts, day_ends):
+        if a > 0:
+            close_day(prices[a - 1], curr_day)
+            curr_day = et_dates[a]
+
+        i = a
+        while i < z:
+            if shares <= 0.0:
+                j = next_trigger(buy_idx, i, z)
+                if j < 0:
+                    break
+                base_target = (cash + shares * prices[j]) if sizing_mode.startswith("REINVEST") else float(init_cap)
+                extra = surge_extra_on_base(
+                    base_budget=float(init_cap),
+                    ratio_now=float(ratios[j]),
+                    baseline_ratio=float(baseline_minute[j]),
+                    buy_pct=float(buy_pct),
+                    enable=surge_enable,
+                    tier1_mult=float(t1_mult), tier1_bonus_pct=float(t1_bonus),
+                    tier2_mult=float(t2_mult), tier2_bonus_pct=float(t2_bonus),
+                    cap_pct=float(surge_cap_pct)
+                )
+                target_notional = max(0.0, base_target + (extra if surge_enable else 0.0))
+                pos_notional = shares * prices[j]
+                to_spend = max(0.0, target_notional - pos_notional)
+                if to_spend > 0.0 and cash > 0.0:
+                    qty = int(math.floor(min(cash, to_spend) / prices[j]))
+                    if qty > 0:
+                        cash -= qty * prices[j]
+                        shares += qty
+                        day_trades += 1
+                        day_buys += 1
+            else:
+                j = next_trigger(sell_idx, i, z)
+                if j < 0:
+                    break
+                cash += shares * prices[j]
+                shares = 0.0
+                day_trades += 1
+                day_sells += 1
+            i = j + 1
 
     close_day(prices[-1], curr_day)
 
@@ -834,6 +880,7 @@ def get_symbols(_engine, user_id: str) -> list:
     return d["symbol"].tolist()
 
 @st.cache_data(show_spinner=False)
+@disk_cached(ttl=600)
 def list_stock_days(_engine, user_id: str, symbol: str, d0: date, d1: date) -> pd.DataFrame:
     sql = """
     SELECT DISTINCT et_date
@@ -925,73 +972,36 @@ def simulate_day_fast(curr_join: pd.DataFrame,
 
     cap = float(start_capital) if cash is None else float(cash)
     pos = 0.0 if shares is None else float(shares)
-    trades = 0
-    day_log: List[dict] = [] if export_log else None
-
-    px = curr_join["stock_c"].to_numpy(float, copy=False)
-    vcol = stock_vol_col(curr_join)
-    vol = curr_join[vcol].to_numpy(float, copy=False)
-    R = (curr_join.get("ratio") if "ratio" in curr_join.columns else (curr_join["btc_c"] / curr_join["stock_c"])).to_numpy(float, copy=False)
-    dates_vec = curr_join["et_date"].to_numpy()
-    times_vec = curr_join["et_time"].to_numpy()
-
-    buy_thr = base_val * (1.0 + buy_pct / 100.0)
-    sell_thr = base_val * (1.0 - sell_pct / 100.0)
-
-    if base_budget is None:
-        base_budget = float(start_capital)
 
-    for i in range(len(px)):
-        p = px[i]
-        v = vol[i]
-        r = R[i]
-        if not np.isfinite(p) or p <= 0 or not np.isfinite(r):
-            continue
+    px, vol, R = day_arrays(curr_join)
+    if HAVE_JIT and not export_log:
+        cap, pos, trades = day_kernel(px, vol, R, float(base_val), float(buy_pct), float(sell_pct),
+                                      cap, pos, float(participation_cap_pct or 0))
+        return cap, pos, int(trades)
 
-        if r >= buy_thr and pos <= 0 and cap > 0:
-            buy_sh = math.floor(cap / p)
-            if participation_cap_pct and participation_cap_pct > 0:
-                buy_sh = min(buy_sh, int(v * (participation_cap_pct / 100.0)))
-            if buy_sh > 0:
-                spend = buy_sh * p
-                cap -= spend
-                pos = float(buy_sh)
-                trades += 1
-                if export_log:
-                    day_log.append({
-                        "symbol": symbol,
-                        "et_date": str(dates_vec[i]),
-                        "et_time": str(times_vec[i]),
-                        "session": "RTH" if is_rth_time(times_vec[i]) else "AH",
-                        "action": "BUY",
-                        "price": float(p),
-                        "ratio": float(r),
-                        "base": float(base_val),
-                        "shares_traded": int(buy_sh),
-                        "buy_pct": float(buy_pct),
-                        "sell_pct": float(sell_pct),
-                        "method": method
-                    })
-
-        elif r <= sell_thr and pos > 0.0:
-            cap += pos * p
-            if export_log:
-                day_log.append({
-                    "symbol": symbol,
-                    "et_date": str(dates_vec[i]),
-                    "et_time": str(times_vec[i]),
-                    "session": "RTH" if is_rth_time(times_vec[i]) else "AH",
-                    "action": "SELL",
-                    "price": float(p),
-                    "ratio": float(r),
-                    "base": float(base_val),
-                    "shares_traded": int(pos),
-                    "buy_pct": float(buy_pct),
-                    "sell_pct": float(sell_pct),
-                    "method": method
-                })
-            pos = 0.0
-            trades += 1
+    # Event-driven: only minutes that cross buy_thr (flat) / sell_thr (long) are visited
+    cap, pos, trades, events = simulate_day_jump(px, vol, R, base_val, buy_pct, sell_pct, cap, pos,
+                                                 participation_cap_pct=participation_cap_pct,
+                                                 export_log=export_log)
+    day_log: List[dict] = [] if export_log else None
+    if export_log and events:
+        dates_vec = curr_join["et_date"].to_numpy()
+        times_vec = curr_join["et_time"].to_numpy()
+        for i, action, qty in events:
+            day_log.append({
+                "symbol": symbol,
+                "et_date": str(dates_vec[i]),
+                "et_time": str(times_vec[i]),
+                "session": "RTH" if is_rth_time(times_vec[i]) else "AH",
+                "action": action,
+                "price": float(px[i]),
+                "ratio": float(R[i]),
+                "base": float(base_val),
+                "shares_traded": int(qty),
+                "buy_pct": float(buy_pct),
+                "sell_pct": float(sell_pct),
+                "method": method
+            })
 
     if export_log:
         return cap, pos, trades, day_log
@@ -1013,7 +1023,35 @@ def run_grid_for_symbol(server: str, db: str, user_id: str, symbol: str,
                         export_trades: bool = False,
                         split_mode: bool = False,
                         buy_list_rth: List[float] = None, sell_list_rth: List[float] = None,
-                        buy_list_ah: List[float] = None, sell_list_ah: List[float] = None):
+                        buy_list_ah: List[float] = None, sell_list_ah: List[float] = None,
+                        workers: int = 1, should_stop=None, adaptive: Optional[dict] = None,
+                        top_k: int = 0, log_dir: Optional[str] = None):
+    # workers > 1 shards this symbol's (method, buy, sell) space across processes (no trade log)
+    # should_stop() is polled between chunks of the scan; a stopped scan returns the rows finished so far
+    # adaptive = {coarse_stride, top_k, budget, compare} -> coarse-to-fine search instead of the full grid
+    # top_k > 0 keeps only the best top_k rows, pruning paths that cannot reach them
+    # log_dir streams the export_trades log to a file there; its path replaces the log frame
+    inputs = prepare_grid_for_symbol(server, db, user_id, symbol, d0, d1, window, t0, t1,
+                                     methods, lookback_n, min_shares, min_dollar,
+                                     apply_to_baseline, apply_to_triggers, split_mode, meta=meta)
+    if inputs is None:
+        return empty_grid(export_trades, log_dir)
+    return scan_grid(inputs, participation_cap_pct, buy_list, sell_list, start_capital,
+                     progress=progress, export_trades=export_trades, split_mode=split_mode,
+                     buy_list_rth=buy_list_rth, sell_list_rth=sell_list_rth,
+                     buy_list_ah=buy_list_ah, sell_list_ah=sell_list_ah,
+                     shard_workers=workers, should_stop=should_stop,
+                     surge=(dict(t1_mult=float(t1_mult), t1_bonus=float(t1_bonus), t2_mult=float(t2_mult),
+                                 t2_bonus=float(t2_bonus), surge_cap_pct=float(surge_cap_pct)) if surge_enable else None),
+                     adaptive=adaptive, top_k=top_k, trade_log_dir=log_dir)
+
+def prepare_grid_for_symbol(server: str, db: str, user_id: str, symbol: str,
+                            d0, d1, window, t0, t1,
+                            methods, lookback_n,
+                            min_shares, min_dollar,
+                            apply_to_baseline, apply_to_triggers,
+                            split_mode: bool = False, meta=None) -> Optional[dict]:
+    """SQL + baselines for one symbol -> grid_inputs(...) for scan_grid, or None when there is nothing to scan."""
     # Prefetch all joined minutes (includes prev days for baselines)
     # Determine earliest prior trading day needed for baseline
     prev_q = """
@@ -1037,7 +1075,7 @@ def run_grid_for_symbol(server: str, db: str, user_id: str, symbol: str,
     if meta:
         meta(symbol, len(df_all), len(df_all), len(test_days))
     if df_all.empty or not test_days:
-        return (pd.DataFrame([]), pd.DataFrame([])) if export_trades else pd.DataFrame([])
+        return None
 
     # Window filters
     if window == "RTH":
@@ -1045,14 +1083,13 @@ def run_grid_for_symbol(server: str, db: str, user_id: str, symbol: str,
     elif window == "CUSTOM" and t0 and t1:
         df_all = df_all[(df_all["et_time"] >= t0) & (df_all["et_time"] <= t1)]
 
-    # Split by day across full range
-    all_days_sorted = sorted(pd.to_datetime(df_all["et_date"]).dt.date.unique().tolist())
-    by_day_all = {d: df_all[pd.to_datetime(df_all["et_date"]).dt.date.eq(d)].copy() for d in all_days_sorted}
+    # Split by day across full range (one date parse; per-day / lookback slices are offset views)
+    day_ix = DayIndex(df_all)
 
     # Precompute current-day joins for triggers (with optional filters)
     curr_join_by_day = {}
     for d in test_days:
-        cj = by_day_all.get(d, pd.DataFrame())
+        cj = day_ix.day(d)
         if cj.empty:
             continue
         if apply_to_triggers:
@@ -1060,326 +1097,63 @@ def run_grid_for_symbol(server: str, db: str, user_id: str, symbol: str,
         if not cj.empty:
             curr_join_by_day[d] = cj
 
-    def prev_days_from_sorted(days_sorted, ref_day, n):
-        if ref_day not in days_sorted:
-            return []
-        idx = days_sorted.index(ref_day)
-        lo = max(0, idx - n)
-        return days_sorted[lo:idx] if idx - lo >= n else []
-
     # Baselines
     if not split_mode:
+        # One lookback concat per day; every method comes out of a single kernel pass
         base_by_day_method = {}
-        for method in methods:
-            for d in test_days:
-                pdays = prev_days_from_sorted(all_days_sorted, d, int(lookback_n))
-                if len(pdays) < int(lookback_n):
-                    continue
-                pj = pd.concat([by_day_all.get(dd, pd.DataFrame()) for dd in pdays], ignore_index=True)
-                if pj.empty:
-                    continue
-                if apply_to_baseline:
-                    pj = filter_minutes(pj, min_shares=min_shares, min_dollar=min_dollar)
-                base_by_day_method[(d, method)] = baseline_value(pj, method=method) if len(pj) >= 30 else np.nan
+        for d in test_days:
+            pj = day_ix.lookback(d, int(lookback_n))
+            if pj.empty:
+                continue
+            if apply_to_baseline:
+                pj = filter_minutes(pj, min_shares=min_shares, min_dollar=min_dollar)
+            vals = baseline_values_multi(*baseline_arrays(pj), methods)[0] if len(pj) >= 30 else {}
+            for method in methods:
+                base_by_day_method[(d, method)] = vals.get(method, np.nan)
     else:
         base_by_day_method_sess = {}
-        for method in methods:
-            for d in test_days:
-                pdays = prev_days_from_sorted(all_days_sorted, d, int(lookback_n))
-                if len(pdays) < int(lookback_n):
-                    continue
-                pj = pd.concat([by_day_all.get(dd, pd.DataFrame()) for dd in pdays], ignore_index=True)
-                if pj.empty:
-                    continue
-                # Prefer stored is_rth if present
-                if "is_rth" in pj.columns:
-                    pj_rth = pj[pj["is_rth"] == 1]
-                    pj_ah = pj[pj["is_rth"] != 1]
-                else:
-                    pj_rth = pj[pj["et_time"].apply(is_rth_time)]
-                    pj_ah = pj[~pj["et_time"].apply(is_rth_time)]
-                if apply_to_baseline:
-                    pj_rth = filter_minutes(pj_rth, min_shares=min_shares, min_dollar=min_dollar)
-                    pj_ah = filter_minutes(pj_ah, min_shares=min_shares, min_dollar=min_dollar)
-                base_by_day_method_sess[(d, method, "RTH")] = baseline_value(pj_rth, method=method) if len(pj_rth) >= 30 else np.nan
-                base_by_day_method_sess[(d, method, "AH")] = baseline_value(pj_ah, method=method) if len(pj_ah) >= 30 else np.nan
-
-    # 5) Scan thresholds
-    results = []
-    trades_logs = []
-
-    if not split_mode:
-        for method in methods:
-            for b in buy_list:
-                for s in sell_list:
-                    cash = float(start_capital)
-                    shares = 0.0
-                    total_trades = 0
-                    used_days = 0
-                    last_px_seen = np.nan
-                    mark_date = None
-                    mark_time = None
-
-                    for d in test_days:
-                        base_val = base_by_day_method.get((d, method), np.nan)
-                        cj = curr_join_by_day.get(d, None)
-                        if cj is None or not np.isfinite(base_val):
-                            continue
-                        sim = simulate_day_fast(
-                            curr_join=cj,
-                            base_val=base_val,
-                            buy_pct=b, sell_pct=s,
-                            start_capital=start_capital,
-                            participation_cap_pct=participation_cap_pct,
-                            surge_enable=False, t1_mult=2.0, t1_bonus=10.0, t2_mult=3.0, t2_bonus=10.0, surge_cap_pct=50.0,
-                            cash=cash, shares=shares, base_budget=start_capital,
-                            export_log=export_trades, symbol=symbol, method=method
-                        )
-                        if export_trades:
-                            cash, shares, t_day, log_day = sim
-                            if log_day:
-                                trades_logs.extend(log_day)
-                        else:
-                            cash, shares, t_day = sim
-                        total_trades += t_day
-                        used_days += 1
-                        if not cj.empty:
-                            last_px_seen = float(cj.iloc[-1]["stock_c"])
-                            mark_date = cj.iloc[-1]["et_date"]
-                            mark_time = cj.iloc[-1]["et_time"]
-
-                    final_equity = cash + (shares * (last_px_seen if np.isfinite(last_px_seen) else 0.0))
-                    total_return = (final_equity / start_capital) - 1.0 if used_days > 0 else np.nan
-                    results.append({
-                        "symbol": symbol,
-                        "method": method,
-                        "buy_pct": b,
-                        "sell_pct": s,
-                        "n_trades": total_trades,
-                        "days_used": used_days,
-                        "ending_shares": int(shares),
-                        "final_cash": round(cash, 2),
-                        "final_equity": round(final_equity, 2),
-                        "total_return": total_return
-                    })
-                    if export_trades:
-                        trades_logs.append({
-                            "symbol": symbol,
-                            "et_date": str(mark_date) if mark_date is not None else "",
-                            "et_time": str(mark_time) if mark_time is not None else "",
-                            "session": "MARK",
-                            "action": "MARK",
-                            "price": float(last_px_seen) if (last_px_seen == last_px_seen) else None,
-                            "ratio": None,
-                            "base": None,
-                            "shares_traded": int(shares),
-                            "buy_pct": float(b),
-                            "sell_pct": float(s),
-                            "method": method,
-                            "valuation_policy": "LAST_MINUTE",
-                            "final_cash": round(cash, 2),
-                            "final_equity": round(final_equity, 2)
-                        })
-    else:
-        for method in methods:
-            for b_rth in (buy_list_rth or []):
-                for s_rth in (sell_list_rth or []):
-                    for b_ah in (buy_list_ah or []):
-                        for s_ah in (sell_list_ah or []):
-                            cash = float(start_capital)
-                            shares = 0.0
-                            total_trades = 0
-                            used_days = 0
-                            last_px_seen = np.nan
-                            mark_date = None
-                            mark_time = None
-
-                            for d in sorted(curr_join_by_day.keys()):
-                                br = np.nan
-                                ba = np.nan
-                                if (d, method, "RTH") in locals().get('base_by_day_method_sess', {}):
-                                    br = base_by_day_method_sess.get((d, method, "RTH"), np.nan)
-                                if (d, method, "AH") in locals().get('base_by_day_method_sess', {}):
-                                    ba = base_by_day_method_sess.get((d, method, "AH"), np.nan)
-
-                                cj = curr_join_by_day.get(d, None)
-                                if cj is None or (not np.isfinite(br) and not np.isfinite(ba)):
-                                    continue
-                                px = cj["stock_c"].to_numpy(float, copy=False)
-                                vcol = stock_vol_col(cj)
-                                vol = cj[vcol].to_numpy(float, copy=False)
-                                R = (cj.get("ratio") if "ratio" in cj.columns else (cj["btc_c"] / cj["stock_c"])).to_numpy(float, copy=False)
-                                tms = cj["et_time"].to_numpy()
-                                sess_col = cj["is_rth"].to_numpy() if "is_rth" in cj.columns else np.array([1 if is_rth_time(x) else 0 for x in tms])
-
-                                for i in range(len(px)):
-                                    p = px[i]
-                                    v = vol[i]
-                                    r = R[i]
-                                    sess_rth = (sess_col[i] == 1)
-                                    if not np.isfinite(p) or p <= 0 or not np.isfinite(r):
-                                        continue
-                                    if sess_rth:
-                                        base = br
-                                        buy_thr = base * (1.0 + b_rth / 100.0) if np.isfinite(base) else np.nan
-                                        sell_thr = base * (1.0 - s_rth / 100.0) if np.isfinite(base) else np.nan
-                                        cap_lim = participation_cap_pct
-                                    else:
-                                        base = ba
-                                        buy_thr = base * (1.0 + b_ah / 100.0) if np.isfinite(base) else np.nan
-                                        sell_thr = base * (1.0 - s_ah / 100.0) if np.isfinite(base) else np.nan
-                                        cap_lim = participation_cap_pct
-
-                                    if not np.isfinite(base):
-                                        continue
-
-                                    if r >= buy_thr and shares <= 0.0 and cash > 0.0:
-                                        qty = math.floor(cash / p)
-                                        if cap_lim and cap_lim > 0:
-                                            qty = min(qty, int(v * (cap_lim / 100.0)))
-                                        if qty > 0:
-                                            cash -= qty * p
-                                            shares += qty
-                                            total_trades += 1
-                                    elif r <= sell_thr and shares > 0.0:
-                                        qty = int(shares)
-                                        cash += qty * p
-                                        shares = 0.0
-                                        total_trades += 1
-                                used_days += 1
-                                if not cj.empty:
-                                    last_px_seen = float(cj.iloc[-1]["stock_c"])
-                                    mark_date = cj.iloc[-1]["et_date"]
-                                    mark_time = cj.iloc[-1]["et_time"]
-
-                            final_equity = cash + (shares * (last_px_seen if np.isfinite(last_px_seen) else 0.0))
-                            total_return = (final_equity / start_capital) - 1.0 if used_days > 0 else np.nan
-                            results.append({
-                                "symbol": symbol,
-                                "method": method,
-                                "buy_pct_rth": b_rth,
-                                "sell_pct_rth": s_rth,
-                                "buy_pct_ah": b_ah,
-                                "sell_pct_ah": s_ah,
-                                "n_trades": total_trades,
-                                "days_used": used_days,
-                                "ending_shares": int(shares),
-                                "final_cash": round(cash, 2),
-                                "final_equity": round(final_equity, 2),
-                                "total_return": total_return
-                            })
-
-                            if export_trades:
-                                results_mark = {
-                                    "symbol": symbol,
-                                    "et_date": str(mark_date) if mark_date is not None else "",
-                                    "et_time": str(mark_time) if mark_time is not None else "",
-                                    "session": "MARK",
-                                    "action": "MARK",
-                                    "price": float(last_px_seen) if (last_px_seen == last_px_seen) else None,
-                                    "ratio": None,
-                                    "base": None,
-                                    "shares_traded": int(shares),
-                                    "buy_pct_rth": float(b_rth),
-                                    "sell_pct_rth": float(s_rth),
-                                    "buy_pct_ah": float(b_ah),
-                                    "sell_pct_ah": float(s_ah),
-                                    "method": method,
-                                    "valuation_policy": "LAST_MINUTE",
-                                    "final_cash": round(cash, 2),
-                                    "final_equity": round(final_equity, 2)
-                                }
-                                trades_logs.append(results_mark)
-
-    res = pd.DataFrame(results)
-    if not res.empty:
-        sort_cols = ["symbol", "method", "total_return"]
-        res = res.sort_values(sort_cols, ascending=[True, True, False]).reset_index(drop=True)
-
-    if export_trades:
-        trades_df = pd.DataFrame(trades_logs) if trades_logs else pd.DataFrame(columns=[
-            "symbol", "et_date", "et_time", "session", "action", "price", "ratio", "base",
-            "shares_traded", "buy_pct", "sell_pct", "method",
-            "buy_pct_rth", "sell_pct_rth", "buy_pct_ah", "sell_pct_ah",
-            "valuation_policy", "final_cash", "final_equity"
-        ])
-        return res, trades_df
-
-    return res
+        for d in test_days:
+            pj = day_ix.lookback(d, int(lookback_n))
+            if pj.empty:
+                continue
+            # Prefer stored is_rth if present
+            if "is_rth" in pj.columns:
+                pj_rth = pj[pj["is_rth"] == 1]
+                pj_ah = pj[pj["is_rth"] != 1]
+            else:
+                pj_rth = pj[pj["et_time"].apply(is_rth_time)]
+                pj_ah = pj[~pj["et_time"].apply(is_rth_time)]
+            if apply_to_baseline:
+                pj_rth = filter_minutes(pj_rth, min_shares=min_shares, min_dollar=min_dollar)
+                pj_ah = filter_minutes(pj_ah, min_shares=min_shares, min_dollar=min_dollar)
+            vals_rth = baseline_values_multi(*baseline_arrays(pj_rth), methods)[0] if len(pj_rth) >= 30 else {}
+            vals_ah = baseline_values_multi(*baseline_arrays(pj_ah), methods)[0] if len(pj_ah) >= 30 else {}
+            for method in methods:
+                base_by_day_method_sess[(d, method, "RTH")] = vals_rth.get(method, np.nan)
+                base_by_day_method_sess[(d, method, "AH")] = vals_ah.get(method, np.nan)
+
+    return grid_inputs(symbol, methods, test_days, curr_join_by_day,
+                       base_by_day_method if not split_mode else None,
+                       base_by_day_method_sess if split_mode else None)
 
 # ---------------- Trade Detail helpers ----------------
 
 # ==== Daily (Fast) helpers — per-day leaderboard + confidence ====
 from typing import Optional
 
-def _forward_returns(px: np.ndarray, horizon: int) -> np.ndarray:
-    if horizon <= 0 or len(px) <= horizon:
-        return np.array([])
-    base = np.maximum(px[:-horizon], 1e-12)
-    return (px[horizon:] - px[:-horizon]) / base
-
-def _weighted_corr(x: np.ndarray, y: np.ndarray, w: Optional[np.ndarray] = None) -> float:
-    mask = np.isfinite(x) & np.isfinite(y)
-    if w is not None:
-        mask &= np.isfinite(w) & (w > 0)
-    x = x[mask]; y = y[mask]; w = (w[mask] if w is not None else None)
-    n = len(x)
-    if n < 3:
-        return float("nan")
-    if w is None:
-        xm, ym = x.mean(), y.mean()
-        cov = ((x - xm) * (y - ym)).mean()
-        vx = ((x - xm)**2).mean(); vy = ((y - ym)**2).mean()
-    else:
-        ws = w.sum()
-        xm = (w * x).sum() / ws; ym = (w * y).sum() / ws
-        cov = (w * (x - xm) * (y - ym)).sum() / ws
-        vx = (w * (x - xm)**2).sum() / ws
-        vy = (w * (y - ym)**2).sum() / ws
-    denom = float(np.sqrt(vx * vy))
-    return float(cov / denom) if denom > 0 else float("nan")
-
-def _spearman_r(x: np.ndarray, y: np.ndarray, w: Optional[np.ndarray] = None) -> float:
-    rx = pd.Series(x).rank(method="average").to_numpy()
-    ry = pd.Series(y).rank(method="average").to_numpy()
-    return _weighted_corr(rx, ry, w)
-
-def fisher_confidence(r: float, n: int) -> float:
-    if not np.isfinite(r) or n < 5:
-        return 0.0
-    r = float(np.clip(r, -0.999999, 0.999999))
-    z = np.arctanh(r) * np.sqrt(max(n - 3, 1))
-    score = 100.0 * (1.0 - np.exp(-abs(z)))  # 0..100
-    return float(np.clip(score, 0.0, 100.0))
-
 def day_signal_correlation(cj: pd.DataFrame, base_val: float, horizon: int = 10, use_dollar_weights: bool = True):
     """
     Intraday correlation between (ratio/base - 1) and forward returns.
     Returns: (n_samples, pearson_r, spearman_r, confidence_score)
+    Several horizons of one day: signal_correlations(*signal_arrays(cj, base_val), horizons).
     """
-    if cj.empty or not np.isfinite(base_val):
+    if cj.empty or not np.isfinite(base_val) or horizon <= 0:
         return 0, float("nan"), float("nan"), 0.0
-
-    px = cj["stock_c"].to_numpy(float, copy=False)
-    ratio = (cj["btc_c"].to_numpy(float, copy=False) / np.maximum(cj["stock_c"].to_numpy(float, copy=False), 1e-12))
-    sig = (ratio / float(base_val)) - 1.0
-
-    if len(px) <= horizon:
-        return 0, float("nan"), float("nan"), 0.0
-
-    fwd = _forward_returns(px, int(horizon))
-    sig = sig[:-int(horizon)]
-    w = None
-    if use_dollar_weights and "dollar_volume" in cj.columns:
-        w = cj["dollar_volume"].to_numpy(float, copy=False)[:-int(horizon)]
-
-    pear = _weighted_corr(sig, fwd, w)
-    spear = _spearman_r(sig, fwd, w)
-    n = len(sig)
-    conf = fisher_confidence(pear, n)
-    return n, pear, spear, conf
+    n, pear, spear, conf = signal_correlations(*signal_arrays(cj, base_val, use_dollar_weights), [int(horizon)])[0]
+    return int(n), float(pear), float(spear), float(conf)
 
 @st.cache_data(show_spinner=False)
+@disk_cached()
 def run_daily_best_for_symbol(server: str, db: str, user_id: str, symbol: str,
                               d0, d1, window, t0, t1,
                               methods, lookback_n,
@@ -1423,8 +1197,8 @@ def run_daily_best_for_symbol(server: str, db: str, user_id: str, symbol: str,
         return pd.DataFrame([]), pd.DataFrame([])
 
     # Days
-    all_days = sorted(pd.to_datetime(df_all["et_date"]).dt.date.unique().tolist())
-    by_day = {d: df_all[pd.to_datetime(df_all["et_date"]).dt.date.eq(d)].copy() for d in all_days}
+    day_ix = DayIndex(df_all)
+    all_days = day_ix.days
 
     # Liquidity filter helpers (match Batch flags)
     def filt(df):
@@ -1432,52 +1206,45 @@ def run_daily_best_for_symbol(server: str, db: str, user_id: str, symbol: str,
 
     # Baselines from previous N trading days
     base_by_day_method = {}
-    for method in methods:
-        for d in all_days:
-            idx = all_days.index(d)
-            prev_days = all_days[max(0, idx - int(lookback_n)):idx]
-            if len(prev_days) < int(lookback_n):
-                continue
-            pj = pd.concat([by_day.get(dd, pd.DataFrame()) for dd in prev_days], ignore_index=True)
-            if pj.empty:
-                continue
-            if apply_to_baseline:
-                pj = filter_minutes(pj, min_shares=min_shares, min_dollar=min_dollar)
-            base_by_day_method[(d, method)] = baseline_value(pj, method=method) if len(pj) >= 30 else float("nan")
-
-    # Grid per day
-    daily_rows = []
     for d in all_days:
-        cj = by_day.get(d, pd.DataFrame())
-        if cj.empty:
+        pj = day_ix.lookback(d, int(lookback_n))
+        if pj.empty:
             continue
-        cj_trig = filt(cj) if apply_to_triggers else cj
-        last_px = float(cj_trig.iloc[-1]["stock_c"]) if not cj_trig.empty else float("nan")
-
-        day_best = None
+        if apply_to_baseline:
+            pj = filter_minutes(pj, min_shares=min_shares, min_dollar=min_dollar)
+        vals = baseline_values_multi(*baseline_arrays(pj), methods)[0] if len(pj) >= 30 else {}
         for method in methods:
-            base_val = base_by_day_method.get((d, method), float("nan"))
-            if not np.isfinite(base_val) or cj_trig.empty:
-                continue
-            for b in buy_list:
-                for s in sell_list:
-                    cash, shares, ntr = simulate_day_fast(
-                        curr_join=cj_trig, base_val=base_val,
-                        buy_pct=b, sell_pct=s, start_capital=float(start_capital),
-                        participation_cap_pct=int(participation_cap_pct),
-                        surge_enable=False, cash=float(start_capital), shares=0.0, base_budget=float(start_capital),
-                        export_log=False, symbol=symbol, method=method
-                    )
-                    equity = cash + shares * (last_px if np.isfinite(last_px) else 0.0)
-                    day_ret = (equity / float(start_capital)) - 1.0
-                    row = (method, b, s, ntr, day_ret, base_val)
-                    if (day_best is None) or (day_ret > day_best[4]):
-                        day_best = row
+            base_by_day_method[(d, method)] = vals.get(method, float("nan"))
 
-        if day_best is None:
-            continue
+    # Every (day, method, buy%, sell%) at once: days are isolated (fresh wallet, no carry), so
+    # all days run as one batch and each day's winner comes out of a single argmax
+    trig = []
+    for d in all_days:
+        cj = day_ix.day(d)
+        cj_trig = filt(cj) if (apply_to_triggers and not cj.empty) else cj
+        if not cj_trig.empty:
+            trig.append((d, cj_trig))
+    if not trig:
+        return pd.DataFrame([]), pd.DataFrame([])
+    arrs = [day_arrays(cj) for _, cj in trig]
+    day_starts = np.cumsum([0] + [len(a[0]) for a in arrs[:-1]]).astype(np.int64)
+    px, vol, R = (np.concatenate([a[c] for a in arrs]) for c in range(3))
+    last_px = np.array([a[0][-1] for a in arrs], dtype=float)
+    base = np.array([[base_by_day_method.get((d, m), float("nan")) for m in methods] for d, _ in trig], dtype=float)
+    buy_k, sell_k = grid_pairs(buy_list, sell_list)
+    cash, shares, trades = simulate_isolated_days(px, vol, R, day_starts, base, buy_k, sell_k,
+                                                  float(start_capital), int(participation_cap_pct))
+    best_k, day_ret = best_per_day(cash, shares, last_px, base, float(start_capital))
 
-        best_method, best_b, best_s, best_trades, best_ret, base_val = day_best
+    daily_rows = []
+    n_pairs = len(buy_k)
+    for j, (d, cj_trig) in enumerate(trig):
+        k = int(best_k[j])
+        if k < 0:
+            continue
+        m, pk = divmod(k, n_pairs)
+        best_method, best_b, best_s = methods[m], buy_k[pk], sell_k[pk]
+        best_trades, best_ret, base_val = int(trades[j, m, pk]), float(day_ret[j]), float(base[j, m])
         n, pear, spear, conf = day_signal_correlation(cj_trig, base_val, horizon=int(corr_horizon))
 
         daily_rows.append({
@@ -1514,14 +1281,6 @@ def run_daily_best_for_symbol(server: str, db: str, user_id: str, symbol: str,
     return daily_df, summary
 # ==== End Daily helpers ====
 
-def ten_minute_excl(i: int, v: np.ndarray, px: np.ndarray) -> Tuple[float, float]:
-    n = len(v)
-    lo = max(0, i - 5)
-    hi = min(n - 1, i + 5)
-    shares = float(v[lo:hi + 1].sum() - v[i])
-    dollars = float((v[lo:hi + 1] * px[lo:hi + 1]).sum() - v[i] * px[i])
-    return shares, dollars
-
 @st.cache_data(show_spinner=False)
 def compute_daily_baselines_single(server: str, db: str, user_id: str, sym: str,
                                    start_date: date, end_date: date,
@@ -1563,129 +1322,115 @@ def simulate_trade_detail(df_all: pd.DataFrame,
                           symbol: str,
                           buy_pct: float, sell_pct: float,
                           init_cap: float,
-                          flatten_eod: bool = False) -> pd.DataFrame:
+                          flatten_eod: bool = False,
+                          method: str = "METHOD") -> pd.DataFrame:
     if df_all.empty:
-        return pd.DataFrame(columns=[
-            "symbol", "et_date", "et_time", "action", "price", "ratio", "base",
-            "shares_traded", "buy_pct", "sell_pct", "method",
-            "day_total_shares", "day_total_value",
-            "minute_shares", "minute_value",
-            "ten_min_shares", "ten_min_value"
-        ])
+        return pd.DataFrame(columns=DETAIL_COLUMNS)
 
-    et_dates = pd.to_datetime(df_all["et_date"]).dt.date.to_numpy()
-    et_times = pd.to_datetime(df_all["et_time"].astype(str), errors="coerce").dt.time.astype(str).to_numpy()
+    et_ts = pd.to_datetime(df_all["et_date"]).to_numpy().astype("datetime64[D]")
     px = df_all["stock_c"].to_numpy(dtype=np.float64)
     vcol = stock_vol_col(df_all)
     vol = df_all[vcol].to_numpy(dtype=np.float64)
     btc = df_all["btc_c"].to_numpy(dtype=np.float64)
     ratio = (btc / np.maximum(1e-12, px))
-    base_vec = np.array([method_map.get(d, np.nan) for d in et_dates], dtype=np.float64)
-    finite = np.isfinite(base_vec)
-
-    buy_trig = (ratio >= base_vec * (1.0 + buy_pct / 100.0)) & finite
-    sell_trig = (ratio <= base_vec * (1.0 - sell_pct / 100.0)) & finite
-
-    day_total_shares = pd.Series(vol).groupby(et_dates).transform("sum").to_numpy()
-    day_total_value = pd.Series(vol * px).groupby(et_dates).transform("sum").to_numpy()
-
-    cash = float(init_cap)
-    shares = 0.0
-    records = []
-    curr_day = et_dates[0]
-
-    for i in range(len(px)):
-        if et_dates[i] != curr_day and flatten_eod and shares > 0.0:
-            j = i - 1
-            if j >= 0:
-                ten_sh, ten_val = ten_minute_excl(j, vol, px)
-                records.append({
-                    "symbol": symbol,
-                    "et_date": str(et_dates[j]),
-                    "et_time": et_times[j],
-                    "action": "SELL",
-                    "price": float(px[j]),
-                    "ratio": float(ratio[j]),
-                    "base": float(base_vec[j]),
-                    "shares_traded": int(shares),
-                    "buy_pct": float(buy_pct),
-                    "sell_pct": float(sell_pct),
-                    "method": st.session_state.get("trade_method_name", "METHOD"),
-                    "day_total_shares": float(day_total_shares[j]),
-                    "day_total_value": float(day_total_value[j]),
-                    "minute_shares": float(vol[j]),
-                    "minute_value": float(vol[j] * px[j]),
-                    "ten_min_shares": float(ten_sh),
-                    "ten_min_value": float(ten_val)
-                })
-                cash += shares * px[j]
-                shares = 0.0
-            curr_day = et_dates[i]
 
-        if not finite[i]:
-            continue
-
-        if buy_trig[i] and shares <= 0.0 and cash > 0.0:
-            pos_notional = shares * px[i]
-            target = cash + pos_notional
-            to_spend = max(0.0, target - pos_notional)
-            qty = int(math.floor(min(cash, to_spend) / px[i]))
-            if qty > 0:
-                ten_sh, ten_val = ten_minute_excl(i, vol, px)
-                records.append({
-                    "symbol": symbol,
-                    "et_date": str(et_dates[i]),
-                    "et_time": et_times[i],
-                    "action": "BUY",
-                    "price": float(px[i]),
-                    "ratio": float(ratio[i]),
-                    "base": float(base_vec[i]),
-                    "shares_traded": int(qty),
-                    "buy_pct": float(buy_pct),
-                    "sell_pct": float(sell_pct),
-                    "method": st.session_state.get("trade_method_name", "METHOD"),
-                    "day_total_shares": float(day_total_shares[i]),
-                    "day_total_value": float(day_total_value[i]),
-                    "minute_shares": float(vol[i]),
-                    "minute_value": float(vol[i] * px[i]),
-                    "ten_min_shares": float(ten_sh),
-                    "ten_min_value": float(ten_val)
-                })
-                cash -= qty * px[i]
-                shares += qty
-
-        elif sell_trig[i] and shares > 0.0:
-            qty = int(shares)
-            if qty > 0:
-                ten_sh, ten_val = ten_minute_excl(i, vol, px)
-                records.append({
-                    "symbol": symbol,
-                    "et_date": str(et_dates[i]),
-                    "et_time": et_times[i],
-                    "action": "SELL",
-                    "price": float(px[i]),
-                    "ratio": float(ratio[i]),
-                    "base": float(base_vec[i]),
-                    "shares_traded": int(qty),
-                    "buy_pct": float(buy_pct),
-                    "sell_pct": float(sell_pct),
-                    "method": st.session_state.get("trade_method_name", "METHOD"),
-                    "day_total_shares": float(day_total_shares[i]),
-                    "day_total_value": float(day_total_value[i]),
-                    "minute_shares": float(vol[i]),
-                    "minute_value": float(vol[i] * px[i]),
-                    "ten_min_shares": float(ten_sh),
-                    "ten_min_value": float(ten_val)
-                })
-                cash += shares * px[i]
-                shares = 0.0
-
-    cols = ["symbol", "et_date", "et_time", "action", "price", "ratio", "base",
-            "shares_traded", "buy_pct", "sell_pct", "method",
-            "day_total_shares", "day_total_value",
-            "minute_shares", "minute_value",
-            "ten_min_shares", "ten_min_value"]
-    return pd.DataFrame.from_records(records, columns=cols)
+    # Contiguous day runs (the wallet and the ±5-minute window follow row order) and day keys
+    day_starts = np.r_[0, np.flatnonzero(et_ts[1:] != et_ts[:-1]) + 1]
+    keys, day_of = np.unique(et_ts, return_inverse=True)
+    key_base = np.array([method_map.get(d, np.nan) for d in keys.astype(object)], dtype=np.float64)
+    base_vec = key_base[day_of]
+
+    idx, is_buy, qty = simulate_trade_log(px, ratio, base_vec, day_starts,
+                                          float(buy_pct), float(sell_pct), float(init_cap),
+                                          flatten_eod=flatten_eod)
+    if len(idx) == 0:
+        return pd.DataFrame(columns=DETAIL_COLUMNS)
+
+    dollars = vol * px
+    day_shares = np.bincount(day_of, weights=np.nan_to_num(vol, nan=0.0))
+    day_value = np.bincount(day_of, weights=np.nan_to_num(dollars, nan=0.0))
+    ten_sh = centered_sums(vol)[idx]
+    ten_val = centered_sums(dollars)[idx]
+    times = pd.to_datetime(df_all["et_time"].iloc[idx].astype(str), errors="coerce").dt.time.astype(str)
+
+    n = len(idx)
+    return pd.DataFrame({
+        "symbol": np.full(n, symbol, dtype=object),
+        "et_date": np.datetime_as_string(et_ts[idx], unit="D").astype(object),
+        "et_time": times.to_numpy(dtype=object),
+        "action": np.where(is_buy, "BUY", "SELL").astype(object),
+        "price": px[idx],
+        "ratio": ratio[idx],
+        "base": base_vec[idx],
+        "shares_traded": qty,
+        "buy_pct": np.full(n, float(buy_pct)),
+        "sell_pct": np.full(n, float(sell_pct)),
+        "method": np.full(n, method, dtype=object),
+        "day_total_shares": day_shares[day_of[idx]],
+        "day_total_value": day_value[day_of[idx]],
+        "minute_shares": vol[idx],
+        "minute_value": dollars[idx],
+        "ten_min_shares": ten_sh,
+        "ten_min_value": ten_val,
+    }, columns=DETAIL_COLUMNS)
+
+# ---------------- Result browser (paged view over stored result files) ----------------
+@st.cache_data(show_spinner=False)
+def browser_profile(path: str, mtime: float) -> Dict[str, dict]:
+    return column_profile(path)
+
+def browse_results(title: str, path: str, key: str, columns: Optional[List[str]] = None,
+                   filter_cols: Tuple[str, ...] = (), sort: Optional[str] = None, ascending: bool = False):
+    """Filter / sort / page a stored result file; only the visible page is queried and sent to the page."""
+    st.subheader(title)
+    if not path or not os.path.exists(path):
+        st.info("These results are no longer stored; run again to browse them.")
+        return
+    prof = browser_profile(path, os.path.getmtime(path))
+    shown = [c for c in (columns or list(prof)) if c in prof]
+    filters = []
+    fcols = [c for c in filter_cols if c in prof]
+    for c, box in zip(fcols, st.columns(len(fcols)) if fcols else []):
+        p = prof[c]
+        with box:
+            if p["choices"] is not None:
+                sel = st.multiselect(c, p["choices"], key=f"{key}_f_{c}")
+                if sel:
+                    filters.append((c, "in", sel))
+            elif p["kind"] == "number":
+                if p["min"] is not None and float(p["min"]) < float(p["max"]):
+                    lo, hi = float(p["min"]), float(p["max"])
+                    a, b = st.slider(c, lo, hi, (lo, hi), key=f"{key}_f_{c}")
+                    if a > lo:
+                        filters.append((c, ">=", a))
+                    if b < hi:
+                        filters.append((c, "<=", b))
+            else:
+                txt = st.text_input(f"{c} contains", key=f"{key}_f_{c}")
+                if txt:
+                    filters.append((c, "contains", txt))
+
+    s1, s2, s3, s4 = st.columns([2, 1, 1, 1])
+    with s1:
+        order_opts = ["(stored order)"] + shown
+        sort_col = st.selectbox("Sort by", order_opts, index=(order_opts.index(sort) if sort in shown else 0),
+                                key=f"{key}_sort")
+        sort_col = sort_col if sort_col in shown else None
+    with s2:
+        desc = st.checkbox("Descending", value=not ascending, key=f"{key}_desc")
+    with s3:
+        size = st.selectbox("Rows per page", [50, 100, 250, 1000], index=1, key=f"{key}_size")
+    page = int(st.session_state.get(f"{key}_page", 1))
+    page_df, total = query_page(path, filters, sort_col, not desc, page, int(size), columns=shown)
+    n_pages = max(1, -(-total // int(size)))
+    if page > n_pages:
+        page = n_pages
+        st.session_state[f"{key}_page"] = page
+        page_df, total = query_page(path, filters, sort_col, not desc, page, int(size), columns=shown)
+    with s4:
+        st.number_input("Page", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+    st.caption(f"{total:,} matching rows • page {page} of {n_pages:,}")
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
 
 # ---------------- Sidebar (one config) ----------------
 with st.sidebar:
@@ -1720,9 +1465,17 @@ with st.sidebar:
             try:
                 st.cache_data.clear()
                 st.cache_resource.clear()
-                st.success("Caches cleared.")
+                st.success("Caches cleared (shared disk cache kept).")
             except Exception as e:
                 st.error(f"Clear cache error: {e}")
+        if st.button("Clear disk cache", key="btn_clear_disk_cache",
+                     help="Also drops the shared on-disk results every app and user on this machine reads"):
+            st.cache_data.clear()
+            if clear_disk_cache():
+                st.success("Disk cache cleared.")
+            else:
+                st.info("Disk cache is off or unavailable.")
+        st.caption(cache_summary())
 
     engine = get_engine(server, db, trusted=True, driver=odbc_drv)
 
@@ -1865,56 +1618,27 @@ with tab_grid:
             total_runs = len(methods_g) * len(buy_vals) * len(sell_vals)
             prog = st.progress(0.0, text="Running grid…")
             run_idx = 0
+            # Surge tiers are precomputed per buy% inside the engine; with surge off no tier work is done
+            surge_cfg = (grid_surge(buy_vals, sell_vals, float(init_cap), float(t1_mult), float(t1_bonus),
+                                    float(t2_mult), float(t2_bonus), float(surge_cap)) if surge_on else None)
 
             for m in methods_g:
                 mU = m.upper()
                 baseline_minute = np.array([base_map.get((d, mU), np.nan) for d in et_dates], dtype=np.float64)
-                finite_mask = np.isfinite(baseline_minute)
-
-                for b in buy_vals:
-                    for s in sell_vals:
-                        allow_mask = finite_mask
-                        buy_trig = (ratios >= baseline_minute * (1.0 + b / 100.0)) & allow_mask
-                        sell_trig = (ratios <= baseline_minute * (1.0 - s / 100.0)) & allow_mask
-
-                        cash = float(init_cap)
-                        shares = 0.0
-                        ntr = 0
-
-                        for i in range(len(prices)):
-                            base_target = (cash + shares * prices[i]) if SIZING_MODES[0].startswith("REINVEST") else float(init_cap)
-                            extra = surge_extra_on_base(
-                                base_budget=float(init_cap),
-                                ratio_now=float(ratios[i]),
-                                baseline_ratio=float(baseline_minute[i]),
-                                buy_pct=float(b),
-                                enable=surge_on,
-                                tier1_mult=float(t1_mult), tier1_bonus_pct=float(t1_bonus),
-                                tier2_mult=float(t2_mult), tier2_bonus_pct=float(t2_bonus),
-                                cap_pct=float(surge_cap)
-                            )
-
-                            if buy_trig[i] and shares <= 0.0:
-                                target_notional = max(0.0, base_target + (extra if surge_on else 0.0))
-                                pos_notional = shares * prices[i]
-                                to_spend = max(0.0, target_notional - pos_notional)
-                                if to_spend > 0.0 and cash > 0.0:
-                                    qty = int(math.floor(min(cash, to_spend) / prices[i]))
-                                    if qty > 0:
-                                        cash -= qty * prices[i]
-                                        shares += qty
-                                        ntr += 1
-                            elif sell_trig[i] and shares > 0.0:
-                                cash += shares * prices[i]
-                                shares = 0.0
-                                ntr += 1
-
-                        equity = cash + shares * prices[-1]
-                        total_return = (equity / float(init_cap)) - 1.0
-                        rows.append((mU, f"N={int(n_prev_g)}", b, s, ntr, total_return))
-
-                        run_idx += 1
-                        prog.progress(run_idx / total_runs, text=f"Running grid… {run_idx}/{total_runs}")
+
+                # Every (buy, sell) pair in one pass over the minutes
+                cash_k, shares_k, ntr_k = simulate_curve_grid(
+                    prices, ratios, baseline_minute, buy_vals, sell_vals,
+                    float(init_cap), SIZING_MODES[0].startswith("REINVEST"), surge=surge_cfg)
+                for k in range(len(cash_k)):
+                    b = buy_vals[k // len(sell_vals)]
+                    s = sell_vals[k % len(sell_vals)]
+                    equity = float(cash_k[k]) + float(shares_k[k]) * prices[-1]
+                    total_return = (equity / float(init_cap)) - 1.0
+                    rows.append((mU, f"N={int(n_prev_g)}", b, s, int(ntr_k[k]), total_return))
+
+                run_idx += len(cash_k)
+                prog.progress(run_idx / total_runs, text=f"Running grid… {run_idx}/{total_runs}")
 
             res = pd.DataFrame(rows, columns=["method", "baseline_span", "buy_pct", "sell_pct", "n_trades", "total_return"]).sort_values(["method", "total_return"], ascending=[True, False])
             res["total_return_%"] = (res["total_return"] * 100.0).round(2)
@@ -2050,6 +1774,8 @@ with tab_batch:
     apply_to_triggers = st.checkbox("Apply filters to trigger days", value=True, key="batch_filt_curr")
 
     split_batch = st.checkbox("Split thresholds (RTH vs After‑Hours)", value=False, key="batch_split")
+    adaptive_cfg = None
+    batch_top_k = 0
 
     st.markdown("**Thresholds**")
     single_pair = st.checkbox("Run single thresholds (ignore ranges)", value=True, key="batch_single_pair")
@@ -2082,6 +1808,28 @@ with tab_batch:
             sell_end = st.number_input("Sell% end", min_value=0.0, max_value=5.0, value=2.0, step=0.1, key="batch_send", disabled=single_pair)
         with c_s[2]:
             sell_step = st.number_input("Sell% step", min_value=0.1, max_value=1.0, value=0.1, step=0.1, key="batch_sstep", disabled=single_pair)
+
+        search_mode = st.radio("Search", ["Exhaustive grid", "Adaptive (coarse → fine)"], horizontal=True,
+                               key="batch_search", disabled=single_pair,
+                               help="Adaptive: simulate a coarse grid, then refine around the best cells at finer steps.")
+        if search_mode.startswith("Adaptive") and not single_pair:
+            c_ad = st.columns(4)
+            with c_ad[0]:
+                ad_stride = st.number_input("Coarse stride (steps)", min_value=2, max_value=20, value=4, step=1, key="batch_ad_stride")
+            with c_ad[1]:
+                ad_top_k = st.number_input("Top‑K regions", min_value=1, max_value=20, value=3, step=1, key="batch_ad_topk")
+            with c_ad[2]:
+                ad_budget = st.number_input("Sim budget / symbol (0 = none)", min_value=0, value=0, step=100, key="batch_ad_budget")
+            with c_ad[3]:
+                ad_compare = st.checkbox("Report quality vs exhaustive", value=False, key="batch_ad_compare",
+                                         help="Also runs the full grid per symbol to score the adaptive result (slower).")
+            adaptive_cfg = dict(coarse_stride=int(ad_stride), top_k=int(ad_top_k), budget=int(ad_budget),
+                                compare=bool(ad_compare))
+        else:
+            batch_top_k = st.number_input("Keep top‑K per symbol (0 = all rows)", min_value=0, value=0, step=1,
+                                          key="batch_top_k", disabled=single_pair,
+                                          help="Only the best K (method, buy, sell) rows per symbol are kept; paths "
+                                               "that can no longer reach them are dropped early.")
     else:
         st.write("__RTH thresholds__")
         c_r1, c_r2, c_r3 = st.columns(3)
@@ -2117,6 +1865,19 @@ with tab_batch:
 
     start_capital = st.number_input("Start capital ($/symbol)", min_value=100.0, value=10000.0, step=100.0, key="batch_start_cap")
 
+    with st.expander("Surge sizing (standard grid only)", expanded=False):
+        surge_b = st.checkbox("Enable Surge", value=False, key="batch_surge_on", disabled=split_batch,
+                              help="Buys spend the starting capital plus the tier bonus (capped by cash) instead of all cash.")
+        sb1, sb2, sb3 = st.columns(3)
+        with sb1:
+            t1_mult_b = st.number_input("Tier‑1 multiple (×)", value=2.0, step=0.1, format="%.1f", key="batch_t1_mult")
+            t1_bonus_b = st.number_input("Tier‑1 bonus % of base", value=10.0, step=1.0, format="%.1f", key="batch_t1_bonus")
+        with sb2:
+            t2_mult_b = st.number_input("Tier‑2 multiple (×)", value=3.0, step=0.1, format="%.1f", key="batch_t2_mult")
+            t2_bonus_b = st.number_input("Tier‑2 bonus % of base", value=10.0, step=1.0, format="%.1f", key="batch_t2_bonus")
+        with sb3:
+            surge_cap_b = st.number_input("Surge cap % of base", value=50.0, step=5.0, format="%.1f", key="batch_cap")
+
     st.markdown("**Exports & debug**")
     exp_col1, exp_col2 = st.columns([1, 2])
     with exp_col1:
@@ -2125,6 +1886,14 @@ with tab_batch:
         if not single_pair and export_trades:
             st.warning("Per‑trade export requires a single threshold pair. Turn on 'Run single thresholds'.")
 
+    batch_workers = st.number_input("Parallel workers (processes)", min_value=1, max_value=max(1, os.cpu_count() or 1),
+                                    value=min(8, max(1, os.cpu_count() or 1)), step=1, key="batch_workers",
+                                    help="Symbols are scanned in separate processes; with a single symbol its threshold grid "
+                                         "is split across the processes instead. 1 runs everything in this session.")
+    batch_time_limit = st.number_input("Stop after (seconds, 0 = no limit)", min_value=0, value=0, step=30,
+                                       key="batch_time_limit",
+                                       help="Ends long sweeps (e.g. large split grids) early and shows the combinations finished so far.")
+
     run_batch = st.button("Run Batch (selected symbols)", type="primary", key="run_batch_btn")
 
     meta_placeholder = st.empty()
@@ -2136,7 +1905,8 @@ with tab_batch:
 
     def progress_cb(symbol, step, total, method, b, s, d):
         pct = int(round(100.0 * step / max(1, total)))
-        prog.progress(pct, text=f"{symbol}: {step}/{total} • {method} • day={d}")
+        where = f"day={d}" if d is not None else "combinations"
+        prog.progress(pct, text=f"{symbol}: {step}/{total} • {method} • {where}")
 
     if run_batch:
         if not symbols:
@@ -2175,78 +1945,127 @@ with tab_batch:
             if split_batch and window_b != "ALL":
                 st.info("Split thresholds are most effective with Window=ALL (contains both RTH and AH).")
 
-            for symx in symbols:
-                cur_idx += 1
-                status.write(f"Running **{symx}** ({cur_idx}/{total_syms}) …")
+            # Leaderboard and per-trade logs are stored in a fresh folder per run (the previous run's is removed)
+            prev_dir = st.session_state.pop("batch_run_dir", None)
+            if prev_dir:
+                shutil.rmtree(prev_dir, ignore_errors=True)
+            run_dir = trade_log_dir()
+            st.session_state["batch_run_dir"] = run_dir
+            log_dir = run_dir if export_trades else None
+            views = []
+
+            scan_kwargs = dict(
+                participation_cap_pct=int(participation_cap_pct),
+                buy_list=(buy_list if not split_batch else []),
+                sell_list=(sell_list if not split_batch else []),
+                start_capital=float(start_capital),
+                export_trades=bool(export_trades),
+                split_mode=bool(split_batch),
+                buy_list_rth=(buy_list_rth if split_batch else None),
+                sell_list_rth=(sell_list_rth if split_batch else None),
+                buy_list_ah=(buy_list_ah if split_batch else None),
+                sell_list_ah=(sell_list_ah if split_batch else None),
+                adaptive=adaptive_cfg,
+                top_k=(int(batch_top_k) if not (single_pair or split_batch) else 0)
+            )
+            # Surge settings, named as run_grid_for_symbol's keyword arguments
+            surge_spec = (dict(t1_mult=float(t1_mult_b), t1_bonus=float(t1_bonus_b), t2_mult=float(t2_mult_b),
+                               t2_bonus=float(t2_bonus_b), surge_cap_pct=float(surge_cap_b))
+                          if (surge_b and not split_batch) else None)
+
+            deadline = (time.time() + float(batch_time_limit)) if batch_time_limit else None
+
+            stopped = []
+            dropped = []  # symbols not run because the time limit was reached
+
+            def should_stop():
+                if deadline is not None and time.time() > deadline:
+                    stopped.append(True)
+                return bool(stopped)
+
+            adaptive_stats = []
+            topk_stats = []
+
+            def collect(symx, out):
+                if not export_trades and "adaptive" in out.attrs:
+                    adaptive_stats.append(dict(out.attrs["adaptive"], symbol=symx))
+                if not export_trades and "topk" in out.attrs:
+                    topk_stats.append(out.attrs["topk"])
                 if export_trades:
-                    res, tlog = run_grid_for_symbol(
+                    res, tlog_path = out
+                    if not res.empty:
+                        all_res.append(res)
+                    if tlog_path:
+                        all_trades.append(tlog_path)
+                elif not out.empty:
+                    all_res.append(out)
+
+            if int(batch_workers) > 1 and total_syms > 1:
+                # SQL + baselines stay on this thread; the threshold scans run in worker processes
+                def prepare(symx):
+                    status.write(f"Preparing **{symx}** …")
+                    return prepare_grid_for_symbol(
                         server, db, user_id, symx,
                         d0, d1, window_b, t0, t1,
                         methods_b, int(lookback_n),
                         int(min_shares), float(min_dollar),
                         bool(apply_to_baseline), bool(apply_to_triggers),
-                        int(participation_cap_pct),
-                        (buy_list if not split_batch else []),
-                        (sell_list if not split_batch else []),
-                        float(start_capital),
-                        surge_enable=False, t1_mult=2.0, t1_bonus=10.0, t2_mult=3.0, t2_bonus=10.0, surge_cap_pct=50.0,
-                        progress=progress_cb, meta=meta_cb,
-                        export_trades=True,
-                        split_mode=bool(split_batch),
-                        buy_list_rth=(buy_list_rth if split_batch else None),
-                        sell_list_rth=(sell_list_rth if split_batch else None),
-                        buy_list_ah=(buy_list_ah if split_batch else None),
-                        sell_list_ah=(sell_list_ah if split_batch else None)
+                        bool(split_batch), meta=meta_cb
                     )
-                    if not res.empty:
-                        all_res.append(res)
-                    if not tlog.empty:
-                        all_trades.append(tlog.assign(symbol=symx) if "symbol" not in tlog.columns else tlog)
-                else:
-                    res = run_grid_for_symbol(
+
+                # Past the limit, queued scans are cancelled and running ones stop between methods
+                worker_stop = StopAt(deadline) if deadline is not None else None
+                for symx, out in iter_batch_parallel(symbols, prepare,
+                                                     dict(scan_kwargs, surge=surge_spec, should_stop=worker_stop,
+                                                          trade_log_dir=log_dir),
+                                                     int(batch_workers), should_stop=should_stop):
+                    if out is None:
+                        dropped.append(symx)
+                        continue
+                    cur_idx += 1
+                    collect(symx, out)
+                    progress_cb(symx, cur_idx, total_syms, f"{len(methods_b)} method(s)", None, None, d1)
+                    status.write(f"Finished **{symx}** ({cur_idx}/{total_syms})")
+            else:
+                for symx in symbols:
+                    if should_stop():
+                        dropped.extend(list(symbols)[cur_idx:])
+                        break
+                    cur_idx += 1
+                    status.write(f"Running **{symx}** ({cur_idx}/{total_syms}) …")
+                    out = run_grid_for_symbol(
                         server, db, user_id, symx,
                         d0, d1, window_b, t0, t1,
                         methods_b, int(lookback_n),
                         int(min_shares), float(min_dollar),
                         bool(apply_to_baseline), bool(apply_to_triggers),
-                        int(participation_cap_pct),
-                        (buy_list if not split_batch else []),
-                        (sell_list if not split_batch else []),
-                        float(start_capital),
-                        surge_enable=False, t1_mult=2.0, t1_bonus=10.0, t2_mult=3.0, t2_bonus=10.0, surge_cap_pct=50.0,
                         progress=progress_cb, meta=meta_cb,
-                        export_trades=False,
-                        split_mode=bool(split_batch),
-                        buy_list_rth=(buy_list_rth if split_batch else None),
-                        sell_list_rth=(sell_list_rth if split_batch else None),
-                        buy_list_ah=(buy_list_ah if split_batch else None),
-                        sell_list_ah=(sell_list_ah if split_batch else None)
+                        workers=int(batch_workers), should_stop=should_stop,
+                        surge_enable=surge_spec is not None, **(surge_spec or {}),
+                        log_dir=log_dir, **scan_kwargs
                     )
-                    if not res.empty:
-                        all_res.append(res)
+                    collect(symx, out)
 
             prog.progress(100, text="Completed.")
             status.write("Batch complete.")
+            if stopped:
+                st.warning(f"Stopped at the {int(batch_time_limit)} s limit — tables below cover only the "
+                           "symbols / combinations finished in time."
+                           + (f" Not run ({len(dropped)}): {', '.join(dropped)}." if dropped else ""))
 
             if all_res:
                 results = pd.concat(all_res, ignore_index=True)
                 results["total_return_%"] = (results["total_return"] * 100.0).round(2)
-                st.subheader("Leaderboard (All Symbols)")
                 if split_batch and {"buy_pct_rth", "sell_pct_rth", "buy_pct_ah", "sell_pct_ah"}.issubset(results.columns):
-                    show = results.sort_values(["total_return"], ascending=False).reset_index(drop=True)
-                    st.dataframe(
-                        show[["symbol", "method",
-                              "buy_pct_rth", "sell_pct_rth", "buy_pct_ah", "sell_pct_ah",
-                              "n_trades", "days_used", "ending_shares", "final_cash", "final_equity", "total_return_%"]],
-                        use_container_width=True
-                    )
+                    lb_cols = ["symbol", "method", "buy_pct_rth", "sell_pct_rth", "buy_pct_ah", "sell_pct_ah",
+                               "n_trades", "days_used", "ending_shares", "final_cash", "final_equity", "total_return_%"]
                 else:
-                    show = results.sort_values(["total_return"], ascending=False).reset_index(drop=True)
-                    st.dataframe(
-                        show[["symbol", "method", "buy_pct", "sell_pct",
-                              "n_trades", "days_used", "ending_shares", "final_cash", "final_equity", "total_return_%"]],
-                        use_container_width=True
-                    )
+                    lb_cols = ["symbol", "method", "buy_pct", "sell_pct",
+                               "n_trades", "days_used", "ending_shares", "final_cash", "final_equity", "total_return_%"]
+                # Browsed page by page below (sorted by return, filterable by symbol / method)
+                views.append(dict(title="Leaderboard (All Symbols)", key="bv_lb", columns=lb_cols,
+                                  path=save_results(results, os.path.join(run_dir, "leaderboard.parquet")),
+                                  filter_cols=("symbol", "method"), sort="total_return_%"))
 
                 # Best per symbol
                 st.subheader("Best per Symbol")
@@ -2277,23 +2096,57 @@ with tab_batch:
                                    file_name=f"{'batch_split' if split_batch else 'batch_grid'}_{d0}_{d1}.csv", mime="text/csv", key="dl_all")
                 st.download_button("Download Best per Symbol (CSV)", data=csv_best,
                                    file_name=f"{'batch_split_best' if split_batch else 'batch_grid_best'}_{d0}_{d1}.csv", mime="text/csv", key="dl_best")
+
+                if topk_stats:
+                    n_paths = sum(t["paths"] for t in topk_stats)
+                    n_pruned = sum(t["pruned"] for t in topk_stats)
+                    n_skip = sum(t["pair_days_skipped"] for t in topk_stats)
+                    n_days_sim = sum(t["pair_days"] for t in topk_stats)
+                    st.caption(f"Top‑{int(batch_top_k)} pruning dropped {n_pruned:,} of {n_paths:,} paths early; "
+                               f"{n_skip:,} of {n_skip + n_days_sim:,} path‑days were not simulated.")
+
+                if adaptive_stats:
+                    n_eval = sum(a["evaluated"] for a in adaptive_stats)
+                    n_full = sum(a["full"] for a in adaptive_stats)
+                    st.caption(f"Adaptive search simulated {n_eval:,} of {n_full:,} (method, buy, sell) paths "
+                               f"({100.0 * n_eval / max(1, n_full):.1f}%).")
+                    skipped = [f"{a['symbol']} ({', '.join(a['skipped'])})" for a in adaptive_stats if a.get("skipped")]
+                    if skipped:
+                        st.warning("Adaptive budget too small to simulate every method; no rows for: "
+                                   + "; ".join(skipped))
+                    quality = pd.DataFrame([q for a in adaptive_stats for q in a["quality"]])
+                    if not quality.empty:
+                        st.subheader("Adaptive vs exhaustive")
+                        quality["regret_%"] = (quality["regret"] * 100.0).round(3)
+                        st.dataframe(quality[["symbol", "method", "evaluated", "grid_size", "found_best",
+                                              "regret_%", "topk_recall"]], use_container_width=True, hide_index=True)
             else:
                 st.warning("No results (check data availability and filters).")
 
             if export_trades and all_trades:
-                trades_df = pd.concat(all_trades, ignore_index=True)
-                for col in ["price", "ratio", "base"]:
-                    if col in trades_df.columns:
-                        trades_df[col] = trades_df[col].astype(float).round(8 if col != "price" else 6)
-                st.subheader("Per‑trade log")
-                st.dataframe(trades_df, use_container_width=True, hide_index=True)
-                st.download_button(
-                    "Download Per‑trade Log (CSV)",
-                    data=trades_df.to_csv(index=False).encode("utf-8"),
-                    file_name=f"{'batch_split_trades' if split_batch else 'batch_trades'}_{d0}_{d1}.csv",
-                    mime="text/csv",
-                    key="dl_trades"
-                )
+                # Symbol parts -> one compressed file on disk, browsed page by page below (parts are removed)
+                log_path = merge_trade_logs(all_trades, os.path.join(
+                    run_dir, f"{'batch_split_trades' if split_batch else 'batch_trades'}_{d0}_{d1}.parquet"),
+                    remove_parts=True)
+                views.append(dict(title="Per‑trade log", key="bv_trades", path=log_path,
+                                  filter_cols=("symbol", "method", "action", "session"), sort=None, ascending=True))
+                st.caption(f"Per‑trade log: {trade_log_rows(log_path):,} rows "
+                           f"({os.path.getsize(log_path) / 1e6:,.1f} MB on disk)")
+                is_parquet = log_path.endswith(".parquet")
+                with open(log_path, "rb") as fh:
+                    st.download_button(
+                        f"Download Per‑trade Log ({'Parquet' if is_parquet else 'CSV.gz'})",
+                        data=fh,
+                        file_name=os.path.basename(log_path),
+                        mime="application/octet-stream" if is_parquet else "application/gzip",
+                        key="dl_trades"
+                    )
+
+            st.session_state["batch_views"] = views
+
+    # Stored results stay browsable across reruns (paging / filtering does not re-run the batch)
+    for view in st.session_state.get("batch_views", []):
+        browse_results(**view)
 
 
 # ---- Batch (Fast) — Daily (per-day winners + confidence) ----
@@ -2389,6 +2242,13 @@ with tab_batch_daily:
                 buy_list = arange_f(st.session_state["bfd_bstart"], st.session_state["bfd_bend"], st.session_state["bfd_bstep"])
                 sell_list = arange_f(st.session_state["bfd_sstart"], st.session_state["bfd_send"], st.session_state["bfd_sstep"])
 
+            prev_dir = st.session_state.pop("bfd_run_dir", None)
+            if prev_dir:
+                shutil.rmtree(prev_dir, ignore_errors=True)
+            run_dir = trade_log_dir(prefix="daily_")
+            st.session_state["bfd_run_dir"] = run_dir
+            st.session_state["bfd_views"] = []
+
             all_days = []
             all_summ = []
             total_syms = len(symbols)
@@ -2417,8 +2277,11 @@ with tab_batch_daily:
             if all_days:
                 daily_res = pd.concat(all_days, ignore_index=True)
                 daily_res["day_return_%"] = (daily_res["day_return"] * 100.0).round(2)
-                st.subheader("Per‑day winners")
-                st.dataframe(daily_res.sort_values(["symbol", "et_date"]), use_container_width=True, hide_index=True)
+                st.session_state["bfd_views"] = [dict(
+                    title="Per‑day winners", key="bv_days",
+                    path=save_results(daily_res.sort_values(["symbol", "et_date"]),
+                                      os.path.join(run_dir, "daily_winners.parquet")),
+                    filter_cols=("symbol", "method", "day_return_%"), sort="et_date", ascending=True)]
                 st.download_button(
                     "Download Daily Winners (CSV)",
                     data=daily_res.to_csv(index=False).encode("utf-8"),
@@ -2443,6 +2306,9 @@ with tab_batch_daily:
             else:
                 st.info("No consistency summary (no winners).")
 
+    for view in st.session_state.get("bfd_views", []):
+        browse_results(**view)
+
 # ---- Trade Detail ----
 with tab_detail:
     st.subheader("Trade Detail (per symbol / method / thresholds) — with ±5‑minute liquidity context")
@@ -2450,7 +2316,6 @@ with tab_detail:
                        index=(DEFAULT_SYMBOLS.index("CIFR") if "CIFR" in DEFAULT_SYMBOLS else 0),
                        key="td_sym")
     method = st.selectbox("Baseline method", BASELINE_METHODS, index=0, key="td_method")
-    st.session_state["trade_method_name"] = method
 
     window = st.selectbox("Window", ["RTH", "CUSTOM", "AH", "ALL"], index=1, key="td_window")
     cstart = st.text_input("Custom start (ET)", "09:30:00", key="td_cstart")
@@ -2503,7 +2368,8 @@ with tab_detail:
                 buy_pct=float(buy_pct),
                 sell_pct=float(sell_pct),
                 init_cap=float(init_cap),
-                flatten_eod=bool(flatten_eod)
+                flatten_eod=bool(flatten_eod),
+                method=method
             )
             if detail.empty:
                 st.warning("No trades triggered with these thresholds / range.")
@@ -0,0 +1,147 @@
+# bitcorr_actions.py
+# Typed, chunked loading of dbo.bitcorr_daily_actions for the BitCorr analyzers (no Streamlit import).
+#
+# A year of actions for one user is tens of millions of rows. pd.read_sql materializes every value as
+# a Python object before pandas infers float64 / object columns; here rows are pulled from the cursor
+# CHUNK_ROWS at a time and each chunk is converted straight into compact column arrays:
+#
+#  - user_id / symbol / session / method: categorical (int32 codes shared across chunks)
+#  - et_date: datetime.date objects, one shared object per distinct day
+#  - buy_pct / sell_pct: float64 (grid keys, compared for equality and against float range filters)
+#  - n_trades: int16 (NULL -> 0)
+#  - every other metric: float32
+#
+# Only the columns the active view needs are selected (VIEW_COLUMNS), so e.g. the heatmap never
+# pulls the 12 correlation / confidence columns.
+#
+#  - view_columns():  projection for an analyzer view (FILTER_COLUMNS + the view's metrics)
+#  - fetch_actions(): one user's date range, typed, in the given column order
+#  - frame_memory_mb(): size of a loaded frame (dates share objects), for the sidebar caption
+
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from bitcorr_builder import ACTION_COLUMNS, HORIZONS
+
+CHUNK_ROWS = 200_000
+
+CATEGORY_COLUMNS = {"user_id", "symbol", "session", "method"}
+KEY_FLOAT_COLUMNS = {"buy_pct", "sell_pct"}
+INT16_COLUMNS = {"n_trades"}
+
+# Columns every view needs: filter_actions() keys plus the return being ranked
+FILTER_COLUMNS = ["symbol", "session", "et_date", "method", "buy_pct", "sell_pct", "day_return"]
+CONF_COLUMNS = [f"confidence_{h}m" for h in HORIZONS]
+REGIME_FIELDS = ["btc_prev_ret", "btc_prev_vol", "btc_overnight_ret", "open_gap_z", "liq_median"]
+
+# Extra columns per analyzer view (view names are the Core analyzer's tab labels)
+VIEW_COLUMNS: Dict[str, List[str]] = {
+    "Overview": [],
+    "Regime Explorer": REGIME_FIELDS + ["confidence_10m"],
+    "Daily Winners": [],
+    "Heatmap (Buy×Sell)": [],
+    "Fixed-Threshold Compare": ["confidence_10m"],
+    "Confidence Explorer": CONF_COLUMNS,
+    "Confidence ROI Compare": CONF_COLUMNS,
+    "Policy ROI (Backtest)": REGIME_FIELDS[:4],
+    "Export": list(ACTION_COLUMNS),
+    "Run Log": [],
+}
+
+def view_columns(view: Optional[str]) -> List[str]:
+    """FILTER_COLUMNS plus the view's extra columns, in table order (all columns for unknown views)."""
+    extra = VIEW_COLUMNS.get(view, list(ACTION_COLUMNS)) if view is not None else list(ACTION_COLUMNS)
+    need = set(FILTER_COLUMNS) | set(extra)
+    return [c for c in ACTION_COLUMNS if c in need]
+
+def column_dtype(name: str):
+    if name in CATEGORY_COLUMNS:
+        return "category"
+    if name == "et_date":
+        return object
+    if name in KEY_FLOAT_COLUMNS:
+        return np.float64
+    if name in INT16_COLUMNS:
+        return np.int16
+    return np.float32
+
+# ---------------- Chunk conversion ----------------
+def _encode(values: Sequence, index: Dict) -> np.ndarray:
+    """int32 codes of values against a running {value: code} index (-1 for NULL)."""
+    codes, uniq = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+    if not len(uniq):
+        return codes.astype(np.int32)
+    remap = np.array([index.setdefault(u, len(index)) for u in uniq], dtype=np.int32)
+    return np.where(codes >= 0, remap[np.maximum(codes, 0)], -1).astype(np.int32)
+
+def _numeric(name: str, values: Sequence) -> np.ndarray:
+    arr = np.array(values, dtype=np.float64 if name in KEY_FLOAT_COLUMNS or name in INT16_COLUMNS
+                   else np.float32)
+    if name in INT16_COLUMNS:
+        info = np.iinfo(np.int16)
+        return np.clip(np.nan_to_num(arr, nan=0.0), info.min, info.max).astype(np.int16)
+    return arr
+
+class _ColumnBuilder:
+    """Accumulates one column over chunks: codes for categoricals / dates, typed arrays otherwise."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.coded = name in CATEGORY_COLUMNS or name == "et_date"
+        self.index: Dict = {}
+        self.parts: List[np.ndarray] = []
+
+    def add(self, values: Sequence) -> None:
+        if self.coded:
+            self.parts.append(_encode(values, self.index))
+        else:
+            self.parts.append(_numeric(self.name, values))
+
+    def finish(self):
+        if not self.parts:
+            return pd.Series([], dtype=column_dtype(self.name))
+        arr = np.concatenate(self.parts) if len(self.parts) > 1 else self.parts[0]
+        self.parts = []
+        if not self.coded:
+            return arr
+        uniq = list(self.index)
+        if self.name == "et_date":
+            days = np.empty(len(uniq) + 1, dtype=object)
+            days[:-1] = pd.to_datetime(pd.Series(uniq, dtype=object)).dt.date.to_numpy()
+            days[-1] = None
+            return days[arr]  # code -1 picks the trailing None
+        cats = [str(u) for u in uniq]
+        return pd.Categorical.from_codes(arr, categories=cats).reorder_categories(sorted(cats))
+
+# ---------------- Fetch ----------------
+def actions_query(columns: Sequence[str]) -> str:
+    return (f"SELECT {', '.join(columns)} FROM dbo.bitcorr_daily_actions WITH (NOLOCK) "
+            "WHERE user_id = ? AND et_date BETWEEN ? AND ?;")
+
+def fetch_actions(cn, user_id: str, d0: date, d1: date, columns: Optional[Sequence[str]] = None,
+                  chunk_rows: int = CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Rows of one user between d0 and d1 (inclusive) over an open DB-API connection, fetched
+    chunk_rows at a time and typed per column_dtype(). columns=None selects every ACTION_COLUMN.
+    """
+    cols = [c for c in (columns or ACTION_COLUMNS) if c in ACTION_COLUMNS]
+    builders = [_ColumnBuilder(c) for c in cols]
+    cur = cn.cursor()
+    try:
+        cur.arraysize = int(chunk_rows)
+        cur.execute(actions_query(cols), (user_id, str(d0), str(d1)))
+        while True:
+            rows = cur.fetchmany(int(chunk_rows))
+            if not rows:
+                break
+            for b, values in zip(builders, zip(*rows)):
+                b.add(values)
+    finally:
+        cur.close()
+    return pd.DataFrame({b.name: b.finish() for b in builders}, columns=cols)
+
+def frame_memory_mb(df: pd.DataFrame) -> float:
+    return float(df.memory_usage(deep=False, index=False).sum()) / 1e6 if df is not None else 0.0
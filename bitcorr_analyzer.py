@@ -2,6 +2,7 @@
 # bitcorr_analyzer.py
 # Streamlit app for analyzing SQL-warehouse results of BitCorr (daily actions).
 # Focused on charts, heatmaps, winners, regimes, and backtests.
+# With the local DuckDB mirror (actions_mirror), filters, heatmaps, groupbys and winners run as queries.
 import os
 import math
 import json
@@ -14,6 +15,9 @@ import pyodbc
 import streamlit as st
 import matplotlib.pyplot as plt
 
+import actions_mirror
+from walkforward import walkforward_returns
+
 st.set_page_config(page_title="BitCorr Analyzer", layout="wide")
 
 # -----------------------------
@@ -38,6 +42,29 @@ def pd_read_sql(q: str, server: str, db: str, params=None) -> pd.DataFrame:
         cn.close()
     return df
 
+@st.cache_data(show_spinner="Syncing local mirror…", ttl=600)
+def sync_mirror(server: str, db: str, user_id: str, full: bool = False) -> dict:
+    """Incremental sync of user_id's rows into the local DuckDB mirror (at most once per ttl); full checks every day."""
+    cn = get_cnx(server, db)
+    try:
+        return actions_mirror.sync(cn, actions_mirror.mirror_path(server, db), user_id, full=full)
+    finally:
+        cn.close()
+
+@st.cache_data(show_spinner=True, ttl=600)
+def load_mirror_actions(path: str, synced_utc, flt: dict, columns: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """Filtered rows from the mirror (filters pushed into the query); synced_utc ties the cache to the last sync."""
+    return actions_mirror.load_actions(path, flt, columns)
+
+def mirror_query(fn, *args, **kwargs):
+    """fn(mirror_file, ...) while the mirror is in use; None when it is off or another process holds its lock."""
+    if not use_mirror:
+        return None
+    try:
+        return fn(mirror_file, *args, **kwargs)
+    except actions_mirror.MirrorUnavailable:
+        return None
+
 # -----------------------------
 # Sidebar: connection + filters
 # -----------------------------
@@ -47,16 +74,40 @@ with st.sidebar:
     database = st.text_input("Database", value=os.getenv("BITCORR_SQL_DB", "streamlit"))
     user_id = st.text_input("User tag (user_id)", value=os.getenv("BITCORR_USER_ID", "default"))
 
+    use_mirror = False
+    if actions_mirror.available():
+        use_mirror = st.checkbox("Query local DuckDB mirror", value=True, key="an_use_mirror",
+                                 help="Filters, heatmaps and groupbys run against a local copy of "
+                                      "dbo.bitcorr_daily_actions that syncs new / changed days incrementally.")
+    if use_mirror:
+        mirror_file = actions_mirror.mirror_path(server, database)
+        # The button re-checks every stored day; otherwise only days that can have changed are compared
+        full_sync = st.button("Sync mirror now", key="an_mirror_sync")
+        if full_sync:
+            sync_mirror.clear()
+        try:
+            synced = sync_mirror(server, database, user_id, full=full_sync)
+            status = actions_mirror.mirror_status(mirror_file, user_id)
+            st.caption(f"Mirror: {status['rows']:,} rows over {status['days']:,} days "
+                       f"(last sync re-pulled {synced['days_synced']:,} days).")
+        except Exception as e:
+            st.warning(f"Mirror unavailable, querying SQL Server: {e}")
+            use_mirror = False
+
     st.divider()
     st.header("📅 Filters")
 
     # Discover symbols & date bounds from warehouse
     try:
-        meta_df = pd_read_sql(
-            """
-            SELECT MIN(et_date) AS min_d, MAX(et_date) AS max_d FROM dbo.bitcorr_daily_actions WHERE user_id = ?;
-            """, server, database, params=(user_id,)
-        )
+        bounds = mirror_query(actions_mirror.date_bounds, user_id)
+        if bounds is not None:
+            meta_df = pd.DataFrame([bounds], columns=["min_d", "max_d"])
+        else:
+            meta_df = pd_read_sql(
+                """
+                SELECT MIN(et_date) AS min_d, MAX(et_date) AS max_d FROM dbo.bitcorr_daily_actions WHERE user_id = ?;
+                """, server, database, params=(user_id,)
+            )
         min_d = pd.to_datetime(meta_df["min_d"].iloc[0]).date() if not meta_df.empty else date.today() - timedelta(days=365)
         max_d = pd.to_datetime(meta_df["max_d"].iloc[0]).date() if not meta_df.empty else date.today()
     except Exception:
@@ -70,10 +121,14 @@ with st.sidebar:
 
     # Symbols list
     try:
-        sym_df = pd_read_sql(
-            "SELECT DISTINCT symbol FROM dbo.bitcorr_daily_actions WHERE user_id = ? ORDER BY symbol;",
-            server, database, params=(user_id,)
-        )
+        names = mirror_query(actions_mirror.distinct_values, user_id, "symbol")
+        if names is not None:
+            sym_df = pd.DataFrame({"symbol": names})
+        else:
+            sym_df = pd_read_sql(
+                "SELECT DISTINCT symbol FROM dbo.bitcorr_daily_actions WHERE user_id = ? ORDER BY symbol;",
+                server, database, params=(user_id,)
+            )
         symbols_all = sorted(sym_df["symbol"].dropna().astype(str).tolist())
     except Exception:
         symbols_all = []
@@ -81,10 +136,14 @@ with st.sidebar:
 
     # Methods available
     try:
-        meth_df = pd_read_sql(
-            "SELECT DISTINCT method FROM dbo.bitcorr_daily_actions WHERE user_id = ? ORDER BY method;",
-            server, database, params=(user_id,)
-        )
+        names = mirror_query(actions_mirror.distinct_values, user_id, "method")
+        if names is not None:
+            meth_df = pd.DataFrame({"method": names})
+        else:
+            meth_df = pd_read_sql(
+                "SELECT DISTINCT method FROM dbo.bitcorr_daily_actions WHERE user_id = ? ORDER BY method;",
+                server, database, params=(user_id,)
+            )
         methods_all = sorted(meth_df["method"].dropna().astype(str).tolist())
     except Exception:
         methods_all = []
@@ -153,7 +212,15 @@ def load_actions(server: str, db: str, user_id: str,
         df["n_trades"] = df["n_trades"].astype(int)
     return df
 
-df = load_actions(server, database, user_id, symbols, sessions, d0, d1, methods, buy_min, buy_max, sell_min, sell_max)
+flt = actions_mirror.action_filter(user_id, d0, d1, symbols, sessions, methods, buy_min, buy_max, sell_min, sell_max)
+if use_mirror:
+    try:
+        df = load_mirror_actions(mirror_file, synced["synced_utc"], flt) if symbols and sessions else pd.DataFrame()
+    except actions_mirror.MirrorUnavailable as e:
+        st.sidebar.warning(f"Mirror busy, querying SQL Server: {e}")
+        use_mirror = False
+if not use_mirror:
+    df = load_actions(server, database, user_id, symbols, sessions, d0, d1, methods, buy_min, buy_max, sell_min, sell_max)
 
 # Guardrail for huge pulls
 if len(df) > 5_000_000:
@@ -222,17 +289,23 @@ with tab_overview:
             st.metric("Methods", f"{meth_ct:,}")
 
         # Aggregate best per method overall
-        agg = df.groupby(["symbol","session","method"], as_index=False).agg(
-            mean_return=("day_return","mean"),
-            sharpe=("day_return", sharpe_like),
-            days=("et_date","nunique")
-        ).sort_values("mean_return", ascending=False).head(20)
+        agg = mirror_query(actions_mirror.group_stats, flt, ["symbol","session","method"], {
+                "mean_return": ("day_return","mean"), "sharpe": ("day_return","sharpe"), "days": ("et_date","nunique")})
+        if agg is None:
+            agg = df.groupby(["symbol","session","method"], as_index=False, observed=True).agg(
+                mean_return=("day_return","mean"),
+                sharpe=("day_return", sharpe_like),
+                days=("et_date","nunique")
+            )
+        agg = agg.sort_values("mean_return", ascending=False).head(20)
         st.markdown("**Top methods by mean return**")
         st.dataframe(agg, use_container_width=True)
 
         # Equity curve of simple policy: best-per-day (oracle) vs. equal-weight of methods (for a quick glance)
         # Oracle (best per day across all combos)
-        oracle = df.sort_values(["et_date","day_return"], ascending=[True,False]).drop_duplicates(["symbol","session","et_date"])
+        oracle = mirror_query(actions_mirror.daily_winners, flt, ["symbol","session","et_date","day_return"])
+        if oracle is None:
+            oracle = df.sort_values(["et_date","day_return"], ascending=[True,False]).drop_duplicates(["symbol","session","et_date"])
         eq_oracle = oracle.groupby("et_date")["day_return"].mean().sort_index()
         eq_df = pd.DataFrame({
             "et_date": eq_oracle.index,
@@ -273,7 +346,7 @@ with tab_regimes:
             st.warning("Select at least one regime variable.")
         else:
             group_keys = bucket_names + ["method","buy_pct","sell_pct"]
-            g = work.groupby(group_keys, as_index=False).agg(
+            g = work.groupby(group_keys, as_index=False, observed=True).agg(
                 avg_ret=("day_return","mean"),
                 support=("day_return","size"),
                 sharpe=("day_return", sharpe_like),
@@ -322,11 +395,13 @@ with tab_winners:
     if df.empty:
         st.info("Load data to see winners.")
     else:
-        winners = df.sort_values(["symbol","session","et_date","day_return"], ascending=[True,True,True,False]).drop_duplicates(["symbol","session","et_date"])
+        winners = mirror_query(actions_mirror.daily_winners, flt, ["symbol","session","et_date","method","buy_pct","sell_pct","day_return"])
+        if winners is None:
+            winners = df.sort_values(["symbol","session","et_date","day_return"], ascending=[True,True,True,False]).drop_duplicates(["symbol","session","et_date"])
         st.dataframe(winners[["symbol","session","et_date","method","buy_pct","sell_pct","day_return"]].sort_values(["et_date","symbol"]), use_container_width=True)
 
         # Win rate by method
-        win_rate = winners.groupby("method", as_index=False).agg(
+        win_rate = winners.groupby("method", as_index=False, observed=True).agg(
             wins=("et_date","count"),
             avg_ret=("day_return","mean")
         ).sort_values("wins", ascending=False)
@@ -353,11 +428,13 @@ with tab_heatmap:
     else:
         # Optionally filter to one method for clarity
         meth_pick = st.selectbox("Method (optional)", options=["<ALL>"] + sorted(df["method"].unique().tolist()))
-        sub = df.copy()
-        if meth_pick != "<ALL>":
-            sub = sub[sub["method"] == meth_pick]
-        pivot = sub.pivot_table(index="buy_pct", columns="sell_pct", values="day_return", aggfunc="mean")
-        pivot = pivot.sort_index().sort_index(axis=1)
+        pivot = mirror_query(actions_mirror.heatmap, flt if meth_pick == "<ALL>" else dict(flt, methods=[meth_pick]))
+        if pivot is None:
+            sub = df.copy()
+            if meth_pick != "<ALL>":
+                sub = sub[sub["method"] == meth_pick]
+            pivot = sub.pivot_table(index="buy_pct", columns="sell_pct", values="day_return", aggfunc="mean")
+            pivot = pivot.sort_index().sort_index(axis=1)
         fig4, ax4 = plt.subplots()
         im = ax4.imshow(pivot.values, aspect="auto", origin="lower")
         ax4.set_xticks(range(pivot.shape[1]))
@@ -389,7 +466,7 @@ with tab_thresholds:
         if ft.empty:
             st.info("No rows match that exact threshold pair in the filtered data.")
         else:
-            comp = ft.groupby(["method"], as_index=False).agg(
+            comp = ft.groupby(["method"], as_index=False, observed=True).agg(
                 mean_return=("day_return","mean"),
                 sharpe=("day_return", sharpe_like),
                 support=("day_return","size"),
@@ -422,7 +499,7 @@ with tab_conf:
             st.pyplot(fig5, use_container_width=True)
         with cols[1]:
             # Correlation summary by method
-            csum = df.groupby("method", as_index=False).agg(
+            csum = df.groupby("method", as_index=False, observed=True).agg(
                 mean_conf=(conf_col,"mean"),
                 corr_with_ret=("day_return", lambda x: np.corrcoef(x, df.loc[x.index, conf_col].fillna(0))[0,1] if len(x)>2 else np.nan),
                 mean_ret=("day_return","mean"),
@@ -485,7 +562,7 @@ with tab_policy:
                 st.warning("Select at least one regime field.")
             else:
                 key_cols = [f"{rv}_bin" for rv in reg_vars]
-                g = base.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False).agg(
+                g = base.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False, observed=True).agg(
                     avg_ret=("day_return","mean"),
                     support=("day_return","size")
                 )
@@ -527,47 +604,7 @@ with tab_policy:
                 st.warning("Select at least one regime field.")
             else:
                 key_cols = [f"{rv}_bin" for rv in reg_vars]
-                base = base.sort_values("et_date")
-                dlist = sorted(base["et_date"].unique().tolist())
-
-                out = []
-                for i in range(int(train_win), len(dlist)):
-                    train_days = dlist[i-int(train_win):i]
-                    test_day = dlist[i]
-
-                    train = base[base["et_date"].isin(train_days)]
-                    # best action per regime in training
-                    g = train.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False).agg(
-                        avg_ret=("day_return","mean"),
-                        support=("day_return","size")
-                    )
-                    best = g.sort_values(["avg_ret","support"], ascending=[False,False]).groupby(key_cols, as_index=False).head(1)
-
-                    # Get this day's regime key (we take first available row's bins for the day)
-                    day_reg = base[base["et_date"] == test_day]
-                    if day_reg.empty or any(k not in day_reg for k in key_cols):
-                        out.append((test_day, np.nan)); continue
-                    # Use mode bin for stability
-                    reg_key = [int(pd.Series(day_reg[k].dropna()).mode().iloc[0]) if not day_reg[k].dropna().empty else np.nan for k in key_cols]
-                    if any(pd.isna(reg_key)):
-                        out.append((test_day, np.nan)); continue
-                    filt = best.copy()
-                    for j, k in enumerate(key_cols):
-                        filt = filt[filt[k] == reg_key[j]]
-                    if filt.empty:
-                        out.append((test_day, np.nan)); continue
-
-                    act = filt.iloc[0]
-                    sel = base[(base["et_date"] == test_day) &
-                               (base["method"] == act["method"]) &
-                               (base["buy_pct"] == act["buy_pct"]) &
-                               (base["sell_pct"] == act["sell_pct"])]
-                    if sel.empty:
-                        out.append((test_day, np.nan))
-                    else:
-                        out.append((test_day, float(sel["day_return"].mean())))
-
-                by_day = pd.DataFrame(out, columns=["et_date","day_return"]).dropna()
+                by_day = walkforward_returns(base, key_cols, int(train_win)).dropna()
                 eq = equity_from_returns(by_day["day_return"], start_capital)
                 fig8, ax8 = plt.subplots()
                 ax8.plot(by_day["et_date"], eq)
@@ -2,9 +2,12 @@
 # bitcorr_analyzer_core.py
 # Streamlit app for analyzing SQL-warehouse results of BitCorr (daily actions) - Core fast version.
 # v2: Two-layer caching (raw load + in-memory filters) and a new "Confidence ROI Compare" tab.
+# v3: Typed chunked loading (bitcorr_actions) projected to the columns of the selected view.
+# v4: Optional local DuckDB mirror (actions_mirror); filters, heatmap, groupbys and winners run as queries.
+# v5: Policy tab compares walk-forward configurations (windows × bins × regime fields) in a process pool.
 import os
 from datetime import date, timedelta
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -12,6 +15,10 @@ import pyodbc
 import streamlit as st
 import matplotlib.pyplot as plt
 
+import actions_mirror
+from bitcorr_actions import VIEW_COLUMNS, fetch_actions, frame_memory_mb, view_columns
+from walkforward import grid_summary, walkforward_configs, walkforward_grid, walkforward_returns
+
 st.set_page_config(page_title="BitCorr Analyzer — Core", layout="wide")
 
 # -----------------------------
@@ -36,6 +43,29 @@ def pd_read_sql(q: str, server: str, db: str, params=None) -> pd.DataFrame:
         cn.close()
     return df
 
+@st.cache_data(show_spinner="Syncing local mirror…", ttl=600)
+def sync_mirror(server: str, db: str, user_id: str, full: bool = False) -> dict:
+    """Incremental sync of user_id's rows into the local DuckDB mirror (at most once per ttl); full checks every day."""
+    cn = get_cnx(server, db)
+    try:
+        return actions_mirror.sync(cn, actions_mirror.mirror_path(server, db), user_id, full=full)
+    finally:
+        cn.close()
+
+@st.cache_data(show_spinner=True, ttl=600)
+def load_mirror_actions(path: str, synced_utc, flt: dict, columns: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """Filtered rows from the mirror (filters pushed into the query); synced_utc ties the cache to the last sync."""
+    return actions_mirror.load_actions(path, flt, columns)
+
+def mirror_query(fn, *args, **kwargs):
+    """fn(mirror_file, ...) while the mirror is in use; None when it is off or another process holds its lock."""
+    if not use_mirror:
+        return None
+    try:
+        return fn(mirror_file, *args, **kwargs)
+    except actions_mirror.MirrorUnavailable:
+        return None
+
 # -----------------------------
 # Sidebar: connection + filters
 # -----------------------------
@@ -45,15 +75,39 @@ with st.sidebar:
     database = st.text_input("Database", value=os.getenv("BITCORR_SQL_DB", "streamlit"))
     user_id = st.text_input("User tag (user_id)", value=os.getenv("BITCORR_USER_ID", "default"))
 
+    use_mirror = False
+    if actions_mirror.available():
+        use_mirror = st.checkbox("Query local DuckDB mirror", value=True, key="core_use_mirror",
+                                 help="Filters, heatmaps and groupbys run against a local copy of "
+                                      "dbo.bitcorr_daily_actions that syncs new / changed days incrementally.")
+    if use_mirror:
+        mirror_file = actions_mirror.mirror_path(server, database)
+        # The button re-checks every stored day; otherwise only days that can have changed are compared
+        full_sync = st.button("Sync mirror now", key="core_mirror_sync")
+        if full_sync:
+            sync_mirror.clear()
+        try:
+            synced = sync_mirror(server, database, user_id, full=full_sync)
+            status = actions_mirror.mirror_status(mirror_file, user_id)
+            st.caption(f"Mirror: {status['rows']:,} rows over {status['days']:,} days "
+                       f"(last sync re-pulled {synced['days_synced']:,} days).")
+        except Exception as e:
+            st.warning(f"Mirror unavailable, querying SQL Server: {e}")
+            use_mirror = False
+
     st.divider()
     st.header("📅 Filters")
 
     # Discover date bounds
     try:
-        meta_df = pd_read_sql(
-            "SELECT MIN(et_date) AS min_d, MAX(et_date) AS max_d FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ?;",
-            server, database, params=(user_id,)
-        )
+        bounds = mirror_query(actions_mirror.date_bounds, user_id)
+        if bounds is not None:
+            meta_df = pd.DataFrame([bounds], columns=["min_d", "max_d"])
+        else:
+            meta_df = pd_read_sql(
+                "SELECT MIN(et_date) AS min_d, MAX(et_date) AS max_d FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ?;",
+                server, database, params=(user_id,)
+            )
         min_d = pd.to_datetime(meta_df["min_d"].iloc[0]).date() if not meta_df.empty else date.today() - timedelta(days=365)
         max_d = pd.to_datetime(meta_df["max_d"].iloc[0]).date() if not meta_df.empty else date.today()
     except Exception:
@@ -67,10 +121,14 @@ with st.sidebar:
 
     # Symbols list
     try:
-        sym_df = pd_read_sql(
-            "SELECT DISTINCT symbol FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY symbol;",
-            server, database, params=(user_id,)
-        )
+        names = mirror_query(actions_mirror.distinct_values, user_id, "symbol")
+        if names is not None:
+            sym_df = pd.DataFrame({"symbol": names})
+        else:
+            sym_df = pd_read_sql(
+                "SELECT DISTINCT symbol FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY symbol;",
+                server, database, params=(user_id,)
+            )
         symbols_all = sorted(sym_df["symbol"].dropna().astype(str).tolist())
     except Exception:
         symbols_all = []
@@ -78,10 +136,14 @@ with st.sidebar:
 
     # Methods available
     try:
-        meth_df = pd_read_sql(
-            "SELECT DISTINCT method FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY method;",
-            server, database, params=(user_id,)
-        )
+        names = mirror_query(actions_mirror.distinct_values, user_id, "method")
+        if names is not None:
+            meth_df = pd.DataFrame({"method": names})
+        else:
+            meth_df = pd_read_sql(
+                "SELECT DISTINCT method FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY method;",
+                server, database, params=(user_id,)
+            )
         methods_all = sorted(meth_df["method"].dropna().astype(str).tolist())
     except Exception:
         methods_all = []
@@ -104,44 +166,21 @@ with st.sidebar:
     default_conf_h = st.selectbox("Default horizon (used for summaries)",
                                   options=[10,5,15,0], index=0, key="core_default_conf_h")
 
+# Only the selected view runs, so only its columns are loaded
+view = st.radio("View", options=list(VIEW_COLUMNS), horizontal=True, key="core_view",
+                label_visibility="collapsed")
+
 # -----------------------------
 # Data loader (Two-layer caching)
 # -----------------------------
 @st.cache_data(show_spinner=True, ttl=600)
-def load_raw_actions(server: str, db: str, user_id: str, d0: date, d1: date) -> pd.DataFrame:
+def load_raw_actions(server: str, db: str, user_id: str, d0: date, d1: date, columns: Tuple[str, ...]) -> pd.DataFrame:
     """Load a broader slice only by date + user. Downstream filters are applied in memory for speed."""
-    q = """
-    SELECT user_id, symbol, session, et_date, method, buy_pct, sell_pct,
-           day_return, n_trades, baseline,
-           corr_pearson, corr_spearman, confidence,
-           corr_pearson_0m, corr_spearman_0m, confidence_0m,
-           corr_pearson_5m, corr_spearman_5m, confidence_5m,
-           corr_pearson_10m, corr_spearman_10m, confidence_10m,
-           corr_pearson_15m, corr_spearman_15m, confidence_15m,
-           btc_prev_ret, btc_prev_vol, btc_prev_range, btc_overnight_ret,
-           open_gap_z, liq_median, liq_p10, liq_p90
-    FROM dbo.bitcorr_daily_actions WITH (NOLOCK)
-    WHERE user_id = ? AND et_date BETWEEN ? AND ?;
-    """
-    df = pd_read_sql(q, server, db, params=(user_id, str(d0), str(d1)))
-    if not df.empty:
-        df["et_date"] = pd.to_datetime(df["et_date"]).dt.date
-        for c in ["buy_pct","sell_pct","day_return","baseline",
-                  "corr_pearson","corr_spearman","confidence",
-                  "corr_pearson_0m","corr_spearman_0m","confidence_0m",
-                  "corr_pearson_5m","corr_spearman_5m","confidence_5m",
-                  "corr_pearson_10m","corr_spearman_10m","confidence_10m",
-                  "corr_pearson_15m","corr_spearman_15m","confidence_15m",
-                  "btc_prev_ret","btc_prev_vol","btc_prev_range","btc_overnight_ret",
-                  "open_gap_z","liq_median","liq_p10","liq_p90"]:
-            if c in df.columns:
-                df[c] = pd.to_numeric(df[c], errors="coerce")
-        if "n_trades" in df.columns:
-            df["n_trades"] = pd.to_numeric(df["n_trades"], errors="coerce").fillna(0).astype(int)
-        df["symbol"] = df["symbol"].astype(str)
-        df["session"] = df["session"].astype(str)
-        df["method"] = df["method"].astype(str)
-    return df
+    cn = get_cnx(server, db)
+    try:
+        return fetch_actions(cn, user_id, d0, d1, columns)
+    finally:
+        cn.close()
 
 def filter_actions(raw: pd.DataFrame,
                    symbols: List[str], sessions: List[str], methods: List[str],
@@ -159,14 +198,20 @@ def filter_actions(raw: pd.DataFrame,
     sub = sub[(sub["sell_pct"] >= float(sell_min)) & (sub["sell_pct"] <= float(sell_max))]
     return sub
 
-raw = load_raw_actions(server, database, user_id, d0, d1)
-df = filter_actions(raw, symbols, sessions, methods, buy_min, buy_max, sell_min, sell_max)
+flt = actions_mirror.action_filter(user_id, d0, d1, symbols, sessions, methods, buy_min, buy_max, sell_min, sell_max)
+if use_mirror:
+    try:
+        raw = df = load_mirror_actions(mirror_file, synced["synced_utc"], flt, tuple(view_columns(view)))
+    except actions_mirror.MirrorUnavailable as e:
+        st.sidebar.warning(f"Mirror busy, querying SQL Server: {e}")
+        use_mirror = False
+if not use_mirror:
+    raw = load_raw_actions(server, database, user_id, d0, d1, tuple(view_columns(view)))
+    df = filter_actions(raw, symbols, sessions, methods, buy_min, buy_max, sell_min, sell_max)
 
-# Guardrail for huge pulls
-if raw is not None and len(raw) > 5_000_000:
-    st.warning(f"Raw dataset has {len(raw):,} rows for this date span. Narrow date range for faster interactivity.")
-if df is not None and len(df) > 5_000_000:
-    st.warning(f"Filtered dataset has {len(df):,} rows. Consider narrowing symbols/methods/thresholds.")
+with st.sidebar:
+    st.caption(f"Loaded {len(raw):,} rows × {raw.shape[1]} columns ({frame_memory_mb(raw):,.0f} MB); "
+               f"{len(df):,} after filters.")
 
 # -----------------------------
 # Helpers
@@ -214,55 +259,14 @@ def run_walkforward(base: pd.DataFrame, reg_vars: List[str], train_win: int, bin
     base = base.copy()
     for rv in reg_vars:
         base[f"{rv}_bin"] = pd.qcut(base[rv], q=bins, labels=False, duplicates="drop")
-    base = base.sort_values("et_date")
-    dlist = sorted(base["et_date"].unique().tolist())
-    out = []
-    for i in range(int(train_win), len(dlist)):
-        train_days = dlist[i-int(train_win):i]
-        test_day = dlist[i]
-
-        train = base[base["et_date"].isin(train_days)]
-        g = train.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False).agg(
-            avg_ret=("day_return","mean"),
-            support=("day_return","size")
-        )
-        best = g.sort_values(["avg_ret","support"], ascending=[False,False]).groupby(key_cols, as_index=False).head(1)
-
-        day_reg = base[base["et_date"] == test_day]
-        if day_reg.empty:
-            out.append((test_day, np.nan)); continue
-        reg_key = [int(pd.Series(day_reg[k].dropna()).mode().iloc[0]) if not day_reg[k].dropna().empty else np.nan for k in key_cols]
-        if any(pd.isna(reg_key)):
-            out.append((test_day, np.nan)); continue
-        filt = best.copy()
-        for j, k in enumerate(key_cols):
-            filt = filt[filt[k] == reg_key[j]]
-        if filt.empty:
-            out.append((test_day, np.nan)); continue
-
-        act = filt.iloc[0]
-        sel = base[(base["et_date"] == test_day) &
-                   (base["method"] == act["method"]) &
-                   (base["buy_pct"] == act["buy_pct"]) &
-                   (base["sell_pct"] == act["sell_pct"])]
-        out.append((test_day, float(sel["day_return"].mean()) if not sel.empty else np.nan))
-
-    by_day = pd.DataFrame(out, columns=["et_date","day_return"]).dropna()
+    by_day = walkforward_returns(base, key_cols, int(train_win)).dropna()
     eq = equity_from_returns(by_day["day_return"], start_capital)
     return by_day, eq
 
-# -----------------------------
-# Tabs
-# -----------------------------
-tab_overview, tab_regimes, tab_winners, tab_heatmap, tab_thresholds, tab_conf, tab_confroi, tab_policy, tab_export, tab_runlog = st.tabs([
-    "Overview", "Regime Explorer", "Daily Winners", "Heatmap (Buy×Sell)", "Fixed-Threshold Compare",
-    "Confidence Explorer", "Confidence ROI Compare", "Policy ROI (Backtest)", "Export", "Run Log"
-])
-
 # -----------------------------
 # Overview
 # -----------------------------
-with tab_overview:
+if view == "Overview":
     st.markdown("### 📊 Overview")
     if df.empty:
         st.info("No data for selected filters. Adjust the sidebar and try again.")
@@ -281,16 +285,22 @@ with tab_overview:
             st.metric("Methods", f"{meth_ct:,}")
 
         # Aggregate best per method overall
-        agg = df.groupby(["symbol","session","method"], as_index=False).agg(
-            mean_return=("day_return","mean"),
-            sharpe=("day_return", sharpe_like),
-            days=("et_date","nunique")
-        ).sort_values("mean_return", ascending=False).head(20)
+        agg = mirror_query(actions_mirror.group_stats, flt, ["symbol","session","method"], {
+                "mean_return": ("day_return","mean"), "sharpe": ("day_return","sharpe"), "days": ("et_date","nunique")})
+        if agg is None:
+            agg = df.groupby(["symbol","session","method"], as_index=False, observed=True).agg(
+                mean_return=("day_return","mean"),
+                sharpe=("day_return", sharpe_like),
+                days=("et_date","nunique")
+            )
+        agg = agg.sort_values("mean_return", ascending=False).head(20)
         st.markdown("**Top methods by mean return**")
         st.dataframe(agg, use_container_width=True)
 
         # Oracle equity (best per day across all combos per symbol) averaged across symbols
-        oracle = df.sort_values(["symbol","session","et_date","day_return"], ascending=[True,True,True,False]).drop_duplicates(["symbol","session","et_date"])
+        oracle = mirror_query(actions_mirror.daily_winners, flt, ["symbol","session","et_date","day_return"])
+        if oracle is None:
+            oracle = df.sort_values(["symbol","session","et_date","day_return"], ascending=[True,True,True,False]).drop_duplicates(["symbol","session","et_date"])
         eq_oracle = oracle.groupby("et_date")["day_return"].mean().sort_index()
         eq_df = pd.DataFrame({"et_date": eq_oracle.index, "oracle_ret": eq_oracle.values})
         eq_df["oracle_eq"] = equity_from_returns(eq_df["oracle_ret"], 1.0)
@@ -306,7 +316,7 @@ with tab_overview:
 # -----------------------------
 # Regime Explorer
 # -----------------------------
-with tab_regimes:
+if view == "Regime Explorer":
     st.markdown("### 🧭 Regime Explorer")
     if df.empty:
         st.info("Load data in the sidebar to explore regimes.")
@@ -328,7 +338,7 @@ with tab_regimes:
             st.warning("Select at least one regime variable.")
         else:
             group_keys = bucket_names + ["method","buy_pct","sell_pct"]
-            g = work.groupby(group_keys, as_index=False).agg(
+            g = work.groupby(group_keys, as_index=False, observed=True).agg(
                 avg_ret=("day_return","mean"),
                 support=("day_return","size"),
                 sharpe=("day_return", lambda x: float(np.nanmean(x)/np.nanstd(x)) if np.nanstd(x) else 0.0),
@@ -374,16 +384,18 @@ with tab_regimes:
 # -----------------------------
 # Daily Winners
 # -----------------------------
-with tab_winners:
+if view == "Daily Winners":
     st.markdown("### 🏆 Daily Winners")
     if df.empty:
         st.info("Load data to see winners.")
     else:
-        winners = df.sort_values(["symbol","session","et_date","day_return"], ascending=[True,True,True,False]).drop_duplicates(["symbol","session","et_date"])
+        winners = mirror_query(actions_mirror.daily_winners, flt, ["symbol","session","et_date","method","buy_pct","sell_pct","day_return"])
+        if winners is None:
+            winners = df.sort_values(["symbol","session","et_date","day_return"], ascending=[True,True,True,False]).drop_duplicates(["symbol","session","et_date"])
         st.dataframe(winners[["symbol","session","et_date","method","buy_pct","sell_pct","day_return"]].sort_values(["et_date","symbol"]), use_container_width=True)
 
         # Win rate by method
-        win_rate = winners.groupby("method", as_index=False).agg(
+        win_rate = winners.groupby("method", as_index=False, observed=True).agg(
             wins=("et_date","count"),
             avg_ret=("day_return","mean")
         ).sort_values("wins", ascending=False)
@@ -403,14 +415,16 @@ with tab_winners:
 # -----------------------------
 # Heatmap (Buy×Sell)
 # -----------------------------
-with tab_heatmap:
+if view == "Heatmap (Buy×Sell)":
     st.markdown("### 🧯 Heatmap: mean return by Buy×Sell")
     if df.empty:
         st.info("Load data to see heatmaps.")
     else:
         # Optionally filter to one method for clarity
         meth_pick = st.selectbox("Method (optional)", options=["<ALL>"] + sorted(df["method"].unique().tolist()))
-        pivot = compute_heatmap(df, meth_pick)
+        pivot = mirror_query(actions_mirror.heatmap, flt if meth_pick == "<ALL>" else dict(flt, methods=[meth_pick]))
+        if pivot is None:
+            pivot = compute_heatmap(df, meth_pick)
         fig4, ax4 = plt.subplots()
         im = ax4.imshow(pivot.values, aspect="auto", origin="lower")
         ax4.set_xticks(range(pivot.shape[1]))
@@ -426,7 +440,7 @@ with tab_heatmap:
 # -----------------------------
 # Fixed-Threshold Compare
 # -----------------------------
-with tab_thresholds:
+if view == "Fixed-Threshold Compare":
     st.markdown("### 🎛️ Fixed-Threshold Comparison")
     if df.empty:
         st.info("Load data to compare thresholds.")
@@ -442,7 +456,7 @@ with tab_thresholds:
         if ft.empty:
             st.info("No rows match that exact threshold pair in the filtered data.")
         else:
-            comp = ft.groupby(["method"], as_index=False).agg(
+            comp = ft.groupby(["method"], as_index=False, observed=True).agg(
                 mean_return=("day_return","mean"),
                 sharpe=("day_return", sharpe_like),
                 support=("day_return","size"),
@@ -453,7 +467,7 @@ with tab_thresholds:
 # -----------------------------
 # Confidence Explorer
 # -----------------------------
-with tab_conf:
+if view == "Confidence Explorer":
     st.markdown("### 🔬 Confidence Explorer")
     if df.empty:
         st.info("Load data to explore confidence.")
@@ -482,8 +496,8 @@ with tab_conf:
                     return float(np.corrcoef(s, r)[0, 1])
                 except Exception:
                     return np.nan
-            csum = df.groupby("method").apply(corr_with_conf).reset_index(name="corr_conf_ret")
-            csum2 = df.groupby("method", as_index=False).agg(
+            csum = df.groupby("method", observed=True).apply(corr_with_conf).reset_index(name="corr_conf_ret")
+            csum2 = df.groupby("method", as_index=False, observed=True).agg(
                 mean_conf=(conf_col,"mean"),
                 mean_ret=("day_return","mean"),
                 support=("day_return","size")
@@ -494,7 +508,7 @@ with tab_conf:
 # -----------------------------
 # Confidence ROI Compare
 # -----------------------------
-with tab_confroi:
+if view == "Confidence ROI Compare":
     st.markdown("### 🧪 Confidence ROI Compare (by horizon)")
     if df.empty:
         st.info("Load data to compare ROI across confidence horizons.")
@@ -562,7 +576,7 @@ with tab_confroi:
 # -----------------------------
 # Policy ROI (Backtest) - core
 # -----------------------------
-with tab_policy:
+if view == "Policy ROI (Backtest)":
     st.markdown("### 🧪 Policy ROI Backtest (Core)")
     if df.empty:
         st.info("Load data to backtest policies.")
@@ -604,7 +618,7 @@ with tab_policy:
 
         elif policy_type == "Adaptive (in-sample)":
             key_cols = [f"{rv}_bin" for rv in reg_vars]
-            g = base.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False).agg(
+            g = base.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False, observed=True).agg(
                 avg_ret=("day_return","mean"),
                 support=("day_return","size")
             )
@@ -638,10 +652,51 @@ with tab_policy:
             st.pyplot(fig8, use_container_width=True)
             st.dataframe(by_day, use_container_width=True)
 
+            with st.expander("Compare configurations (parallel walk-forward)"):
+                reg_options = ["btc_prev_ret","btc_prev_vol","btc_overnight_ret","open_gap_z"]
+                reg_sets = [[f for k, f in enumerate(reg_options) if mask >> k & 1] for mask in range(1, 2 ** len(reg_options))]
+                set_labels = ["+".join(rs) for rs in reg_sets]
+                cc = st.columns(4)
+                with cc[0]:
+                    grid_wins = st.multiselect("Training windows", options=[20, 30, 40, 60, 90, 120, 180, 250],
+                                               default=[int(train_win)] if int(train_win) in (20, 30, 40, 60, 90, 120, 180, 250) else [60],
+                                               key="wf_grid_wins")
+                with cc[1]:
+                    grid_bins = st.multiselect("Bins", options=list(range(2, 8)), default=[int(bins)], key="wf_grid_bins")
+                with cc[2]:
+                    grid_sets = st.multiselect("Regime field sets", options=set_labels,
+                                               default=["+".join(reg_vars)] if "+".join(reg_vars) in set_labels else [set_labels[0]],
+                                               key="wf_grid_sets")
+                with cc[3]:
+                    grid_workers = st.number_input("Worker processes", min_value=1, max_value=max(1, os.cpu_count() or 1),
+                                                   value=min(8, max(1, os.cpu_count() or 1)), step=1, key="wf_grid_workers")
+                configs = walkforward_configs(grid_wins, grid_bins, [reg_sets[set_labels.index(s)] for s in grid_sets])
+                st.caption(f"{len(configs)} configuration(s) over {df['et_date'].nunique():,} days.")
+                if st.button("Run comparison", key="wf_grid_run", disabled=not configs):
+                    bar = st.progress(0.0)
+                    with st.spinner("Running walk-forward grid..."):
+                        wf_table = walkforward_grid(df, configs, float(start_capital), workers=int(grid_workers),
+                                                    progress=lambda done, total: bar.progress(done / total))
+                    bar.empty()
+                    if wf_table.empty:
+                        st.info("No configuration produced a trading day (training windows longer than the loaded range?).")
+                    else:
+                        curves = wf_table.pivot_table(index="et_date", columns="config", values="equity", aggfunc="last").ffill()
+                        fig9, ax9 = plt.subplots()
+                        for label in curves.columns:
+                            ax9.plot(curves.index, curves[label], label=label)
+                        ax9.set_title("Walk-forward equity by configuration")
+                        ax9.set_xlabel("Date"); ax9.set_ylabel("Equity"); ax9.grid(True, alpha=0.2)
+                        ax9.legend(fontsize="x-small")
+                        st.pyplot(fig9, use_container_width=True)
+                        st.dataframe(grid_summary(wf_table), use_container_width=True)
+                        st.download_button("Download equity curves (CSV)", wf_table.to_csv(index=False).encode("utf-8"),
+                                           file_name="walkforward_grid.csv", mime="text/csv")
+
 # -----------------------------
 # Export
 # -----------------------------
-with tab_export:
+if view == "Export":
     st.markdown("### ⬇️ Export filtered dataset")
     if df.empty:
         st.info("No data to export. Adjust filters.")
@@ -652,7 +707,7 @@ with tab_export:
 # -----------------------------
 # Run Log
 # -----------------------------
-with tab_runlog:
+if view == "Run Log":
     st.markdown("### 📜 Run Log (builder jobs)")
     try:
         log_df = pd_read_sql(
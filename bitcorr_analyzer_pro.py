@@ -1,6 +1,7 @@
 
 # bitcorr_analyzer_pro.py
 # Streamlit app for advanced analysis of BitCorr SQL warehouse.
+# With the local DuckDB mirror (actions_mirror), filters and per-symbol summaries run as queries.
 import os
 from datetime import date, datetime, timedelta, time as dtime
 from typing import Optional, List, Dict, Tuple
@@ -11,6 +12,9 @@ import pyodbc
 import streamlit as st
 import matplotlib.pyplot as plt
 
+import actions_mirror
+from walkforward import walkforward_returns
+
 st.set_page_config(page_title="BitCorr Analyzer — Pro", layout="wide")
 
 # -----------------------------
@@ -35,6 +39,29 @@ def pd_read_sql(q: str, server: str, db: str, params=None) -> pd.DataFrame:
         cn.close()
     return df
 
+@st.cache_data(show_spinner="Syncing local mirror…", ttl=600)
+def sync_mirror(server: str, db: str, user_id: str, full: bool = False) -> dict:
+    """Incremental sync of user_id's rows into the local DuckDB mirror (at most once per ttl); full checks every day."""
+    cn = get_cnx(server, db)
+    try:
+        return actions_mirror.sync(cn, actions_mirror.mirror_path(server, db), user_id, full=full)
+    finally:
+        cn.close()
+
+@st.cache_data(show_spinner=True, ttl=600)
+def load_mirror_actions(path: str, synced_utc, flt: dict, columns: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """Filtered rows from the mirror (filters pushed into the query); synced_utc ties the cache to the last sync."""
+    return actions_mirror.load_actions(path, flt, columns)
+
+def mirror_query(fn, *args, **kwargs):
+    """fn(mirror_file, ...) while the mirror is in use; None when it is off or another process holds its lock."""
+    if not use_mirror:
+        return None
+    try:
+        return fn(mirror_file, *args, **kwargs)
+    except actions_mirror.MirrorUnavailable:
+        return None
+
 # -----------------------------
 # Sidebar
 # -----------------------------
@@ -44,14 +71,38 @@ with st.sidebar:
     database = st.text_input("Database", value=os.getenv("BITCORR_SQL_DB", "streamlit"))
     user_id = st.text_input("User tag (user_id)", value=os.getenv("BITCORR_USER_ID", "default"))
 
+    use_mirror = False
+    if actions_mirror.available():
+        use_mirror = st.checkbox("Query local DuckDB mirror", value=True, key="pro_use_mirror",
+                                 help="Filters, heatmaps and groupbys run against a local copy of "
+                                      "dbo.bitcorr_daily_actions that syncs new / changed days incrementally.")
+    if use_mirror:
+        mirror_file = actions_mirror.mirror_path(server, database)
+        # The button re-checks every stored day; otherwise only days that can have changed are compared
+        full_sync = st.button("Sync mirror now", key="pro_mirror_sync")
+        if full_sync:
+            sync_mirror.clear()
+        try:
+            synced = sync_mirror(server, database, user_id, full=full_sync)
+            status = actions_mirror.mirror_status(mirror_file, user_id)
+            st.caption(f"Mirror: {status['rows']:,} rows over {status['days']:,} days "
+                       f"(last sync re-pulled {synced['days_synced']:,} days).")
+        except Exception as e:
+            st.warning(f"Mirror unavailable, querying SQL Server: {e}")
+            use_mirror = False
+
     st.divider()
     st.header("📅 Filters")
 
     try:
-        meta_df = pd_read_sql(
-            "SELECT MIN(et_date) AS min_d, MAX(et_date) AS max_d FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ?;",
-            server, database, params=(user_id,)
-        )
+        bounds = mirror_query(actions_mirror.date_bounds, user_id)
+        if bounds is not None:
+            meta_df = pd.DataFrame([bounds], columns=["min_d", "max_d"])
+        else:
+            meta_df = pd_read_sql(
+                "SELECT MIN(et_date) AS min_d, MAX(et_date) AS max_d FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ?;",
+                server, database, params=(user_id,)
+            )
         min_d = pd.to_datetime(meta_df["min_d"].iloc[0]).date() if not meta_df.empty else date.today() - timedelta(days=365)
         max_d = pd.to_datetime(meta_df["max_d"].iloc[0]).date() if not meta_df.empty else date.today()
     except Exception:
@@ -64,10 +115,14 @@ with st.sidebar:
 
     # Symbols
     try:
-        sym_df = pd_read_sql(
-            "SELECT DISTINCT symbol FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY symbol;",
-            server, database, params=(user_id,)
-        )
+        names = mirror_query(actions_mirror.distinct_values, user_id, "symbol")
+        if names is not None:
+            sym_df = pd.DataFrame({"symbol": names})
+        else:
+            sym_df = pd_read_sql(
+                "SELECT DISTINCT symbol FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY symbol;",
+                server, database, params=(user_id,)
+            )
         symbols_all = sorted(sym_df["symbol"].dropna().astype(str).tolist())
     except Exception:
         symbols_all = []
@@ -75,10 +130,14 @@ with st.sidebar:
 
     # Methods
     try:
-        meth_df = pd_read_sql(
-            "SELECT DISTINCT method FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY method;",
-            server, database, params=(user_id,)
-        )
+        names = mirror_query(actions_mirror.distinct_values, user_id, "method")
+        if names is not None:
+            meth_df = pd.DataFrame({"method": names})
+        else:
+            meth_df = pd_read_sql(
+                "SELECT DISTINCT method FROM dbo.bitcorr_daily_actions WITH (NOLOCK) WHERE user_id = ? ORDER BY method;",
+                server, database, params=(user_id,)
+            )
         methods_all = sorted(meth_df["method"].dropna().astype(str).tolist())
     except Exception:
         methods_all = []
@@ -142,7 +201,15 @@ def load_actions(server: str, db: str, user_id: str,
         df["n_trades"] = df["n_trades"].astype(int)
     return df
 
-df = load_actions(server, database, user_id, symbols, sessions, d0, d1, methods, buy_min, buy_max, sell_min, sell_max)
+flt = actions_mirror.action_filter(user_id, d0, d1, symbols, sessions, methods, buy_min, buy_max, sell_min, sell_max)
+if use_mirror:
+    try:
+        df = load_mirror_actions(mirror_file, synced["synced_utc"], flt) if symbols and sessions else pd.DataFrame()
+    except actions_mirror.MirrorUnavailable as e:
+        st.sidebar.warning(f"Mirror busy, querying SQL Server: {e}")
+        use_mirror = False
+if not use_mirror:
+    df = load_actions(server, database, user_id, symbols, sessions, d0, d1, methods, buy_min, buy_max, sell_min, sell_max)
 
 # -----------------------------
 # Helpers
@@ -241,12 +308,17 @@ with tab_symboldash:
             ax.set_xlabel("Date"); ax.set_ylabel("Equity"); ax.grid(True, alpha=0.2)
             st.pyplot(fig, use_container_width=True)
 
-            summary = ss.groupby("method", as_index=False).agg(
-                mean_ret=("day_return","mean"),
-                sharpe=("day_return", lambda x: float(np.nanmean(x)/np.nanstd(x)) if np.nanstd(x) else 0.0),
-                support=("day_return","size"),
-                conf10=("confidence_10m","mean")
-            ).sort_values("mean_ret", ascending=False).head(20)
+            summary = mirror_query(actions_mirror.group_stats, dict(flt, symbols=[sym_pick], sessions=[sess]), ["method"], {
+                    "mean_ret": ("day_return","mean"), "sharpe": ("day_return","sharpe"),
+                    "support": ("day_return","size"), "conf10": ("confidence_10m","mean")})
+            if summary is None:
+                summary = ss.groupby("method", as_index=False, observed=True).agg(
+                    mean_ret=("day_return","mean"),
+                    sharpe=("day_return", lambda x: float(np.nanmean(x)/np.nanstd(x)) if np.nanstd(x) else 0.0),
+                    support=("day_return","size"),
+                    conf10=("confidence_10m","mean")
+                )
+            summary = summary.sort_values("mean_ret", ascending=False).head(20)
             st.dataframe(summary, use_container_width=True)
 
 # -----------------------------
@@ -269,7 +341,7 @@ with tab_rules:
             base[col] = regime_bins(base[rv], bins=bins)
             key_cols.append(col)
 
-        g = base.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False).agg(
+        g = base.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False, observed=True).agg(
             avg_ret=("day_return","mean"),
             sharpe=("day_return", lambda x: float(np.nanmean(x)/np.nanstd(x)) if np.nanstd(x) else 0.0),
             support=("day_return","size")
@@ -304,53 +376,9 @@ with tab_constrained:
         for rv in reg_vars:
             base[f"{rv}_bin"] = regime_bins(base[rv], bins=bins)
 
-        dlist = sorted(base["et_date"].unique().tolist())
-        out = []
-        for i in range(int(train_win), len(dlist)):
-            train_days = dlist[i-int(train_win):i]
-            test_day = dlist[i]
-
-            train = base[base["et_date"].isin(train_days)]
-            g = train.groupby([*(f"{rv}_bin" for rv in reg_vars), "method","buy_pct","sell_pct"], as_index=False).agg(
-                avg_ret=("day_return","mean"),
-                support=("day_return","size"),
-                mean_conf=(conf_col,"mean")
-            )
-            # Apply constraints
-            g = g[(g["support"] >= int(min_support)) & (g["mean_conf"] >= float(conf_min))]
-            if g.empty:
-                out.append((test_day, np.nan)); continue
-
-            best = g.sort_values(["avg_ret","support","mean_conf"], ascending=[False,False,False]).groupby([*(f"{rv}_bin" for rv in reg_vars)], as_index=False).head(1)
-
-            # Determine today's bins (mode per bin)
-            day_reg = base[base["et_date"] == test_day]
-            if day_reg.empty:
-                out.append((test_day, np.nan)); continue
-            reg_key = []
-            missing = False
-            for rv in reg_vars:
-                col = f"{rv}_bin"
-                if day_reg[col].dropna().empty:
-                    missing = True; break
-                reg_key.append(int(day_reg[col].dropna().mode().iloc[0]))
-            if missing:
-                out.append((test_day, np.nan)); continue
-
-            filt = best.copy()
-            for j, rv in enumerate(reg_vars):
-                filt = filt[filt[f"{rv}_bin"] == reg_key[j]]
-            if filt.empty:
-                out.append((test_day, np.nan)); continue
-
-            act = filt.iloc[0]
-            sel = base[(base["et_date"] == test_day) &
-                       (base["method"] == act["method"]) &
-                       (base["buy_pct"] == act["buy_pct"]) &
-                       (base["sell_pct"] == act["sell_pct"])]
-            out.append((test_day, float(sel["day_return"].mean()) if not sel.empty else np.nan))
-
-        by_day = pd.DataFrame(out, columns=["et_date","day_return"]).dropna()
+        by_day = walkforward_returns(base, [f"{rv}_bin" for rv in reg_vars], int(train_win),
+                                     min_support=int(min_support), conf_col=conf_col,
+                                     conf_min=float(conf_min)).dropna()
         eq = equity_from_returns(by_day["day_return"], start_capital)
         fig, ax = plt.subplots()
         ax.plot(by_day["et_date"], eq)
@@ -446,13 +474,13 @@ with tab_live:
                 train[col] = regime_bins(train[rv], bins=bins)
                 key_cols.append(col)
 
-            g = train.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False).agg(
+            g = train.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False, observed=True).agg(
                 avg_ret=("day_return","mean"),
                 support=("day_return","size"),
                 conf=("day_return", "size")
             )
             # join mean confidence per action
-            g2 = train.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False).agg(
+            g2 = train.groupby(key_cols + ["method","buy_pct","sell_pct"], as_index=False, observed=True).agg(
                 mean_conf=(conf_col,"mean")
             )
             g = g.merge(g2, on=key_cols + ["method","buy_pct","sell_pct"], how="left")
@@ -0,0 +1,404 @@
+# bitcorr_builder.py
+# Headless builder for dbo.bitcorr_daily_actions (the table the BitCorr analyzers read).
+#
+# One row per (symbol, session, et_date, method, buy%, sell%): the day's return from a fresh
+# wallet (isolated day, as in "Batch (Fast) — Daily"), the method's baseline from the previous
+# N trading days of the same session, signal/return correlations for every horizon
+# (0m/5m/10m/15m; the legacy corr_pearson/corr_spearman/confidence mirror --default-horizon)
+# and the day's regime / liquidity features (joined from regime_store's dbo.bitcorr_regime_features,
+# which is brought up to date before the build).
+#
+#  - Work is split into symbol-months and run in a process pool (fetch + simulate in the worker)
+#  - dbo.bitcorr_run_log gets one row per (symbol, session, month) with expected / existing /
+#    inserted row counts and a hash of the build settings (grid, methods, lookback, capital, cap %,
+#    horizon); a job whose last 'done' entry has the same hash and still matches the table is
+#    skipped, so an interrupted build resumes where it stopped and a build with other settings
+#    rewrites the rows
+#  - Rows are written with pyodbc fast_executemany in large batches
+#
+# Run:
+#   python bitcorr_builder.py --user-id default --symbols RIOT,MARA --start 2025-01-01 --end 2025-06-30
+#   python bitcorr_builder.py --start 2025-01-01 --end 2025-06-30 --workers 6 --buys 0.1:3.0:0.1 --sells 0.1:3.0:0.1
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone, time as dtime
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyodbc
+except Exception:
+    pyodbc = None
+
+from baseline_engine import (CORR_FIELDS, DayIndex, baseline_arrays, baseline_values_multi, day_arrays,
+                             grid_pairs, signal_arrays, signal_correlations, simulate_isolated_days)
+from regime_store import FEATURE_COLUMNS, load_features, sync as sync_features
+
+BASELINE_METHODS = ["VWAP_RATIO", "VOL_WEIGHTED", "WINSORIZED", "WEIGHTED_MEDIAN", "EQUAL_MEAN"]
+SESSIONS = ["RTH", "AH"]
+HORIZONS = [0, 5, 10, 15]
+REGIME_COLUMNS = list(FEATURE_COLUMNS)
+
+ACTION_COLUMNS = (["user_id", "symbol", "session", "et_date", "method", "buy_pct", "sell_pct",
+                   "day_return", "n_trades", "baseline",
+                   "corr_pearson", "corr_spearman", "confidence"]
+                  + [f"{c}_{h}m" for h in HORIZONS for c in ("corr_pearson", "corr_spearman", "confidence")]
+                  + REGIME_COLUMNS)
+
+# ---------------- Schema (create-if-missing) ----------------
+SCHEMA_SQL = r"""
+IF OBJECT_ID('dbo.bitcorr_daily_actions','U') IS NULL
+BEGIN
+  CREATE TABLE dbo.bitcorr_daily_actions (
+    user_id NVARCHAR(64) NOT NULL, symbol NVARCHAR(16) NOT NULL, session NVARCHAR(8) NOT NULL,
+    et_date DATE NOT NULL, method NVARCHAR(32) NOT NULL, buy_pct FLOAT NOT NULL, sell_pct FLOAT NOT NULL,
+    day_return FLOAT NULL, n_trades INT NULL, baseline FLOAT NULL,
+    corr_pearson FLOAT NULL, corr_spearman FLOAT NULL, confidence FLOAT NULL,
+    corr_pearson_0m FLOAT NULL, corr_spearman_0m FLOAT NULL, confidence_0m FLOAT NULL,
+    corr_pearson_5m FLOAT NULL, corr_spearman_5m FLOAT NULL, confidence_5m FLOAT NULL,
+    corr_pearson_10m FLOAT NULL, corr_spearman_10m FLOAT NULL, confidence_10m FLOAT NULL,
+    corr_pearson_15m FLOAT NULL, corr_spearman_15m FLOAT NULL, confidence_15m FLOAT NULL,
+    btc_prev_ret FLOAT NULL, btc_prev_vol FLOAT NULL, btc_prev_range FLOAT NULL, btc_overnight_ret FLOAT NULL,
+    open_gap_z FLOAT NULL, liq_median FLOAT NULL, liq_p10 FLOAT NULL, liq_p90 FLOAT NULL
+  );
+  CREATE INDEX ix_bitcorr_actions_user_date ON dbo.bitcorr_daily_actions(user_id, et_date)
+    INCLUDE (symbol, session, method, buy_pct, sell_pct, day_return);
+  CREATE INDEX ix_bitcorr_actions_job ON dbo.bitcorr_daily_actions(user_id, symbol, session, et_date);
+END;
+
+IF OBJECT_ID('dbo.bitcorr_run_log','U') IS NULL
+BEGIN
+  CREATE TABLE dbo.bitcorr_run_log (
+    id INT IDENTITY(1,1) PRIMARY KEY,
+    started_utc DATETIME2(0) NOT NULL, ended_utc DATETIME2(0) NULL,
+    status NVARCHAR(16) NOT NULL, user_id NVARCHAR(64) NOT NULL,
+    symbol NVARCHAR(16) NOT NULL, session NVARCHAR(8) NOT NULL,
+    date_start DATE NOT NULL, date_end DATE NOT NULL,
+    expected_rows INT NULL, existing_rows INT NULL, inserted_rows INT NULL,
+    message NVARCHAR(400) NULL, config_hash NVARCHAR(16) NULL
+  );
+END;
+IF COL_LENGTH('dbo.bitcorr_run_log', 'config_hash') IS NULL
+  ALTER TABLE dbo.bitcorr_run_log ADD config_hash NVARCHAR(16) NULL;
+"""
+
+# ---------------- DB helpers ----------------
+def _conn_str(server, database, trusted=True, username=None, password=None):
+    if trusted:
+        return f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
+    if not (username and password):
+        raise SystemExit("Provide --username and --password when --trusted no")
+    return f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
+
+def connect(conn: dict):
+    if pyodbc is None:
+        raise SystemExit("pyodbc not installed. Install with: pip install pyodbc")
+    return pyodbc.connect(_conn_str(**conn))
+
+def read_sql(conn: dict, sql: str, params=None) -> pd.DataFrame:
+    cn = connect(conn)
+    try:
+        return pd.read_sql(sql, cn, params=params)
+    finally:
+        cn.close()
+
+def fetch_minutes(conn: dict, user_id: str, symbol: str, d0: date, d1: date) -> pd.DataFrame:
+    """Joined stock/BTC minutes (same columns as the apps' fetch_join_minutes) ordered by ts_utc."""
+    q = r"""
+    SELECT ph.ts_utc, ph.et_date, ph.et_time,
+           ph.c AS stock_c, ph.v AS stock_v,
+           bh.c AS btc_c,   bh.v AS btc_v
+    FROM dbo.lab_price_history ph
+    JOIN dbo.lab_btc_history   bh
+      ON bh.user_id=ph.user_id AND bh.ts_utc=ph.ts_utc
+    WHERE ph.user_id=? AND ph.symbol=? AND ph.et_date BETWEEN ? AND ?
+    ORDER BY ph.ts_utc ASC;
+    """
+    df = read_sql(conn, q, params=(user_id, symbol, str(d0), str(d1)))
+    if df.empty:
+        return df
+    df["et_date"] = pd.to_datetime(df["et_date"]).dt.date
+    df["et_time"] = pd.to_datetime(df["et_time"].astype(str), errors="coerce").dt.time
+    df["ratio"] = (df["btc_c"].astype(float) / df["stock_c"].astype(float)).replace([np.inf, -np.inf], np.nan)
+    df["dollar_volume"] = df["stock_c"].astype(float) * df["stock_v"].astype(float)
+    df["is_rth"] = ((df["et_time"] >= dtime(9,30,0)) & (df["et_time"] <= dtime(16,0,0))).astype(int)
+    return df
+
+def lookback_start(conn: dict, user_id: str, symbol: str, d0: date, n: int) -> date:
+    """First of the n trading days before d0 (d0 itself when there are none)."""
+    q = """
+    SELECT TOP (?) et_date FROM dbo.lab_price_history
+    WHERE user_id=? AND symbol=? AND et_date < ?
+    GROUP BY et_date ORDER BY et_date DESC
+    """
+    prev = read_sql(conn, q, params=(int(n), user_id, symbol, str(d0)))
+    return min(pd.to_datetime(prev["et_date"]).dt.date.tolist()) if not prev.empty else d0
+
+# ---------------- Per-session rows ----------------
+def session_rows(df: pd.DataFrame, feats: pd.DataFrame, user_id: str, symbol: str, session: str,
+                 d0: date, d1: date, cfg: dict) -> pd.DataFrame:
+    """
+    Every (day, method, buy, sell) row of one session for trigger days d0..d1.
+    feats: the session's regime_store features indexed by et_date.
+    """
+    sess = df[df["is_rth"] == 1] if session == "RTH" else df[df["is_rth"] != 1]
+    ix = DayIndex(sess)
+    methods, lookback_n = cfg["methods"], int(cfg["lookback"])
+    days, base = [], []
+    for d in ix.days:
+        if not (d0 <= d <= d1):
+            continue
+        pj = ix.lookback(d, lookback_n)
+        if pj.empty or ix.day(d).empty:
+            continue
+        vals = baseline_values_multi(*baseline_arrays(pj), methods)[0] if len(pj) >= 30 else {}
+        days.append(d)
+        base.append([vals.get(m, np.nan) for m in methods])
+    if not days:
+        return pd.DataFrame(columns=ACTION_COLUMNS)
+    base = np.asarray(base, dtype=float)
+
+    arrs = [day_arrays(ix.day(d)) for d in days]
+    day_starts = np.cumsum([0] + [len(a[0]) for a in arrs[:-1]]).astype(np.int64)
+    px, vol, R = (np.concatenate([a[c] for a in arrs]) for c in range(3))
+    buy_k, sell_k = grid_pairs(cfg["buys"], cfg["sells"])
+    cash, shares, trades = simulate_isolated_days(px, vol, R, day_starts, base, buy_k, sell_k,
+                                                  float(cfg["capital"]), int(cfg["cap_pct"]))
+    last_px = np.array([a[0][-1] for a in arrs], dtype=float)
+    lp = np.where(np.isfinite(last_px), last_px, 0.0)
+    ret = (cash + shares * lp[:, None, None]) / float(cfg["capital"]) - 1.0
+
+    # Correlations depend on (day, method) only
+    n_d, n_m, n_p = cash.shape
+    corr = np.full((n_d, n_m, len(HORIZONS), len(CORR_FIELDS)), np.nan)
+    for j, d in enumerate(days):
+        cj = ix.day(d)
+        for m in range(n_m):
+            if np.isfinite(base[j, m]):
+                corr[j, m] = signal_correlations(*signal_arrays(cj, base[j, m]), HORIZONS)
+
+    keep = np.broadcast_to(np.isfinite(base)[:, :, None], cash.shape).reshape(-1)
+    d_i, m_i, p_i = (g.reshape(-1)[keep] for g in np.meshgrid(np.arange(n_d), np.arange(n_m), np.arange(n_p), indexing="ij"))
+    out = {
+        "user_id": user_id, "symbol": symbol, "session": session,
+        "et_date": np.asarray(days, dtype=object)[d_i],
+        "method": np.asarray(methods, dtype=object)[m_i],
+        "buy_pct": buy_k[p_i], "sell_pct": sell_k[p_i],
+        "day_return": ret.reshape(-1)[keep],
+        "n_trades": trades.reshape(-1)[keep].astype(int),
+        "baseline": base[d_i, m_i],
+    }
+    hz = HORIZONS.index(int(cfg["default_horizon"]))
+    for h_i, h in enumerate(HORIZONS):
+        for f_i, c in ((1, "corr_pearson"), (2, "corr_spearman"), (3, "confidence")):
+            out[f"{c}_{h}m"] = corr[d_i, m_i, h_i, f_i]
+            if h_i == hz:
+                out[c] = corr[d_i, m_i, h_i, f_i]
+    fday = feats.reindex(days)
+    for c in REGIME_COLUMNS:
+        out[c] = fday[c].to_numpy(float)[d_i]
+    return pd.DataFrame(out)[ACTION_COLUMNS]
+
+def build_job(job):
+    """Worker: fetch one symbol-month (plus its lookback) and build the rows of every session."""
+    (symbol, d0, d1), conn, user_id, cfg = job
+    started = datetime.now(timezone.utc)
+    try:
+        start = lookback_start(conn, user_id, symbol, d0, int(cfg["lookback"]))
+        df = fetch_minutes(conn, user_id, symbol, start, d1)
+        if df.empty:
+            return symbol, d0, d1, started, {s: pd.DataFrame(columns=ACTION_COLUMNS) for s in cfg["sessions"]}, None
+        feats = load_features(conn, user_id, symbol, d0, d1)
+        out = {}
+        for s in cfg["sessions"]:
+            fs = (feats.xs(s, level="session") if s in feats.index.get_level_values("session")
+                  else pd.DataFrame(columns=REGIME_COLUMNS))
+            out[s] = session_rows(df, fs, user_id, symbol, s, d0, d1, cfg)
+        return symbol, d0, d1, started, out, None
+    except Exception as e:
+        return symbol, d0, d1, started, {}, f"{type(e).__name__}: {e}"
+
+# ---------------- Run log / resume ----------------
+def month_chunks(start: date, end: date) -> List[Tuple[date, date]]:
+    out = []
+    d = date(start.year, start.month, 1)
+    while d <= end:
+        nxt = date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+        out.append((max(d, start), min(nxt - timedelta(days=1), end)))
+        d = nxt
+    return out
+
+def config_hash(cfg: dict) -> str:
+    """Hash of the settings that determine a session's rows (sessions only pick which jobs run)."""
+    key = {k: v for k, v in cfg.items() if k != "sessions"}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+def completed_jobs(conn: dict, user_id: str, start: date, end: date, cfg_hash: str) -> set:
+    """
+    (symbol, session, date_start, date_end) whose last run log entry is 'done' with config hash
+    cfg_hash and whose expected row count still matches the table (counted per symbol / session /
+    month in one query).
+    """
+    done = read_sql(conn, """
+        SELECT symbol, session, date_start, date_end, expected_rows
+        FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol, session, date_start, date_end ORDER BY id DESC) AS rn
+              FROM dbo.bitcorr_run_log WHERE user_id = ? AND date_start >= ? AND date_end <= ?) t
+        WHERE rn = 1 AND status = 'done' AND config_hash = ?;
+        """, params=(user_id, str(start), str(end), cfg_hash))
+    if done.empty:
+        return set()
+    have = read_sql(conn, """
+        SELECT symbol, session, YEAR(et_date) AS y, MONTH(et_date) AS m, COUNT(*) AS n
+        FROM dbo.bitcorr_daily_actions WITH (NOLOCK)
+        WHERE user_id = ? AND et_date BETWEEN ? AND ?
+        GROUP BY symbol, session, YEAR(et_date), MONTH(et_date);
+        """, params=(user_id, str(start), str(end)))
+    counts = {(r.symbol, r.session, int(r.y), int(r.m)): int(r.n) for r in have.itertuples(index=False)}
+    out = set()
+    for r in done.itertuples(index=False):
+        ds, de = pd.Timestamp(r.date_start).date(), pd.Timestamp(r.date_end).date()
+        if counts.get((r.symbol, r.session, ds.year, ds.month), 0) == int(r.expected_rows or 0):
+            out.add((r.symbol, r.session, ds, de))
+    return out
+
+def write_rows(cn, rows: pd.DataFrame, user_id: str, symbol: str, session: str, d0: date, d1: date,
+               batch_rows: int) -> int:
+    """Replace the job's rows: delete whatever a previous (partial) run left, then bulk insert."""
+    cur = cn.cursor()
+    cur.execute("DELETE FROM dbo.bitcorr_daily_actions WHERE user_id=? AND symbol=? AND session=? "
+                "AND et_date BETWEEN ? AND ?;", (user_id, symbol, session, str(d0), str(d1)))
+    if rows.empty:
+        cn.commit()
+        return 0
+    cur.fast_executemany = True
+    sql = (f"INSERT INTO dbo.bitcorr_daily_actions ({', '.join(ACTION_COLUMNS)}) "
+           f"VALUES ({', '.join('?' * len(ACTION_COLUMNS))});")
+    obj = rows.astype(object).where(rows.notna(), None)
+    obj["et_date"] = rows["et_date"].astype(str)
+    data = list(obj.itertuples(index=False, name=None))
+    for i in range(0, len(data), batch_rows):
+        cur.executemany(sql, data[i:i + batch_rows])
+    cn.commit()
+    return len(data)
+
+def log_run(cn, started, status, user_id, symbol, session, d0, d1, expected, existing, inserted, message=None,
+            cfg_hash=None):
+    cn.cursor().execute(
+        "INSERT INTO dbo.bitcorr_run_log (started_utc, ended_utc, status, user_id, symbol, session, date_start, "
+        "date_end, expected_rows, existing_rows, inserted_rows, message, config_hash) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        (started.replace(tzinfo=None), datetime.now(timezone.utc).replace(tzinfo=None), status, user_id, symbol,
+         session, str(d0), str(d1), expected, existing, inserted, (message or "")[:400], cfg_hash))
+    cn.commit()
+
+def count_rows(cn, user_id, symbol, session, d0, d1) -> int:
+    return int(cn.cursor().execute(
+        "SELECT COUNT(*) FROM dbo.bitcorr_daily_actions WHERE user_id=? AND symbol=? AND session=? "
+        "AND et_date BETWEEN ? AND ?;", (user_id, symbol, session, str(d0), str(d1))).fetchone()[0])
+
+# ---------------- CLI ----------------
+def parse_grid(spec: str) -> List[float]:
+    """'0.1:3.0:0.1' (inclusive range) or '0.5,1,1.5'."""
+    if ":" in spec:
+        lo, hi, step = (float(x) for x in spec.split(":"))
+        n = int(round((hi - lo) / step)) + 1
+        return [round(lo + i * step, 6) for i in range(max(n, 0))]
+    return [float(x) for x in spec.split(",") if x.strip()]
+
+def main():
+    ap = argparse.ArgumentParser(description="Build dbo.bitcorr_daily_actions from lab_price_history / lab_btc_history.")
+    ap.add_argument("--server", default=os.environ.get("DB_SERVER", r"LLDT\SQLEXPRESS"))
+    ap.add_argument("--database", default=os.environ.get("DB_NAME", "streamlit"))
+    ap.add_argument("--trusted", default="yes", choices=["yes", "no"])
+    ap.add_argument("--username")
+    ap.add_argument("--password")
+    ap.add_argument("--user-id", default=os.environ.get("WORKER_USER_ID", "default"))
+    ap.add_argument("--symbols", help="Comma-separated (default: every symbol in lab_price_history for the user)")
+    ap.add_argument("--start", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--end", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--sessions", default=",".join(SESSIONS))
+    ap.add_argument("--methods", default=",".join(BASELINE_METHODS))
+    ap.add_argument("--buys", default="0.1:3.0:0.1", help="Buy%% grid: lo:hi:step or a comma list")
+    ap.add_argument("--sells", default="0.1:3.0:0.1", help="Sell%% grid: lo:hi:step or a comma list")
+    ap.add_argument("--lookback", type=int, default=1, help="Previous trading days per baseline")
+    ap.add_argument("--capital", type=float, default=10000.0)
+    ap.add_argument("--cap-pct", type=int, default=0, help="Participation cap, %% of minute volume (0 = off)")
+    ap.add_argument("--default-horizon", type=int, default=10, choices=HORIZONS,
+                    help="Horizon mirrored into the legacy corr_pearson / corr_spearman / confidence columns")
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    ap.add_argument("--batch-rows", type=int, default=50000, help="Rows per executemany batch")
+    ap.add_argument("--force", action="store_true", help="Rebuild jobs the run log marks as done")
+    ap.add_argument("--no-feature-sync", action="store_true",
+                    help="Use dbo.bitcorr_regime_features as is (skip the incremental regime_store update)")
+    args = ap.parse_args()
+
+    conn = dict(server=args.server, database=args.database, trusted=(args.trusted == "yes"),
+                username=args.username, password=args.password)
+    start, end = pd.Timestamp(args.start).date(), pd.Timestamp(args.end).date()
+    cn = connect(conn)
+    cn.cursor().execute(SCHEMA_SQL)
+    cn.commit()
+
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    else:
+        symbols = read_sql(conn, "SELECT DISTINCT symbol FROM dbo.lab_price_history WHERE user_id = ? ORDER BY symbol;",
+                           params=(args.user_id,))["symbol"].astype(str).tolist()
+    cfg = dict(sessions=[s.strip().upper() for s in args.sessions.split(",") if s.strip()],
+               methods=[m.strip().upper() for m in args.methods.split(",") if m.strip()],
+               buys=parse_grid(args.buys), sells=parse_grid(args.sells), lookback=args.lookback,
+               capital=args.capital, cap_pct=args.cap_pct, default_horizon=args.default_horizon)
+
+    if not args.no_feature_sync:
+        n_feat = sync_features(conn, args.user_id, symbols, start=start, end=end)
+        print(f"Regime features: {n_feat:,} new row(s)")
+
+    cfg_hash = config_hash(cfg)
+    done = set() if args.force else completed_jobs(conn, args.user_id, start, end, cfg_hash)
+    jobs = []
+    for sym in symbols:
+        for d0, d1 in month_chunks(start, end):
+            if all((sym, s, d0, d1) in done for s in cfg["sessions"]):
+                continue
+            jobs.append(((sym, d0, d1), conn, args.user_id, cfg))
+    n_pairs = len(cfg["buys"]) * len(cfg["sells"])
+    print(f"{len(jobs)} symbol-month job(s) to build ({len(done)} session-month(s) already done), "
+          f"{len(cfg['methods'])} methods x {n_pairs} pairs, {args.workers} worker(s) ...")
+
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 and len(jobs) > 1 else None
+    results = pool.map(build_job, jobs) if pool else map(build_job, jobs)
+    total = 0
+    try:
+        for symbol, d0, d1, started, by_session, err in results:
+            for session in cfg["sessions"]:
+                if (symbol, session, d0, d1) in done:
+                    continue
+                if err:
+                    log_run(cn, started, "error", args.user_id, symbol, session, d0, d1, None, None, 0, err,
+                            cfg_hash=cfg_hash)
+                    print(f"  {symbol} {session} {d0}..{d1}: ERROR {err}")
+                    continue
+                rows = by_session.get(session, pd.DataFrame(columns=ACTION_COLUMNS))
+                # Not done under these settings: the stored rows (if any) may come from other settings or
+                # a partial run, even when their count matches, so they are always replaced
+                existing = count_rows(cn, args.user_id, symbol, session, d0, d1)
+                inserted = write_rows(cn, rows, args.user_id, symbol, session, d0, d1, args.batch_rows)
+                log_run(cn, started, "done", args.user_id, symbol, session, d0, d1, len(rows), existing, inserted,
+                        cfg_hash=cfg_hash)
+                total += inserted
+                print(f"  {symbol} {session} {d0}..{d1}: {len(rows):,} rows ({existing:,} existing, {inserted:,} inserted)")
+    finally:
+        if pool:
+            pool.shutdown()
+        cn.close()
+    print(f"Inserted {total:,} rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# disk_cache.py
+# Shared on-disk result cache for the Streamlit apps (no Streamlit import here).
+#
+# `st.cache_data` lives inside one server process and is lost on restart or "Clear caches".
+# `disk_cached` sits underneath it and keeps results in a SQLite key/value file that every
+# app (and every analyst) on the box reads and writes, with:
+#   - size-bounded LRU eviction (least recently read entries go first)
+#   - per-entry TTL
+#   - hit / miss counters per cached function
+#
+# Keys cover the decorated function's module source and the engine modules it calls
+# (ENGINE_MODULES), so editing any of them retires the old entries. Calls whose date arguments
+# reach today (a session that may still be trading) are kept for at most LIVE_TTL seconds.
+#
+# Environment:
+#   BASELINE_CACHE_BACKEND   disk (default) | none   ("none" = call straight through)
+#   BASELINE_CACHE_DIR       folder holding cache.sqlite (default: ~/.baseline_lab_cache)
+#   BASELINE_CACHE_MAX_MB    size bound for stored values (default 2048)
+#   BASELINE_CACHE_TTL       default TTL in seconds (default 86400)
+#   BASELINE_CACHE_LIVE_TTL  TTL for calls covering today (default 300)
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Bump to retire every stored entry (e.g. after a change outside the hashed sources)
+CACHE_VERSION = 1
+# Modules next to this file whose source is part of every key
+ENGINE_MODULES = ("baseline_engine", "jit_kernels", "grid_runner", "trade_log_sink")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    expires REAL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_access ON entries(last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class DiskCache:
+    """SQLite-backed key/value store shared by every process that opens the same file."""
+
+    def __init__(self, path: str, max_bytes: int, default_ttl: Optional[float] = None):
+        self.path = str(path)
+        self.max_bytes = int(max_bytes)
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as cn:
+            cn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread (Streamlit runs sessions on separate threads)
+        cn = getattr(self._local, "cn", None)
+        if cn is None:
+            cn = sqlite3.connect(self.path, timeout=30.0)
+            cn.execute("PRAGMA journal_mode=WAL")
+            cn.execute("PRAGMA synchronous=NORMAL")
+            self._local.cn = cn
+        return cn
+
+    def _count(self, cn: sqlite3.Connection, name: str, hit: bool):
+        col = "hits" if hit else "misses"
+        cn.execute(f"INSERT INTO counters(name, {col}) VALUES (?, 1) "
+                   f"ON CONFLICT(name) DO UPDATE SET {col} = {col} + 1", (name,))
+
+    def get(self, key: str, name: str = "") -> Tuple[bool, Any]:
+        now = time.time()
+        with self._conn() as cn:
+            row = cn.execute("SELECT value, expires FROM entries WHERE key=?", (key,)).fetchone()
+            if row is not None and row[1] is not None and row[1] < now:
+                cn.execute("DELETE FROM entries WHERE key=?", (key,))
+                row = None
+            if row is None:
+                self._count(cn, name, False)
+                return False, None
+            cn.execute("UPDATE entries SET last_access=? WHERE key=?", (now, key))
+            self._count(cn, name, True)
+        try:
+            return True, pickle.loads(row[0])
+        except Exception:
+            # Unreadable entry (e.g. pickled by an incompatible library version): treat as a miss
+            self.delete(key)
+            return False, None
+
+    def set(self, key: str, value: Any, name: str = "", ttl: Optional[float] = None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = (now + ttl) if ttl else None
+        with self._conn() as cn:
+            cn.execute("INSERT OR REPLACE INTO entries(key, name, value, size, created, expires, last_access) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)", (key, name, blob, len(blob), now, expires, now))
+            self._evict(cn, now)
+
+    def _evict(self, cn: sqlite3.Connection, now: float):
+        cn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (now,))
+        total = cn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least-recently-read entries until back under the bound
+        drop = []
+        for key, size in cn.execute("SELECT key, size FROM entries ORDER BY last_access ASC"):
+            drop.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        cn.executemany("DELETE FROM entries WHERE key=?", drop)
+
+    def delete(self, key: str):
+        with self._conn() as cn:
+            cn.execute("DELETE FROM entries WHERE key=?", (key,))
+
+    def clear(self, name: Optional[str] = None):
+        with self._conn() as cn:
+            if name is None:
+                cn.execute("DELETE FROM entries")
+                cn.execute("DELETE FROM counters")
+            else:
+                cn.execute("DELETE FROM entries WHERE name=?", (name,))
+                cn.execute("DELETE FROM counters WHERE name=?", (name,))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """{function name: {hits, misses, entries, bytes}}"""
+        out: Dict[str, Dict[str, int]] = {}
+        cn = self._conn()
+        for name, hits, misses in cn.execute("SELECT name, hits, misses FROM counters"):
+            out[name] = {"hits": hits, "misses": misses, "entries": 0, "bytes": 0}
+        for name, n, b in cn.execute("SELECT name, COUNT(*), SUM(size) FROM entries GROUP BY name"):
+            d = out.setdefault(name, {"hits": 0, "misses": 0, "entries": 0, "bytes": 0})
+            d["entries"], d["bytes"] = int(n), int(b or 0)
+        return out
+
+# ---------------- Default shared instance ----------------
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+def cache_enabled() -> bool:
+    return os.environ.get("BASELINE_CACHE_BACKEND", "disk").strip().lower() != "none"
+
+def get_cache() -> Optional[DiskCache]:
+    global _cache
+    if not cache_enabled():
+        return None
+    with _cache_lock:
+        if _cache is None:
+            folder = os.environ.get("BASELINE_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".baseline_lab_cache")
+            _cache = DiskCache(os.path.join(folder, "cache.sqlite"),
+                               max_bytes=int(float(os.environ.get("BASELINE_CACHE_MAX_MB", "2048")) * 1024 * 1024),
+                               default_ttl=float(os.environ.get("BASELINE_CACHE_TTL", "86400")))
+        return _cache
+
+def _arg_token(name: str, value: Any) -> Any:
+    # Same convention as st.cache_data: leading-underscore args are not hashed.
+    # Engines still contribute their URL so two databases never share entries.
+    if name.startswith("_"):
+        url = getattr(value, "url", None)
+        return str(url) if url is not None else None
+    return value
+
+def _file_digest(path: str) -> str:
+    try:
+        with open(path, "rb") as fh:
+            return hashlib.sha256(fh.read()).hexdigest()
+    except OSError:
+        return ""
+
+@functools.lru_cache(maxsize=1)
+def _engine_token() -> str:
+    here = os.path.dirname(os.path.abspath(__file__))
+    parts = [f"{m}:{_file_digest(os.path.join(here, m + '.py'))}" for m in ENGINE_MODULES]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def _code_token(fn: Callable) -> str:
+    """Hash of the function's whole module (its helpers included), the engine modules and CACHE_VERSION."""
+    try:
+        src = _file_digest(inspect.getsourcefile(fn) or "") or inspect.getsource(fn)
+    except (OSError, TypeError):
+        src = repr(fn.__code__.co_code)
+    return hashlib.sha256(f"{CACHE_VERSION}|{_engine_token()}|{src}".encode("utf-8")).hexdigest()[:16]
+
+def _live_ttl() -> float:
+    return float(os.environ.get("BASELINE_CACHE_LIVE_TTL", "300"))
+
+def _covers_today(values) -> bool:
+    """True when any date / datetime argument is today or later."""
+    today = date.today()
+    for v in values:
+        if isinstance(v, datetime):
+            v = v.date()
+        if isinstance(v, date) and v >= today:
+            return True
+    return False
+
+def disk_cached(ttl: Optional[float] = None, name: Optional[str] = None):
+    """
+    Decorator: persist results in the shared disk cache. Place it under @st.cache_data so the
+    in-process cache answers first and the disk cache is only consulted on a process miss.
+    The key covers the function name, the sources (see _code_token) and its bound arguments;
+    calls with a date argument of today or later expire after BASELINE_CACHE_LIVE_TTL seconds.
+    """
+    def deco(fn: Callable) -> Callable:
+        fname = name or fn.__name__
+        sig = inspect.signature(fn)
+        code = _code_token(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+            try:
+                bound = sig.bind(*args, **kwargs)
+                bound.apply_defaults()
+                parts = [(k, _arg_token(k, v)) for k, v in bound.arguments.items()]
+                key = fname + ":" + hashlib.sha256(pickle.dumps((code, parts), protocol=4)).hexdigest()
+            except Exception:
+                # Unpicklable arguments: no disk caching for this call
+                return fn(*args, **kwargs)
+            try:
+                hit, value = cache.get(key, fname)
+            except sqlite3.Error:
+                return fn(*args, **kwargs)
+            if hit:
+                return value
+            value = fn(*args, **kwargs)
+            use_ttl = ttl
+            if _covers_today(bound.arguments.values()):
+                base = cache.default_ttl if ttl is None else ttl
+                use_ttl = min(base, _live_ttl()) if base else _live_ttl()
+            try:
+                cache.set(key, value, fname, use_ttl)
+            except (sqlite3.Error, pickle.PicklingError, TypeError, AttributeError):
+                pass
+            return value
+
+        wrapper.disk_cache_name = fname
+        return wrapper
+    return deco
+
+def clear_disk_cache() -> bool:
+    """Drop every shared disk cache entry and counter; False when the cache is off or unavailable."""
+    cache = get_cache()
+    if cache is None:
+        return False
+    try:
+        cache.clear()
+    except sqlite3.Error:
+        return False
+    return True
+
+def cache_summary() -> str:
+    """One-line hit/miss summary for a sidebar caption."""
+    cache = get_cache()
+    if cache is None:
+        return "Disk cache: off"
+    try:
+        s = cache.stats()
+    except sqlite3.Error as e:
+        return f"Disk cache: unavailable ({e})"
+    hits = sum(v["hits"] for v in s.values())
+    misses = sum(v["misses"] for v in s.values())
+    mb = sum(v["bytes"] for v in s.values()) / (1024 * 1024)
+    rate = (100.0 * hits / (hits + misses)) if (hits + misses) else 0.0
+    return f"Disk cache: {hits} hits / {misses} misses ({rate:.0f}%) • {mb:.1f} MB of {cache.max_bytes / (1024 * 1024):.0f} MB"
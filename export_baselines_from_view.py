@@ -1,6 +1,11 @@
 
 import argparse
+import json
+import os
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -10,6 +15,12 @@ try:
 except Exception:
     pyodbc = None
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
 def winsorize(arr, lower=0.05, upper=0.95):
     a = np.asarray(arr, dtype=float)
     a = a[np.isfinite(a)]
@@ -41,6 +52,52 @@ def normalize_session_from_time(et_time_series):
     t = pd.to_datetime(et_time_series, errors="coerce").dt.time
     return np.where((pd.Series(t) >= rth_start) & (pd.Series(t) <= rth_end), "RTH", "AH")
 
+BASELINE_METHODS = ["EQUAL_MEAN", "MEDIAN", "VOL_WEIGHTED", "WINSORIZED", "VWAP_RATIO"]
+
+def _grouped_baselines(df, keys, out_cols):
+    """
+    All methods for every `keys` group at once (same values as winsorize / vol_weighted_ratio / vwap
+    applied group by group). Returns long rows: out_cols + method, baseline, samples.
+    """
+    cols = out_cols + ["method","baseline","samples"]
+    df = df.dropna(subset=keys)
+    if df.empty:
+        return pd.DataFrame(columns=cols)
+    g = df.groupby(keys, sort=True)
+    sums = g[["_w","_rw","_w_ok","_stk_pv","_stk_v","_btc_pv","_btc_v"]].sum()
+    n_ok = g["_r_fin"].count()
+    samples = g.size()
+    eq_mean = g["ratio"].mean()
+    med = g["ratio"].median()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_w = np.where((sums["_w"] > 0) & (n_ok > 0), sums["_rw"] / sums["_w_ok"], np.nan)
+
+        # 5/95 winsor: group quantiles of the finite ratios, clipped back per row
+        q = g["_r_fin"].quantile([0.05, 0.95]).unstack()
+        gid = g.ngroup().to_numpy()
+        lo = q[0.05].to_numpy()[gid]
+        hi = q[0.95].to_numpy()[gid]
+        clipped = pd.Series(np.clip(df["_r_fin"].to_numpy(), lo, hi), index=df.index)
+        win_m = clipped.groupby(gid, sort=True).mean().to_numpy()
+
+        stk_vwap = np.where(sums["_stk_v"] > 0, sums["_stk_pv"] / sums["_stk_v"], np.nan)
+        btc_vwap = np.where(sums["_btc_v"] > 0, sums["_btc_pv"] / sums["_btc_v"], np.nan)
+        vwr = np.where(np.isfinite(stk_vwap) & (stk_vwap != 0), btc_vwap / stk_vwap, np.nan)
+    vwr = np.where(np.isfinite(vwr), vwr, np.nan)
+
+    # Wide (group x method) -> long, keeping group order and the method order within each group
+    vals = np.column_stack([eq_mean.to_numpy(dtype=float), med.to_numpy(dtype=float),
+                            vol_w, win_m, vwr])
+    n_m = len(BASELINE_METHODS)
+    idx = samples.index.to_frame(index=False)
+    idx.columns = ["baseline_date" if k == "et_date" else k for k in keys]
+    out = idx.loc[idx.index.repeat(n_m)].reset_index(drop=True)
+    out["method"] = np.tile(BASELINE_METHODS, len(idx))
+    out["baseline"] = vals.reshape(-1)
+    out["samples"] = np.repeat(samples.to_numpy(), n_m)
+    return out[cols]
+
 def compute_baselines(df):
     need = ["symbol","et_date","et_time","stock_close","stock_volume","btc_close","btc_volume"]
     rename_map = {}
@@ -89,59 +146,39 @@ def compute_baselines(df):
     df["ratio"] = np.where(df[sc] > 0, df[bc] / df[sc], np.nan)
     df["hour"] = pd.to_datetime(df["et_time"].astype(str), errors="coerce").dt.hour
 
-    def agg_block(g):
-        r = g["ratio"].to_numpy(dtype=float)
-        vol = g[sv].to_numpy(dtype=float)  # weight by stock volume
-        eq_mean = float(np.nanmean(r)) if r.size else np.nan
-        med     = float(np.nanmedian(r)) if r.size else np.nan
-        vol_w   = vol_weighted_ratio(r, vol)
-        win_m   = winsorize(r, 0.05, 0.95)
-        btc_vwap = vwap(g[bc], g[bv])
-        stk_vwap = vwap(g[sc], g[sv])
-        vwr = (btc_vwap / stk_vwap) if (np.isfinite(stk_vwap) and stk_vwap != 0) else np.nan
-        rows = [
-            ("EQUAL_MEAN",   eq_mean, len(g)),
-            ("MEDIAN",       med,     len(g)),
-            ("VOL_WEIGHTED", vol_w,   len(g)),
-            ("WINSORIZED",   win_m,   len(g)),
-            ("VWAP_RATIO",   float(vwr) if np.isfinite(vwr) else np.nan, len(g)),
-        ]
-        return pd.DataFrame(rows, columns=["method","baseline","samples"])
-
-    frames = []
-    for (d, sym, sess), g in df.groupby(["et_date","symbol","session"], sort=True):
-        out = agg_block(g)
-        out.insert(0, "symbol", sym)
-        out.insert(0, "session", sess)
-        out.insert(0, "baseline_date", d)
-        frames.append(out)
-    daily = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
-        columns=["baseline_date","session","symbol","method","baseline","samples"]
-    )
-
-    frames_h = []
-    for (d, h, sym, sess), g in df.groupby(["et_date","hour","symbol","session"], sort=True):
-        out = agg_block(g)
-        out.insert(0, "symbol", sym)
-        out.insert(0, "session", sess)
-        out.insert(0, "hour", h)
-        out.insert(0, "baseline_date", d)
-        frames_h.append(out)
-    hourly = pd.concat(frames_h, ignore_index=True) if frames_h else pd.DataFrame(
-        columns=["baseline_date","hour","session","symbol","method","baseline","samples"]
-    )
+    # Per-row terms for every method; each group then reduces with plain grouped sums/quantiles
+    r = df["ratio"].to_numpy(dtype=float)
+    r_ok = np.isfinite(r)
+    vol = df[sv].to_numpy(dtype=float)  # weight by stock volume
+    w = np.where(np.isfinite(vol), vol, 0.0)
+    df["_r_fin"] = np.where(r_ok, r, np.nan)
+    df["_w"] = w
+    df["_rw"] = np.where(r_ok, r * w, 0.0)
+    df["_w_ok"] = np.where(r_ok, w, 0.0)
+    for tag, pc, vc in (("stk", sc, sv), ("btc", bc, bv)):
+        p = df[pc].to_numpy(dtype=float)
+        v = df[vc].to_numpy(dtype=float)
+        ok = np.isfinite(p) & np.isfinite(v) & (v > 0)
+        df[f"_{tag}_pv"] = np.where(ok, p * v, 0.0)
+        df[f"_{tag}_v"] = np.where(ok, v, 0.0)
+
+    daily = _grouped_baselines(df, ["et_date","symbol","session"],
+                               ["baseline_date","session","symbol"])
+    hourly = _grouped_baselines(df, ["et_date","hour","symbol","session"],
+                                ["baseline_date","hour","session","symbol"])
     return daily, hourly
 
+def _conn_str(server, database, trusted=True, username=None, password=None):
+    if trusted:
+        return f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
+    if not (username and password):
+        raise SystemExit("Provide --username and --password when --trusted no")
+    return f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
+
 def fetch_from_view(server, database, start, end, trusted=True, username=None, password=None):
     if pyodbc is None:
         raise SystemExit("pyodbc not installed. Install with: pip install pyodbc")
-    if trusted:
-        conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
-    else:
-        if not (username and password):
-            raise SystemExit("Provide --username and --password when --trusted no")
-        conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
-    cn = pyodbc.connect(conn_str)
+    cn = pyodbc.connect(_conn_str(server, database, trusted, username, password))
     sql = """
       SELECT *
       FROM [dbo].[Baseline_daily2]
@@ -151,32 +188,7 @@ def fetch_from_view(server, database, start, end, trusted=True, username=None, p
     cn.close()
     return df
 
-def main():
-    ap = argparse.ArgumentParser(description="Export baselines (daily & hourly) from dbo.Baseline_daily2 view.")
-    ap.add_argument("--server", default=r"LLDT\\SQLEXPRESS")
-    ap.add_argument("--database", default="streamlit")
-    ap.add_argument("--trusted", default="yes", choices=["yes","no"])
-    ap.add_argument("--username")
-    ap.add_argument("--password")
-    ap.add_argument("--start", required=True, help="YYYY-MM-DD")
-    ap.add_argument("--end", required=True, help="YYYY-MM-DD")
-    ap.add_argument("--outdir", help="Output directory (default: current folder)")
-    args = ap.parse_args()
-
-    trusted = (args.trusted.lower() == "yes")
-    outdir = Path(args.outdir) if args.outdir else Path.cwd()
-    outdir.mkdir(parents=True, exist_ok=True)
-
-    print("Fetching data from dbo.Baseline_daily2 ...")
-    df = fetch_from_view(
-        server=args.server, database=args.database,
-        start=args.start, end=args.end,
-        trusted=trusted, username=args.username, password=args.password
-    )
-    if df.empty:
-        print("No rows for given dates.")
-        sys.exit(0)
-
+def normalize_view_columns(df):
     # Map columns from the Baseline_daily2 view into expected names
     # Expected from the view:
     #   symbol, ts_utc, et_date, et_time, et_dow,
@@ -191,22 +203,205 @@ def main():
     if "n_trades" in df.columns and "stock_trades" not in df.columns: rename["n_trades"] = "stock_trades"
     if "btc_c" in df.columns: rename["btc_c"] = "btc_close"
     if "btc_v" in df.columns: rename["btc_v"] = "btc_volume"
+    return df.rename(columns=rename)
+
+def date_chunks(start, end, chunk_days):
+    """Split [start, end] into consecutive (lo, hi) date-string ranges of at most chunk_days days."""
+    d0 = pd.Timestamp(start).date(); d1 = pd.Timestamp(end).date()
+    step = timedelta(days=max(1, int(chunk_days)))
+    out = []
+    while d0 <= d1:
+        hi = min(d1, d0 + step - timedelta(days=1))
+        out.append((str(d0), str(hi)))
+        d0 = hi + timedelta(days=1)
+    return out
+
+def export_chunk(job):
+    """Worker: fetch one date range from the view and aggregate it. Groups are keyed by et_date,
+    so chunks never share a group and their outputs can simply be appended."""
+    (lo, hi), conn, marks = job
+    df = fetch_from_view(start=lo, end=hi, **conn)
+    if df.empty:
+        return lo, hi, None, None
+    daily, hourly = compute_baselines(normalize_view_columns(df))
+    if marks:
+        daily = after_watermarks(daily, marks)
+        hourly = after_watermarks(hourly, marks)
+    return lo, hi, daily, hourly
+
+# ---------------- Incremental watermarks ----------------
+STATE_FILE = "baseline_export_state.json"
+
+def _mark_key(symbol, session):
+    return f"{symbol}|{session}"
+
+def load_watermarks(outdir):
+    """Last exported et_date per symbol/session: from the state file, else rebuilt from baseline_daily2.csv."""
+    sp = outdir / STATE_FILE
+    if sp.exists():
+        return json.loads(sp.read_text()).get("last_date", {})
+    csv = outdir / "baseline_daily2.csv"
+    if not csv.exists():
+        return {}
+    prev = pd.read_csv(csv, usecols=["baseline_date","session","symbol"], dtype=str)
+    if prev.empty:
+        return {}
+    last = prev.groupby(["symbol","session"])["baseline_date"].max()
+    return {_mark_key(sym, sess): d for (sym, sess), d in last.items()}
+
+def save_watermarks(outdir, marks):
+    sp = outdir / STATE_FILE
+    tmp = sp.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"last_date": marks, "updated_utc": datetime.now(timezone.utc).isoformat(timespec="seconds")},
+                              indent=1, sort_keys=True))
+    tmp.replace(sp)
 
-    df = df.rename(columns=rename)
+def after_watermarks(frame, marks):
+    """Keep only rows newer than their symbol/session watermark (unseen pairs keep everything)."""
+    if frame is None or frame.empty:
+        return frame
+    keys = [_mark_key(a, b) for a, b in zip(frame["symbol"], frame["session"])]
+    wm = pd.Series([marks.get(k, "") for k in keys], index=frame.index)
+    return frame[frame["baseline_date"].astype(str) > wm].reset_index(drop=True)
+
+def advance_watermarks(marks, frame):
+    if frame is None or frame.empty:
+        return
+    last = frame.assign(baseline_date=frame["baseline_date"].astype(str)).groupby(["symbol","session"])["baseline_date"].max()
+    for (sym, sess), d in last.items():
+        k = _mark_key(sym, sess)
+        marks[k] = max(marks.get(k, ""), d)
+
+# ---------------- Outputs ----------------
+def write_partitioned(frame, root, tag):
+    """Write one chunk into a Parquet dataset partitioned by baseline_date (pyarrow optional)."""
+    if pq is None or frame is None or frame.empty:
+        return
+    t = frame.copy()
+    t["baseline_date"] = t["baseline_date"].astype(str)
+    pq.write_to_dataset(pa.Table.from_pandas(t, preserve_index=False), root_path=str(root),
+                        partition_cols=["baseline_date"],
+                        basename_template=f"part-{tag}-{{i}}.parquet")
+
+def append_csv(frame, path, first):
+    if frame is None or frame.empty:
+        return first
+    frame.to_csv(path, index=False, mode="w" if first else "a", header=first)
+    return False
+
+def main():
+    ap = argparse.ArgumentParser(description="Export baselines (daily & hourly) from dbo.Baseline_daily2 view.")
+    ap.add_argument("--server", default=r"LLDT\\SQLEXPRESS")
+    ap.add_argument("--database", default="streamlit")
+    ap.add_argument("--trusted", default="yes", choices=["yes","no"])
+    ap.add_argument("--username")
+    ap.add_argument("--password")
+    ap.add_argument("--start", help="YYYY-MM-DD (required unless --incremental already has a watermark)")
+    ap.add_argument("--end", help="YYYY-MM-DD (with --incremental: default and upper bound is yesterday)")
+    ap.add_argument("--outdir", help="Output directory (default: current folder)")
+    ap.add_argument("--chunk-days", type=int, default=7, help="Days pulled from the view per chunk (default 7)")
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                    help="Parallel chunk processes (1 = run inline)")
+    ap.add_argument("--parquet", default="yes", choices=["yes","no"],
+                    help="Also write Parquet datasets partitioned by baseline_date (needs pyarrow)")
+    ap.add_argument("--incremental", action="store_true",
+                    help=f"Only export dates after the last exported et_date per symbol/session ({STATE_FILE}) "
+                         "and append them to the existing outputs")
+    args = ap.parse_args()
 
-    daily, hourly = compute_baselines(df)
+    trusted = (args.trusted.lower() == "yes")
+    outdir = Path(args.outdir) if args.outdir else Path.cwd()
+    outdir.mkdir(parents=True, exist_ok=True)
+    if pyodbc is None:
+        raise SystemExit("pyodbc not installed. Install with: pip install pyodbc")
 
     p1 = outdir / "baseline_daily2.csv"
     p2 = outdir / "baseline_hourly.csv"
-    daily.to_csv(p1, index=False)
-    hourly.to_csv(p2, index=False)
+    pq1 = outdir / "baseline_daily2"
+    pq2 = outdir / "baseline_hourly"
+    use_parquet = args.parquet == "yes"
+    if use_parquet and pq is None:
+        print("pyarrow not installed; writing CSV only. Install with: pip install pyarrow")
+        use_parquet = False
+
+    marks = load_watermarks(outdir) if args.incremental else {}
+    if args.incremental:
+        # Today's session may still be trading: stop at yesterday so no partial day passes a watermark
+        last_complete = str(date.today() - timedelta(days=1))
+        end = min(args.end or last_complete, last_complete)
+        if marks:
+            # Pull from the day after the oldest watermark; newer pairs are trimmed per row in the workers
+            start = str(pd.Timestamp(min(marks.values())).date() + timedelta(days=1))
+            if args.start and args.start > start:
+                start = args.start
+        elif args.start:
+            start = args.start
+        else:
+            raise SystemExit("No watermark yet: run the first --incremental export with --start")
+        if start > end:
+            print(f"Up to date (last exported {max(marks.values())})." if marks else f"Nothing to export: {start} is after {end}.")
+            sys.exit(0)
+        print(f"Incremental: {len(marks)} symbol/session watermark(s), pulling {start}..{end}")
+    else:
+        if not (args.start and args.end):
+            raise SystemExit("--start and --end are required (or use --incremental)")
+        start, end = args.start, args.end
+        # The outputs are rewritten below, so the old watermarks no longer describe them
+        (outdir / STATE_FILE).unlink(missing_ok=True)
+        if use_parquet:
+            # Full export replaces the datasets, like the CSVs
+            for root in (pq1, pq2):
+                if root.exists():
+                    shutil.rmtree(root)
+
+    conn = dict(server=args.server, database=args.database, trusted=trusted,
+                username=args.username, password=args.password)
+    jobs = [(rng, conn, dict(marks)) for rng in date_chunks(start, end, args.chunk_days)]
+    run_tag = datetime.now().strftime("%Y%m%d%H%M%S")
+    print(f"Fetching dbo.Baseline_daily2 in {len(jobs)} chunk(s) of {args.chunk_days} day(s), {args.workers} worker(s) ...")
+
+    # map() yields in chunk order, so the CSVs stay sorted by date while chunks run in parallel;
+    # only one chunk's aggregates are held in this process at a time.
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 and len(jobs) > 1 else None
+    results = pool.map(export_chunk, jobs) if pool else map(export_chunk, jobs)
+    # Incremental runs append after the existing rows (watermarks guarantee the keys are new)
+    first_d = not (args.incremental and p1.exists())
+    first_h = not (args.incremental and p2.exists())
+    n_rows = 0
+    try:
+        for lo, hi, daily, hourly in results:
+            if daily is None or daily.empty:
+                print(f"  {lo}..{hi}: no rows")
+                continue
+            first_d = append_csv(daily, p1, first_d)
+            first_h = append_csv(hourly, p2, first_h)
+            if use_parquet:
+                write_partitioned(daily, pq1, f"{lo}-{run_tag}")
+                write_partitioned(hourly, pq2, f"{lo}-{run_tag}")
+            n_rows += len(daily)
+            # Saved per chunk (full exports too), so an interrupted run resumes after the last completed chunk
+            advance_watermarks(marks, daily)
+            save_watermarks(outdir, marks)
+            print(f"  {lo}..{hi}: {len(daily)} daily / {len(hourly)} hourly rows")
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if n_rows == 0:
+        print("No new rows." if args.incremental else "No rows for given dates.")
+        sys.exit(0)
 
     print("Saved:")
     print(" -", p1)
     print(" -", p2)
+    if use_parquet:
+        print(" -", pq1, "(Parquet, partitioned by baseline_date)")
+        print(" -", pq2, "(Parquet, partitioned by baseline_date)")
     print("\nExamples (PowerShell):")
     print(r'  python ".\export_baselines_from_view.py" --start 2025-09-25 --end 2025-10-17')
     print(r'  python ".\export_baselines_from_view.py" --server "LLDT\\SQLEXPRESS" --database "streamlit" --trusted yes --start 2025-10-01 --end 2025-10-17')
+    print(r'  python ".\export_baselines_from_view.py" --start 2025-01-01 --end 2025-10-17 --chunk-days 14 --workers 6')
+    print(r'  python ".\export_baselines_from_view.py" --incremental')
 
 if __name__ == "__main__":
     main()
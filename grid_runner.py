@@ -0,0 +1,822 @@
+# grid_runner.py
+# Threshold-grid scan for the Batch (Fast) tab, split from the SQL side so it can run in
+# worker processes (the Streamlit apps themselves cannot be imported by a worker).
+#
+#  - grid_inputs():  pack one symbol's prepared minutes and baselines into plain arrays/dicts
+#  - scan_grid():    the (method, buy, sell) scan -> results frame (+ trade log), pure NumPy
+#  - scan_grid_adaptive(): coarse-to-fine search of the same grid, optionally scored against it
+#  - scan_grid_topk(): only the top-K rows, dropping paths whose optimistic bound cannot reach them
+#  - scan_grid_sharded(): the same scan for one symbol split across processes over shared memory
+#  - iter_batch_parallel(): fan symbols out to a process pool and yield results as they finish
+#  - StopAt:            picklable should_stop (a wall-clock deadline) that worker processes can poll
+#
+# Trade logs (export_trades) are written as column batches into a TradeLogSink: in memory by
+# default, or streamed to one compressed file per symbol under trade_log_dir.
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from datetime import time as dtime
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from baseline_engine import (stock_vol_col, grid_pairs, pair_surge, simulate_grid_day, split_combos,
+                             simulate_split_grid_day)
+from trade_log_sink import TradeLogSink, column_array
+
+TRADE_LOG_COLUMNS = [
+    "symbol", "et_date", "et_time", "session", "action", "price", "ratio", "base",
+    "shares_traded", "buy_pct", "sell_pct", "method",
+    "buy_pct_rth", "sell_pct_rth", "buy_pct_ah", "sell_pct_ah",
+    "valuation_policy", "final_cash", "final_equity"
+]
+# Columns written by the (buy, sell) scan and by split mode
+PAIR_LOG_COLUMNS = [c for c in TRADE_LOG_COLUMNS if not c.endswith(("_rth", "_ah"))]
+SPLIT_LOG_COLUMNS = [
+    "symbol", "et_date", "et_time", "session", "action", "price", "ratio", "base", "shares_traded",
+    "buy_pct_rth", "sell_pct_rth", "buy_pct_ah", "sell_pct_ah", "method",
+    "valuation_policy", "final_cash", "final_equity"
+]
+
+# Split-mode combinations simulated together per chunk (progress / should_stop are checked between chunks)
+SPLIT_CHUNK = 4096
+# (buy, sell) pairs walked together while a trade log is written; only one block's events are held at a time
+PAIR_LOG_CHUNK = 1024
+
+def is_rth_time(t: dtime) -> bool:
+    return (t >= dtime(9, 30, 0)) and (t <= dtime(16, 0, 0))
+
+# ---------------- Inputs ----------------
+def grid_inputs(symbol: str, methods: Sequence[str], test_days: List,
+                curr_join_by_day: Dict, base_by_day_method: Optional[Dict] = None,
+                base_by_day_method_sess: Optional[Dict] = None) -> dict:
+    """
+    Everything scan_grid needs for one symbol, as NumPy arrays and dicts (cheap to pickle,
+    no DataFrames): per trigger day the price / volume / ratio / session arrays, the
+    et_date / et_time values used in trade logs and the last minute used for the MARK row.
+    """
+    days = {}
+    for d, cj in curr_join_by_day.items():
+        tms = cj["et_time"].to_numpy()
+        days[d] = {
+            "px": cj["stock_c"].to_numpy(float),
+            "vol": cj[stock_vol_col(cj)].to_numpy(float),
+            "R": (cj["ratio"] if "ratio" in cj.columns else (cj["btc_c"] / cj["stock_c"])).to_numpy(float),
+            "is_rth": (cj["is_rth"].to_numpy() if "is_rth" in cj.columns
+                       else np.array([1 if is_rth_time(x) else 0 for x in tms])),
+            "dates": cj["et_date"].to_numpy(),
+            "times": tms,
+            "last_px": float(cj.iloc[-1]["stock_c"]),
+            "last_date": cj.iloc[-1]["et_date"],
+            "last_time": cj.iloc[-1]["et_time"],
+        }
+    return {
+        "symbol": symbol,
+        "methods": list(methods),
+        "test_days": list(test_days),
+        "days": days,
+        "base": dict(base_by_day_method or {}),
+        "base_sess": dict(base_by_day_method_sess or {}),
+    }
+
+# ---------------- Scan ----------------
+def _strs(values) -> np.ndarray:
+    return np.array([str(v) for v in values], dtype=object)
+
+def _mark_rows(mark_date, mark_time, last_px_seen, shares: np.ndarray, cash: np.ndarray,
+               final_equity: np.ndarray) -> dict:
+    """Closing MARK rows (one per path) as log columns: position valued at the last minute seen."""
+    return {
+        "et_date": str(mark_date) if mark_date is not None else "",
+        "et_time": str(mark_time) if mark_time is not None else "",
+        "session": "MARK",
+        "action": "MARK",
+        "price": float(last_px_seen) if (last_px_seen == last_px_seen) else None,
+        "shares_traded": np.asarray(shares, dtype=np.int64),
+        "valuation_policy": "LAST_MINUTE",
+        "final_cash": np.array([round(float(c), 2) for c in cash]),
+        "final_equity": np.array([round(float(e), 2) for e in final_equity]),
+    }
+
+def _result_row(symbol, method, pcts: dict, n_trades, used_days, cash, shares, last_px_seen,
+                start_capital) -> Tuple[dict, float]:
+    final_equity = cash + (shares * (last_px_seen if np.isfinite(last_px_seen) else 0.0))
+    total_return = (final_equity / start_capital) - 1.0 if used_days > 0 else np.nan
+    row = {"symbol": symbol, "method": method}
+    row.update(pcts)
+    row.update({
+        "n_trades": int(n_trades),
+        "days_used": used_days,
+        "ending_shares": int(shares),
+        "final_cash": round(cash, 2),
+        "final_equity": round(final_equity, 2),
+        "total_return": total_return
+    })
+    return row, final_equity
+
+def _surge_cfg(surge: Optional[dict], buy_k: np.ndarray, start_capital: float) -> Optional[dict]:
+    # surge = {t1_mult, t1_bonus, t2_mult, t2_bonus, surge_cap_pct} as plain values; base budget = start capital
+    if not surge:
+        return None
+    return pair_surge(buy_k, float(start_capital), surge["t1_mult"], surge["t1_bonus"],
+                      surge["t2_mult"], surge["t2_bonus"], surge["surge_cap_pct"])
+
+def _scan_pairs(inputs: dict, method: str, buy_list: Sequence[float], sell_list: Sequence[float],
+                participation_cap_pct: int, start_capital: float, export_trades: bool,
+                results: List[dict], sink: Optional[TradeLogSink],
+                progress: Optional[Callable] = None, step0: int = 0, total: int = 0,
+                surge: Optional[dict] = None,
+                pairs: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+    """
+    One method over the whole (buy, sell) grid; appends result rows, and with export_trades writes
+    the method's trade log to sink in pair order (each pair's trades, then its MARK row).
+    pairs = (buy_k, sell_k) scans just those pairs instead of buy_list x sell_list.
+    With export_trades the pairs are walked PAIR_LOG_CHUNK at a time and each block's log is written
+    before the next starts, so the buffered events never cover more than one block.
+    """
+    symbol = inputs["symbol"]
+    days = inputs["days"]
+    # All (buy, sell) pairs advance together: minutes are walked once per method and day (and block)
+    if pairs is None:
+        buy_k, sell_k = grid_pairs(buy_list, sell_list)
+        n_sell = len(sell_list)
+        pcts = lambda k: (buy_list[k // n_sell], sell_list[k % n_sell])
+    else:
+        buy_k, sell_k = np.asarray(pairs[0], dtype=float), np.asarray(pairs[1], dtype=float)
+        pcts = lambda k: (float(buy_k[k]), float(sell_k[k]))
+    n_pairs = len(buy_k)
+    block = PAIR_LOG_CHUNK if export_trades else max(1, n_pairs)
+    n_blocks = max(1, math.ceil(n_pairs / block))
+    n_test = len(inputs["test_days"])
+
+    for bi in range(n_blocks):
+        a, z = bi * block, min(n_pairs, (bi + 1) * block)
+        bk, sk = buy_k[a:z], sell_k[a:z]
+        cash = np.full(len(bk), float(start_capital))
+        shares = np.zeros(len(bk))
+        total_trades = np.zeros(len(bk), dtype=np.int64)
+        day_logs: List[dict] = []
+        surge_cfg = _surge_cfg(surge, bk, start_capital)
+        used_days = 0
+        last_px_seen = np.nan
+        mark_date = None
+        mark_time = None
+
+        for j, d in enumerate(inputs["test_days"]):
+            step = step0 + (bi * n_test + j + 1) // n_blocks
+            base_val = inputs["base"].get((d, method), np.nan)
+            day = days.get(d)
+            if day is None or not np.isfinite(base_val):
+                continue
+            px, R = day["px"], day["R"]
+            events = simulate_grid_day(px, day["vol"], R, base_val, bk, sk,
+                                       cash, shares, total_trades,
+                                       participation_cap_pct=participation_cap_pct,
+                                       export_log=export_trades, surge=surge_cfg)
+            if events:
+                k_ev, i_ev, act_ev, qty_ev = (np.asarray(x) for x in zip(*events))
+                times_ev = day["times"][i_ev]
+                day_logs.append({
+                    "k": k_ev,
+                    "et_date": _strs(day["dates"][i_ev]),
+                    "et_time": _strs(times_ev),
+                    "session": np.array(["RTH" if is_rth_time(t) else "AH" for t in times_ev], dtype=object),
+                    "action": act_ev.astype(object),
+                    "price": px[i_ev],
+                    "ratio": R[i_ev],
+                    "base": np.full(len(k_ev), float(base_val)),
+                    "shares_traded": qty_ev.astype(np.int64),
+                })
+            used_days += 1
+            last_px_seen = day["last_px"]
+            mark_date = day["last_date"]
+            mark_time = day["last_time"]
+            if progress:
+                progress(symbol, step, total, method, None, None, d)
+
+        final_equity = np.zeros(len(bk))
+        for k in range(len(bk)):
+            b, s = pcts(a + k)
+            row, final_equity[k] = _result_row(symbol, method, {"buy_pct": b, "sell_pct": s}, total_trades[k],
+                                               used_days, float(cash[k]), float(shares[k]), last_px_seen,
+                                               start_capital)
+            results.append(row)
+        if export_trades:
+            marks = _mark_rows(mark_date, mark_time, last_px_seen, shares, cash, final_equity)
+            _write_pair_log(sink, symbol, method, bk, sk, day_logs, marks)
+
+def _write_pair_log(sink: TradeLogSink, symbol: str, method: str, buy_k: np.ndarray, sell_k: np.ndarray,
+                    day_logs: List[dict], marks: dict):
+    """One block of a method's trades (in day order) and MARK rows as one batch, reordered by pair with a stable sort."""
+    n_pairs = len(buy_k)
+    parts = day_logs + [dict(marks, k=np.arange(n_pairs))]
+    k_all = np.concatenate([part["k"] for part in parts])
+    order = np.argsort(k_all, kind="stable")  # within a pair: its trades, then its MARK row
+    cols = {c: np.concatenate([column_array(c, part.get(c), len(part["k"])) for part in parts])[order]
+            for c in PAIR_LOG_COLUMNS if c not in ("symbol", "method", "buy_pct", "sell_pct")}
+    k_all = k_all[order]
+    sink.append(len(k_all), symbol=symbol, method=method, buy_pct=buy_k[k_all], sell_pct=sell_k[k_all], **cols)
+
+def _used_days(inputs: dict, method: str, split_mode: bool) -> List:
+    """Days a method trades on, in scan order (days without a usable baseline are skipped)."""
+    days = inputs["days"]
+    if split_mode:
+        bs = inputs["base_sess"]
+        return [d for d in sorted(days)
+                if np.isfinite(bs.get((d, method, "RTH"), np.nan)) or np.isfinite(bs.get((d, method, "AH"), np.nan))]
+    return [d for d in inputs["test_days"] if d in days and np.isfinite(inputs["base"].get((d, method), np.nan))]
+
+def _scan_split(inputs: dict, method: str,
+                buy_list_rth: Sequence[float], sell_list_rth: Sequence[float],
+                buy_list_ah: Sequence[float], sell_list_ah: Sequence[float],
+                participation_cap_pct: int, start_capital: float, export_trades: bool,
+                results: List[dict], sink: Optional[TradeLogSink],
+                progress: Optional[Callable] = None, step0: int = 0, total: int = 0,
+                should_stop: Optional[Callable[[], bool]] = None) -> bool:
+    """
+    One method over the 4D (RTH buy, RTH sell, AH buy, AH sell) grid, SPLIT_CHUNK combinations
+    at a time: each chunk walks every day once with simulate_split_grid_day, then its rows are
+    appended and progress / should_stop are checked. Returns False if should_stop() ended the
+    sweep early (rows of the finished chunks are kept).
+    """
+    symbol = inputs["symbol"]
+    days = inputs["days"]
+    base_sess = inputs["base_sess"]
+    combos = split_combos(buy_list_rth, sell_list_rth, buy_list_ah, sell_list_ah)
+    used = _used_days(inputs, method, True)
+    # Per-day arrays (session flags as int64 for the kernels) are prepared once per method
+    day_args = [(days[d]["px"], days[d]["vol"], days[d]["R"], np.asarray(days[d]["is_rth"], dtype=np.int64),
+                 float(base_sess.get((d, method, "RTH"), np.nan)), float(base_sess.get((d, method, "AH"), np.nan)))
+                for d in used]
+    last = days[used[-1]] if used else None
+    last_px_seen = last["last_px"] if last else np.nan
+
+    for a in range(0, len(combos), SPLIT_CHUNK):
+        part = combos[a:a + SPLIT_CHUNK]
+        cash = np.full(len(part), float(start_capital))
+        shares = np.zeros(len(part))
+        total_trades = np.zeros(len(part), dtype=np.int64)
+        for px, vol, R, is_rth, br, ba in day_args:
+            simulate_split_grid_day(px, vol, R, is_rth, br, ba, part, cash, shares, total_trades,
+                                    participation_cap_pct=participation_cap_pct)
+        final_equity = np.zeros(len(part))
+        for k, (b_rth, s_rth, b_ah, s_ah) in enumerate(part.tolist()):
+            pcts = {"buy_pct_rth": b_rth, "sell_pct_rth": s_rth, "buy_pct_ah": b_ah, "sell_pct_ah": s_ah}
+            row, final_equity[k] = _result_row(symbol, method, pcts, total_trades[k], len(used),
+                                               float(cash[k]), float(shares[k]), last_px_seen, start_capital)
+            results.append(row)
+        if export_trades:
+            marks = _mark_rows(last["last_date"] if last else None, last["last_time"] if last else None,
+                               last_px_seen, shares, cash, final_equity)
+            sink.append(len(part), symbol=symbol, method=method, buy_pct_rth=part[:, 0], sell_pct_rth=part[:, 1],
+                        buy_pct_ah=part[:, 2], sell_pct_ah=part[:, 3], **marks)
+        if progress:
+            progress(symbol, step0 + a + len(part), total, method, None, None, None)
+        if should_stop and a + SPLIT_CHUNK < len(combos) and should_stop():
+            return False
+    return True
+
+def scan_grid(inputs: dict, participation_cap_pct: int,
+              buy_list: Sequence[float], sell_list: Sequence[float],
+              start_capital: float,
+              progress: Optional[Callable] = None,
+              export_trades: bool = False,
+              split_mode: bool = False,
+              buy_list_rth: Sequence[float] = None, sell_list_rth: Sequence[float] = None,
+              buy_list_ah: Sequence[float] = None, sell_list_ah: Sequence[float] = None,
+              shard_workers: int = 1,
+              should_stop: Optional[Callable[[], bool]] = None,
+              surge: Optional[dict] = None,
+              adaptive: Optional[dict] = None,
+              top_k: int = 0,
+              trade_log_dir: Optional[str] = None):
+    """
+    Scan thresholds for one prepared symbol. Same output as run_grid_for_symbol.
+    With export_trades the trade log comes back as a DataFrame, or, when trade_log_dir is set, is
+    streamed to <trade_log_dir>/<symbol>.parquet and its path (None when empty) is returned instead.
+    shard_workers > 1 splits the scan across processes (scan_grid_sharded) unless a trade log is requested.
+    should_stop() is polled between methods (and between split-mode chunks); when it returns True
+    the scan ends early and the results frame carries attrs["cancelled"] = True.
+    surge = {t1_mult, t1_bonus, t2_mult, t2_bonus, surge_cap_pct} sizes buys at start_capital + surge extra
+    (capped by cash) instead of all-in; it applies to the (buy, sell) grid, not split mode.
+    adaptive = {coarse_stride, top_k, budget, compare} runs scan_grid_adaptive instead of the full
+    (buy, sell) grid (no trade log; ignored in split mode).
+    top_k > 0 returns only the symbol's top_k rows, pruning paths early (scan_grid_topk).
+    """
+    if adaptive and not split_mode and not export_trades:
+        return scan_grid_adaptive(inputs, participation_cap_pct, buy_list, sell_list, start_capital,
+                                  progress=progress, should_stop=should_stop, surge=surge, **adaptive)
+    if top_k and int(top_k) > 0 and not split_mode and not export_trades:
+        return scan_grid_topk(inputs, participation_cap_pct, buy_list, sell_list, start_capital, int(top_k),
+                              progress=progress, should_stop=should_stop, surge=surge)
+    if int(shard_workers or 1) > 1 and not export_trades:
+        return scan_grid_sharded(inputs, participation_cap_pct, buy_list, sell_list, start_capital,
+                                 int(shard_workers), progress=progress, split_mode=split_mode,
+                                 buy_list_rth=buy_list_rth, sell_list_rth=sell_list_rth,
+                                 buy_list_ah=buy_list_ah, sell_list_ah=sell_list_ah,
+                                 should_stop=should_stop, surge=surge)
+    results: List[dict] = []
+    sink = None
+    if export_trades:
+        sink = TradeLogSink(SPLIT_LOG_COLUMNS if split_mode else PAIR_LOG_COLUMNS,
+                            path=(os.path.join(trade_log_dir, _file_stem(inputs["symbol"])) if trade_log_dir else None))
+    methods = inputs["methods"]
+    cancelled = False
+    if split_mode:
+        n_combos = len(buy_list_rth or []) * len(sell_list_rth or []) * len(buy_list_ah or []) * len(sell_list_ah or [])
+        total = len(methods) * n_combos
+    else:
+        total = len(methods) * len(inputs["test_days"])
+    for mi, method in enumerate(methods):
+        if not split_mode:
+            _scan_pairs(inputs, method, buy_list, sell_list, participation_cap_pct, start_capital,
+                        export_trades, results, sink,
+                        progress=progress, step0=mi * len(inputs["test_days"]), total=total, surge=surge)
+        elif not _scan_split(inputs, method, buy_list_rth, sell_list_rth, buy_list_ah, sell_list_ah,
+                             participation_cap_pct, start_capital, export_trades, results, sink,
+                             progress=progress, step0=mi * n_combos, total=total, should_stop=should_stop):
+            cancelled = True
+            break
+        if should_stop and mi + 1 < len(methods) and should_stop():
+            cancelled = True
+            break
+    return finish_grid(results, sink.close() if sink else None, export_trades, cancelled=cancelled)
+
+def _file_stem(symbol: str) -> str:
+    return "".join(ch if (ch.isalnum() or ch in "-_.") else "_" for ch in str(symbol)) or "symbol"
+
+def finish_grid(results: List[dict], trade_log, export_trades: bool, cancelled: bool = False):
+    res = pd.DataFrame(results)
+    if not res.empty:
+        sort_cols = ["symbol", "method", "total_return"]
+        res = res.sort_values(sort_cols, ascending=[True, True, False]).reset_index(drop=True)
+    if cancelled:
+        res.attrs["cancelled"] = True
+
+    if export_trades:
+        return res, trade_log
+
+    return res
+
+def empty_grid(export_trades: bool, trade_log_dir: Optional[str] = None):
+    if not export_trades:
+        return pd.DataFrame([])
+    return pd.DataFrame([]), (None if trade_log_dir else pd.DataFrame([]))
+
+# ---------------- Coarse-to-fine adaptive search ----------------
+def _coarse_index(n: int, stride: int) -> List[int]:
+    idx = list(range(0, n, stride))
+    if idx and idx[-1] != n - 1:
+        idx.append(n - 1)
+    return idx
+
+def _neighbours(cells: List[Tuple[int, int]], step: int, nB: int, nS: int) -> List[Tuple[int, int]]:
+    out = []
+    for b, s in cells:
+        for db in (-step, 0, step):
+            for ds in (-step, 0, step):
+                if 0 <= b + db < nB and 0 <= s + ds < nS:
+                    out.append((b + db, s + ds))
+    return out
+
+def _leaders(seen: Dict[Tuple[int, int], float], top_k: int) -> List[Tuple[int, int]]:
+    # Best total_return first; cells that never traded (NaN) last
+    return sorted(seen, key=lambda c: (not np.isfinite(seen[c]), -seen[c] if np.isfinite(seen[c]) else 0.0, c))[:top_k]
+
+def adaptive_quality(adaptive: pd.DataFrame, exhaustive: pd.DataFrame, top_k: int) -> List[dict]:
+    """Per (symbol, method): best return found vs the exhaustive best, and how many of the true top_k were found."""
+    out = []
+    if exhaustive.empty:
+        return out
+    for (sym, method), ex in exhaustive.groupby(["symbol", "method"], sort=True):
+        ad = adaptive[(adaptive["symbol"] == sym) & (adaptive["method"] == method)] if not adaptive.empty else adaptive
+        ex_top = ex.sort_values("total_return", ascending=False).head(top_k)
+        ad_top = ad.sort_values("total_return", ascending=False).head(top_k) if not ad.empty else ad
+        best_ex = float(ex_top["total_return"].iloc[0])
+        best_ad = float(ad_top["total_return"].iloc[0]) if not ad_top.empty else np.nan
+        keys_ex = set(zip(ex_top["buy_pct"], ex_top["sell_pct"]))
+        keys_ad = set(zip(ad_top["buy_pct"], ad_top["sell_pct"])) if not ad_top.empty else set()
+        out.append({
+            "symbol": sym,
+            "method": method,
+            "evaluated": int(len(ad)),
+            "grid_size": int(len(ex)),
+            "best_return_adaptive": best_ad,
+            "best_return_exhaustive": best_ex,
+            "regret": best_ex - best_ad if np.isfinite(best_ad) else np.nan,
+            "found_best": bool(np.isfinite(best_ad) and best_ad >= best_ex),
+            "topk_recall": len(keys_ex & keys_ad) / max(1, len(keys_ex)),
+        })
+    return out
+
+def scan_grid_adaptive(inputs: dict, participation_cap_pct: int,
+                       buy_list: Sequence[float], sell_list: Sequence[float],
+                       start_capital: float,
+                       coarse_stride: int = 4, top_k: int = 3, budget: int = 0,
+                       compare: bool = False,
+                       progress: Optional[Callable] = None,
+                       should_stop: Optional[Callable[[], bool]] = None,
+                       surge: Optional[dict] = None):
+    """
+    Coarse-to-fine search over buy_list x sell_list instead of the full grid, per method:
+      1. simulate every coarse_stride-th buy% / sell% (range ends included)
+      2. around each of the top_k cells simulate the neighbours at half the stride, down to the fine step
+      3. keep stepping around the top_k at the fine step until no unsimulated neighbour is left
+    budget caps the total number of (method, buy, sell) simulations for the symbol (0 = no cap); each
+    method gets an even share of what earlier methods left unused.
+    Returns the results frame of scan_grid for the simulated cells only, with
+    attrs["adaptive"] = {"evaluated", "full", "skipped", "quality"}; skipped lists the methods the
+    budget left no simulations for, quality (adaptive_quality rows) is filled when compare=True,
+    which also runs the exhaustive grid for reference.
+    """
+    symbol = inputs["symbol"]
+    methods = inputs["methods"]
+    nB, nS = len(buy_list), len(sell_list)
+    full = len(methods) * nB * nS
+    stride = max(1, int(coarse_stride))
+    top_k = max(1, int(top_k))
+    cap = int(budget) if budget and int(budget) > 0 else None
+    state = {"left": None, "evaluated": 0, "stopped": False}
+    total = min(full, cap) if cap is not None else full
+    results: List[dict] = []
+    skipped: List[str] = []
+
+    for mi, method in enumerate(methods):
+        seen: Dict[Tuple[int, int], float] = {}
+        if cap is not None:
+            # an even share of the budget still left, so the first methods cannot use all of it
+            state["left"] = (cap - state["evaluated"]) // (len(methods) - mi)
+            if state["left"] == 0 and not state["stopped"]:
+                skipped.append(method)
+
+        def run(cells: List[Tuple[int, int]]) -> int:
+            if state["stopped"]:
+                return 0
+            cells = [c for c in dict.fromkeys(cells) if c not in seen]
+            if state["left"] is not None:
+                cells = cells[:state["left"]]
+                state["left"] -= len(cells)
+            if not cells:
+                return 0
+            rows: List[dict] = []
+            bk = np.array([buy_list[b] for b, _ in cells], dtype=float)
+            sk = np.array([sell_list[s] for _, s in cells], dtype=float)
+            _scan_pairs(inputs, method, buy_list, sell_list, participation_cap_pct, start_capital, False,
+                        rows, None, surge=surge, pairs=(bk, sk))
+            for c, row in zip(cells, rows):
+                seen[c] = row["total_return"]
+            results.extend(rows)
+            state["evaluated"] += len(cells)
+            if progress:
+                progress(symbol, state["evaluated"], total, method, None, None, None)
+            if should_stop and should_stop():
+                state["stopped"] = True
+            return len(cells)
+
+        run([(b, s) for b in _coarse_index(nB, stride) for s in _coarse_index(nS, stride)])
+        step = stride
+        while step > 1:
+            step = max(1, step // 2)
+            run(_neighbours(_leaders(seen, top_k), step, nB, nS))
+        while run(_neighbours(_leaders(seen, top_k), 1, nB, nS)) > 0:
+            pass
+
+    res = finish_grid(results, None, False, cancelled=state["stopped"])
+    quality = []
+    if compare and not state["stopped"]:
+        exhaustive = scan_grid(inputs, participation_cap_pct, buy_list, sell_list, start_capital, surge=surge)
+        quality = adaptive_quality(res, exhaustive, top_k)
+    res.attrs["adaptive"] = {"evaluated": state["evaluated"], "full": full, "skipped": skipped, "quality": quality}
+    return res
+
+# ---------------- Top-K runs with upper-bound pruning ----------------
+def _growth_bounds(inputs: dict, used: List) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For each used day j: the last valid price so far and log of the largest factor any long-only
+    path can still grow by from there to the final mark (perfect foresight: every up-move of the
+    remaining minute prices, prod max(1, p[i+1] / p[i])).
+    """
+    days = inputs["days"]
+    prices, ends = [], []
+    n = 0
+    for d in used:
+        px = days[d]["px"]
+        with np.errstate(invalid="ignore"):
+            px = px[np.isfinite(px) & (px > 0)]
+        prices.append(px)
+        n += len(px)
+        ends.append(n - 1)
+    P = np.concatenate(prices) if prices else np.zeros(0)
+    step = np.log(np.maximum(1.0, P[1:] / P[:-1])) if len(P) > 1 else np.zeros(0)
+    # log_suffix[t] = sum of step[t:]; position len(P) - 1 (the final mark) has nothing left
+    log_suffix = np.zeros(len(P) + 1)
+    if len(step):
+        log_suffix[:len(step)] = np.cumsum(step[::-1])[::-1]
+    ends = np.asarray(ends, dtype=np.int64)
+    p_end = np.where(ends >= 0, P[np.maximum(ends, 0)] if len(P) else np.nan, np.nan)
+    return p_end, log_suffix[np.maximum(ends, 0)]
+
+def scan_grid_topk(inputs: dict, participation_cap_pct: int,
+                   buy_list: Sequence[float], sell_list: Sequence[float],
+                   start_capital: float, top_k: int,
+                   progress: Optional[Callable] = None,
+                   should_stop: Optional[Callable[[], bool]] = None,
+                   surge: Optional[dict] = None):
+    """
+    Only the top_k (method, buy, sell) rows of the symbol, by total_return (ties kept).
+    After every simulated day each path's equity times its growth bound (_growth_bounds) is an
+    optimistic final equity; paths whose bound is below the top_k-th final equity already
+    finished are dropped. A strided seed sample of each method's pairs runs first so the
+    threshold exists early. Because a path is only dropped when it provably cannot reach the
+    top_k, the rows returned are the same as the full grid's top_k.
+    attrs["topk"] = {k, paths, pruned, pair_days, pair_days_skipped}.
+    """
+    symbol = inputs["symbol"]
+    methods = inputs["methods"]
+    top_k = max(1, int(top_k))
+    buy_k, sell_k = grid_pairs(buy_list, sell_list)
+    n_sell = len(sell_list)
+    surge_all = _surge_cfg(surge, buy_k, start_capital)
+    stats = {"k": top_k, "paths": 0, "pruned": 0, "pair_days": 0, "pair_days_skipped": 0}
+    finals: List[float] = []
+    results: List[dict] = []
+    cancelled = False
+    n_seed = min(len(buy_k), max(4 * top_k, 16))
+    seed = np.unique(np.linspace(0, len(buy_k) - 1, n_seed).astype(np.int64)) if len(buy_k) else np.zeros(0, np.int64)
+    rest = np.setdiff1d(np.arange(len(buy_k)), seed)
+
+    for mi, method in enumerate(methods):
+        used = _used_days(inputs, method, False)
+        p_end, log_grow = _growth_bounds(inputs, used)
+        last_px_seen = inputs["days"][used[-1]]["last_px"] if used else np.nan
+        for group in (seed, rest):
+            if not len(group):
+                continue
+            alive = group.copy()
+            cash = np.full(len(alive), float(start_capital))
+            shares = np.zeros(len(alive))
+            trades = np.zeros(len(alive), dtype=np.int64)
+            for j, d in enumerate(used):
+                day = inputs["days"][d]
+                sg = None if surge_all is None else dict(surge_all, buy_idx=surge_all["buy_idx"][alive])
+                simulate_grid_day(day["px"], day["vol"], day["R"], inputs["base"][(d, method)],
+                                  buy_k[alive], sell_k[alive], cash, shares, trades,
+                                  participation_cap_pct=participation_cap_pct, surge=sg)
+                stats["pair_days"] += len(alive)
+                if j + 1 < len(used) and len(finals) >= top_k:
+                    thr = float(np.partition(np.asarray(finals), len(finals) - top_k)[len(finals) - top_k])
+                    if thr > 0:
+                        wealth = cash + shares * (p_end[j] if np.isfinite(p_end[j]) else 0.0)
+                        with np.errstate(divide="ignore"):
+                            keep = np.log(wealth) + log_grow[j] >= np.log(thr) - 1e-9
+                        if not keep.all():
+                            dropped = int((~keep).sum())
+                            stats["pruned"] += dropped
+                            stats["pair_days_skipped"] += dropped * (len(used) - 1 - j)
+                            alive, cash, shares, trades = alive[keep], cash[keep], shares[keep], trades[keep]
+                if not len(alive):
+                    break
+            for k in range(len(alive)):
+                row, final_equity = _result_row(symbol, method,
+                                                {"buy_pct": buy_list[alive[k] // n_sell],
+                                                 "sell_pct": sell_list[alive[k] % n_sell]},
+                                                trades[k], len(used), float(cash[k]), float(shares[k]),
+                                                last_px_seen, start_capital)
+                results.append(row)
+                # rows without data (no total_return) rank last, so they must not set the threshold
+                if np.isfinite(row["total_return"]):
+                    finals.append(final_equity)
+        stats["paths"] += len(buy_k)
+        if progress:
+            progress(symbol, mi + 1, len(methods), method, None, None, None)
+        if should_stop and mi + 1 < len(methods) and should_stop():
+            cancelled = True
+            break
+
+    res = pd.DataFrame(results)
+    if not res.empty:
+        res = res[res["total_return"].rank(ascending=False, method="min", na_option="bottom") <= top_k]
+    res = finish_grid(res.to_dict("records"), None, False, cancelled=cancelled)
+    res.attrs["topk"] = stats
+    return res
+
+# ---------------- Intra-symbol sharding over shared memory ----------------
+def _share(arr: np.ndarray) -> Tuple[SharedMemory, dict]:
+    shm = SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, {"name": shm.name, "shape": arr.shape, "dtype": arr.dtype.str}
+
+def _attach(spec: dict) -> Tuple[SharedMemory, np.ndarray]:
+    try:
+        shm = SharedMemory(name=spec["name"], track=False)  # Python 3.13+: the parent owns the segment
+    except TypeError:
+        shm = SharedMemory(name=spec["name"])
+    return shm, np.ndarray(spec["shape"], dtype=np.dtype(spec["dtype"]), buffer=shm.buf)
+
+def _share_inputs(inputs: dict, split_mode: bool) -> Tuple[List[SharedMemory], dict]:
+    """
+    Copy one symbol's minutes and baselines into two shared-memory blocks:
+      minutes  (4, n) float64  rows px / vol / R / is_rth, days concatenated in scan order
+      base     (methods, days) float64, or (methods, days, 2) [RTH, AH] in split mode
+    Day boundaries travel with the job as a small offsets array.
+    """
+    days = inputs["days"]
+    methods = inputs["methods"]
+    order = sorted(days) if split_mode else [d for d in inputs["test_days"] if d in days]
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    for j, d in enumerate(order):
+        offsets[j + 1] = offsets[j] + len(days[d]["px"])
+    minutes = np.empty((4, int(offsets[-1])))
+    for j, d in enumerate(order):
+        a, z = offsets[j], offsets[j + 1]
+        minutes[0, a:z] = days[d]["px"]
+        minutes[1, a:z] = days[d]["vol"]
+        minutes[2, a:z] = days[d]["R"]
+        minutes[3, a:z] = np.asarray(days[d]["is_rth"], dtype=float)
+    if split_mode:
+        base = np.array([[[inputs["base_sess"].get((d, m, sess), np.nan) for sess in ("RTH", "AH")]
+                          for d in order] for m in methods], dtype=float).reshape(len(methods), len(order), 2)
+    else:
+        base = np.array([[inputs["base"].get((d, m), np.nan) for d in order] for m in methods],
+                        dtype=float).reshape(len(methods), len(order))
+    shm_min, spec_min = _share(minutes)
+    shm_base, spec_base = _share(base)
+    return [shm_min, shm_base], {"minutes": spec_min, "base": spec_base, "offsets": offsets}
+
+def _run_shard(job: tuple) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Worker: attach to the shared blocks and run one slice of one method's grid over every day.
+    job = (shared, method_index, split_mode, pcts, start_capital, participation_cap_pct, surge) where pcts
+    is (buy_k, sell_k) for the 2D grid or an (n, 4) array of (b_rth, s_rth, b_ah, s_ah) in split mode,
+    and surge is the 2D grid's grid_surge(...) slice or None.
+    Returns per-combination (cash, shares, trades).
+    """
+    shared, mi, split_mode, pcts, start_capital, cap, surge = job
+    shm_min, minutes = _attach(shared["minutes"])
+    shm_base, base = _attach(shared["base"])
+    offsets = shared["offsets"]
+    try:
+        n = len(pcts) if split_mode else len(pcts[0])
+        cash = np.full(n, float(start_capital))
+        shares = np.zeros(n)
+        trades = np.zeros(n, dtype=np.int64)
+        for j in range(len(offsets) - 1):
+            a, z = offsets[j], offsets[j + 1]
+            px, vol, R = minutes[0, a:z], minutes[1, a:z], minutes[2, a:z]
+            if not split_mode:
+                if np.isfinite(base[mi, j]):
+                    simulate_grid_day(px, vol, R, float(base[mi, j]), pcts[0], pcts[1], cash, shares, trades,
+                                      participation_cap_pct=cap, surge=surge)
+                continue
+            simulate_split_grid_day(px, vol, R, minutes[3, a:z].astype(np.int64),
+                                    float(base[mi, j, 0]), float(base[mi, j, 1]), pcts, cash, shares, trades,
+                                    participation_cap_pct=cap)
+        return cash, shares, trades
+    finally:
+        # Views must go before the mapping can be closed
+        del minutes, base
+        shm_min.close()
+        shm_base.close()
+
+def scan_grid_sharded(inputs: dict, participation_cap_pct: int,
+                      buy_list: Sequence[float], sell_list: Sequence[float],
+                      start_capital: float, workers: int,
+                      progress: Optional[Callable] = None,
+                      split_mode: bool = False,
+                      buy_list_rth: Sequence[float] = None, sell_list_rth: Sequence[float] = None,
+                      buy_list_ah: Sequence[float] = None, sell_list_ah: Sequence[float] = None,
+                      should_stop: Optional[Callable[[], bool]] = None,
+                      surge: Optional[dict] = None):
+    """
+    scan_grid for one symbol with the (method, threshold) space split across `workers` processes.
+    Workers read the minutes and baselines from shared memory (nothing large is pickled) and
+    return per-combination state; rows are rebuilt here in scan_grid's order and schema.
+    No trade log: per-trade export is single-pair and runs through scan_grid.
+    If should_stop() turns true, slices not yet started are cancelled and only finished ones are reported.
+    """
+    symbol = inputs["symbol"]
+    methods = inputs["methods"]
+    workers = max(1, int(workers))
+    if split_mode:
+        combos = split_combos(buy_list_rth, sell_list_rth, buy_list_ah, sell_list_ah)
+        n_combos = len(combos)
+    else:
+        buy_k, sell_k = grid_pairs(buy_list, sell_list)
+        n_combos = len(buy_k)
+        surge_cfg = _surge_cfg(surge, buy_k, start_capital)
+    if not methods or n_combos == 0:
+        return finish_grid([], None, False)
+
+    # About two slices per worker overall, so a slow method does not leave processes idle
+    n_slices = max(1, min(n_combos, math.ceil(2 * workers / len(methods))))
+    bounds = np.linspace(0, n_combos, n_slices + 1).astype(int)
+    slices = [(a, z) for a, z in zip(bounds[:-1], bounds[1:]) if z > a]
+
+    blocks, shared = _share_inputs(inputs, split_mode)
+    try:
+        jobs = {}
+        for mi in range(len(methods)):
+            for si, (a, z) in enumerate(slices):
+                pcts = combos[a:z] if split_mode else (buy_k[a:z], sell_k[a:z])
+                surge_part = None
+                if not split_mode and surge_cfg is not None:
+                    surge_part = dict(surge_cfg, buy_idx=surge_cfg["buy_idx"][a:z])
+                jobs[(mi, si)] = (shared, mi, split_mode, pcts, float(start_capital), participation_cap_pct,
+                                  surge_part)
+        out = {}
+        cancelled = False
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futs = {pool.submit(_run_shard, job): key for key, job in jobs.items()}
+            for done, fut in enumerate(as_completed(futs), start=1):
+                key = futs[fut]
+                out[key] = fut.result()
+                if progress:
+                    progress(symbol, done, len(futs), methods[key[0]], None, None, f"shard {done}/{len(futs)}")
+                if should_stop and done < len(futs) and should_stop():
+                    cancelled = True
+                    for f in futs:
+                        f.cancel()
+                    break
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    results: List[dict] = []
+    n_sell = len(sell_list)
+    for mi, method in enumerate(methods):
+        used = _used_days(inputs, method, split_mode)
+        last_px_seen = inputs["days"][used[-1]]["last_px"] if used else np.nan
+        for si, (a, z) in enumerate(slices):
+            if (mi, si) not in out:
+                continue
+            cash, shares, trades = out[(mi, si)]
+            for k in range(a, z):
+                if split_mode:
+                    b_rth, s_rth, b_ah, s_ah = combos[k].tolist()
+                    pcts = {"buy_pct_rth": b_rth, "sell_pct_rth": s_rth, "buy_pct_ah": b_ah, "sell_pct_ah": s_ah}
+                else:
+                    pcts = {"buy_pct": buy_list[k // n_sell], "sell_pct": sell_list[k % n_sell]}
+                row, _ = _result_row(symbol, method, pcts, trades[k - a], len(used), float(cash[k - a]),
+                                     float(shares[k - a]), last_px_seen, start_capital)
+                results.append(row)
+    return finish_grid(results, None, False, cancelled=cancelled)
+
+# ---------------- Process-pool batch across symbols ----------------
+class StopAt:
+    """should_stop for scans in worker processes: true once time.time() passes deadline (picklable)."""
+
+    def __init__(self, deadline: float):
+        self.deadline = float(deadline)
+
+    def __call__(self) -> bool:
+        return time.time() > self.deadline
+
+def iter_batch_parallel(symbols: Sequence[str], prepare: Callable[[str], Optional[dict]],
+                        scan_kwargs: dict, workers: int,
+                        should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[str, object]]:
+    """
+    prepare(symbol) runs here (SQL, baselines) and returns grid_inputs(...) or None; the scans run
+    in a process pool while the next symbols are being prepared. Yields (symbol, scan_grid result)
+    as each symbol finishes, so callers can stream progress and partial tables.
+    At most 2 x workers prepared symbols are held at once.
+    Once should_stop() is true no more symbols are prepared and submitted scans that have not started
+    are cancelled; every symbol dropped that way is yielded as (symbol, None). Scans already running
+    finish, or stop early themselves when scan_kwargs carries a should_stop such as StopAt.
+    """
+    export_trades = bool(scan_kwargs.get("export_trades", False))
+    cap = 2 * max(1, int(workers))
+    queue = list(symbols)
+    with ProcessPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        pending = {}
+
+        def drain(block: bool):
+            if not pending:
+                return
+            # with should_stop, a blocked wait wakes up every second to poll it
+            timeout = (1.0 if should_stop else None) if block else 0
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield pending.pop(fut), fut.result()
+
+        while queue or pending:
+            if should_stop and should_stop():
+                for fut in [f for f in pending if f.cancel()]:
+                    yield pending.pop(fut), None
+                for sym in queue:
+                    yield sym, None
+                queue = []
+            if queue and len(pending) < cap:
+                sym = queue.pop(0)
+                inputs = prepare(sym)
+                if inputs is None:
+                    yield sym, empty_grid(export_trades, scan_kwargs.get("trade_log_dir"))
+                else:
+                    pending[pool.submit(scan_grid, inputs, **scan_kwargs)] = sym
+                yield from drain(block=False)
+            else:
+                yield from drain(block=True)
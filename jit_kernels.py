@@ -0,0 +1,276 @@
+# jit_kernels.py
+# Optional compiled versions of the simulation minute loops.
+#
+# If numba imports (and BASELINE_JIT is not "0"), the kernels below are JIT-compiled at first
+# call and cached on disk; HAVE_JIT tells callers to use them. Without numba the callers keep
+# their existing NumPy / Python paths, so the kernels are never the only implementation.
+# verify_jit_kernels.py checks every kernel against those paths for identical results.
+#
+# Kernels are plain numeric loops over float64 arrays. They repeat the Python code's operations
+# in the same order (including Python's min/max argument handling for NaN), so results are
+# bit-for-bit equal, not just close.
+
+import os
+
+import numpy as np
+
+HAVE_JIT = False
+if os.environ.get("BASELINE_JIT", "1").strip() != "0":
+    try:
+        from numba import njit
+        HAVE_JIT = True
+    except Exception:
+        HAVE_JIT = False
+
+if not HAVE_JIT:
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+@njit(cache=True)
+def _buy_qty(cash, p, v, cap_pct):
+    # floor(cash / p), capped at int(v * cap%) when a participation cap is set
+    qty = np.floor(cash / p)
+    if cap_pct > 0:
+        lim = float(int(v * (cap_pct / 100.0))) if np.isfinite(v) else 0.0
+        if lim < qty:
+            qty = lim
+    return qty
+
+@njit(cache=True)
+def day_kernel(px, vol, R, base_val, buy_pct, sell_pct, cash, shares, cap_pct):
+    """simulate_day_fast without the trade log -> (cash, shares, trades)."""
+    trades = 0
+    buy_thr = base_val * (1.0 + buy_pct / 100.0)
+    sell_thr = base_val * (1.0 - sell_pct / 100.0)
+    for i in range(px.shape[0]):
+        p = px[i]
+        r = R[i]
+        if not np.isfinite(p) or p <= 0 or not np.isfinite(r):
+            continue
+        if r >= buy_thr and shares <= 0 and cash > 0:
+            qty = _buy_qty(cash, p, vol[i], cap_pct)
+            if qty > 0:
+                cash -= qty * p
+                shares = qty
+                trades += 1
+        elif r <= sell_thr and shares > 0.0:
+            cash += shares * p
+            shares = 0.0
+            trades += 1
+    return cash, shares, trades
+
+@njit(cache=True)
+def grid_day_kernel(px, vol, R, base_val, buy_pcts, sell_pcts, cash, shares, trades, cap_pct):
+    """simulate_grid_day without the trade log: every pair's state arrays updated in place."""
+    for k in range(buy_pcts.shape[0]):
+        c, s, t = day_kernel(px, vol, R, base_val, buy_pcts[k], sell_pcts[k], cash[k], shares[k], cap_pct)
+        cash[k] = c
+        shares[k] = s
+        trades[k] += t
+
+@njit(cache=True)
+def grid_day_surge_kernel(px, vol, R, base_val, buy_pcts, sell_pcts, buy_idx, tiers, table, base_budget,
+                          cash, shares, trades, cap_pct):
+    """grid_day_kernel with surge sizing: a buy spends min(cash, base_budget + table[tier code])."""
+    for k in range(buy_pcts.shape[0]):
+        buy_thr = base_val * (1.0 + buy_pcts[k] / 100.0)
+        sell_thr = base_val * (1.0 - sell_pcts[k] / 100.0)
+        c = cash[k]
+        s = shares[k]
+        t = 0
+        for i in range(px.shape[0]):
+            p = px[i]
+            r = R[i]
+            if not np.isfinite(p) or p <= 0 or not np.isfinite(r):
+                continue
+            if r >= buy_thr and s <= 0 and c > 0:
+                target = base_budget + table[tiers[buy_idx[k], i]]
+                qty = _buy_qty(target if target < c else c, p, vol[i], cap_pct)
+                if qty > 0:
+                    c -= qty * p
+                    s = qty
+                    t += 1
+            elif r <= sell_thr and s > 0.0:
+                c += s * p
+                s = 0.0
+                t += 1
+        cash[k] = c
+        shares[k] = s
+        trades[k] += t
+
+@njit(cache=True)
+def isolated_grid_kernel(px, vol, R, day_starts, day_ends, base, buy_pcts, sell_pcts, start_capital, cap_pct,
+                         cash, shares, trades):
+    """simulate_isolated_days: day_kernel from a fresh wallet for every (day, method, pair) cell.
+    base is (days, methods); cells whose baseline is not finite keep the fresh wallet."""
+    for d in range(day_starts.shape[0]):
+        a = day_starts[d]
+        z = day_ends[d]
+        for m in range(base.shape[1]):
+            b = base[d, m]
+            if not np.isfinite(b):
+                continue
+            for k in range(buy_pcts.shape[0]):
+                c, s, t = day_kernel(px[a:z], vol[a:z], R[a:z], b, buy_pcts[k], sell_pcts[k],
+                                     start_capital, 0.0, cap_pct)
+                cash[d, m, k] = c
+                shares[d, m, k] = s
+                trades[d, m, k] = t
+
+@njit(cache=True)
+def split_day_kernel(px, vol, R, is_rth, base_rth, base_ah, b_rth, s_rth, b_ah, s_ah, cash, shares, cap_pct):
+    """One day of the split RTH/AH state machine (session-specific baselines and thresholds)."""
+    trades = 0
+    for i in range(px.shape[0]):
+        p = px[i]
+        r = R[i]
+        if not np.isfinite(p) or p <= 0 or not np.isfinite(r):
+            continue
+        if is_rth[i] == 1:
+            base = base_rth
+            bp = b_rth
+            sp = s_rth
+        else:
+            base = base_ah
+            bp = b_ah
+            sp = s_ah
+        if not np.isfinite(base):
+            continue
+        buy_thr = base * (1.0 + bp / 100.0)
+        sell_thr = base * (1.0 - sp / 100.0)
+        if r >= buy_thr and shares <= 0.0 and cash > 0.0:
+            qty = _buy_qty(cash, p, vol[i], cap_pct)
+            if qty > 0:
+                cash -= qty * p
+                shares += qty
+                trades += 1
+        elif r <= sell_thr and shares > 0.0:
+            cash += float(int(shares)) * p
+            shares = 0.0
+            trades += 1
+    return cash, shares, trades
+
+@njit(cache=True)
+def split_grid_day_kernel(px, vol, R, is_rth, base_rth, base_ah, combos, cash, shares, trades, cap_pct):
+    """simulate_split_grid_day: every (b_rth, s_rth, b_ah, s_ah) row's state updated in place."""
+    for k in range(combos.shape[0]):
+        c, s, t = split_day_kernel(px, vol, R, is_rth, base_rth, base_ah,
+                                   combos[k, 0], combos[k, 1], combos[k, 2], combos[k, 3],
+                                   cash[k], shares[k], cap_pct)
+        cash[k] = c
+        shares[k] = s
+        trades[k] += t
+
+@njit(cache=True)
+def _surge_extra(base_budget, ratio_now, baseline_ratio, buy_pct, t1_mult, t1_bonus, t2_mult, t2_bonus, cap_pct):
+    # surge_extra_on_base with enable=True
+    if not np.isfinite(baseline_ratio) or baseline_ratio <= 0 or buy_pct <= 0:
+        return 0.0
+    m = ((ratio_now / baseline_ratio) - 1.0) / (buy_pct / 100.0)
+    extra = 0.0
+    if m >= t1_mult:
+        extra += base_budget * (t1_bonus / 100.0)
+    if m >= t2_mult:
+        extra += base_budget * (t2_bonus / 100.0)
+    extra_cap = base_budget * (cap_pct / 100.0)
+    return extra_cap if extra_cap < extra else extra
+
+@njit(cache=True)
+def curve_grid_kernel(prices, ratios, baseline_minute, buy_pcts, sell_pcts, buy_idx, tiers, table,
+                      surge_on, init_cap, reinvest, cash, shares, trades):
+    """simulate_curve_grid: curve_kernel's continuous run for every pair, surge extra from tier codes."""
+    for k in range(buy_pcts.shape[0]):
+        buy_mult = 1.0 + buy_pcts[k] / 100.0
+        sell_mult = 1.0 - sell_pcts[k] / 100.0
+        c = cash[k]
+        s = shares[k]
+        t = 0
+        for i in range(prices.shape[0]):
+            base = baseline_minute[i]
+            if not np.isfinite(base):
+                continue
+            r = ratios[i]
+            if r >= base * buy_mult and s <= 0.0:
+                p = prices[i]
+                base_target = (c + s * p) if reinvest else init_cap
+                if surge_on:
+                    base_target = base_target + table[tiers[buy_idx[k], i]]
+                target_notional = base_target if base_target > 0.0 else 0.0
+                to_spend = target_notional - s * p
+                if not to_spend > 0.0:
+                    to_spend = 0.0
+                if to_spend > 0.0 and c > 0.0:
+                    budget = to_spend if to_spend < c else c
+                    qty = np.floor(budget / p)
+                    if qty > 0:
+                        c -= qty * p
+                        s += qty
+                        t += 1
+            elif r <= base * sell_mult and s > 0.0:
+                c += s * prices[i]
+                s = 0.0
+                t += 1
+        cash[k] = c
+        shares[k] = s
+        trades[k] += t
+
+@njit(cache=True)
+def curve_kernel(prices, ratios, baseline_minute, buy_trig, sell_trig, day_starts,
+                 init_cap, reinvest, surge_on, buy_pct,
+                 t1_mult, t1_bonus, t2_mult, t2_bonus, surge_cap, force_flat_eod):
+    """
+    Target-notional state machine of compute_daily_curve / the Threshold Grid tab.
+    day_starts holds the first minute of each day (use [0] for one continuous run).
+    Returns per-day (equity_start, equity_end, trades, buys, sells) and the final (cash, shares).
+    """
+    n_days = day_starts.shape[0]
+    eq_start = np.empty(n_days)
+    eq_end = np.empty(n_days)
+    n_tr = np.zeros(n_days, dtype=np.int64)
+    n_buy = np.zeros(n_days, dtype=np.int64)
+    n_sell = np.zeros(n_days, dtype=np.int64)
+    cash = init_cap
+    shares = 0.0
+    day_equity_start = init_cap
+    n = prices.shape[0]
+    for dd in range(n_days):
+        a = day_starts[dd]
+        z = day_starts[dd + 1] if dd + 1 < n_days else n
+        eq_start[dd] = day_equity_start
+        for i in range(a, z):
+            if buy_trig[i] and shares <= 0.0:
+                p = prices[i]
+                base_target = (cash + shares * p) if reinvest else init_cap
+                extra = 0.0
+                if surge_on:
+                    extra = _surge_extra(init_cap, ratios[i], baseline_minute[i], buy_pct,
+                                         t1_mult, t1_bonus, t2_mult, t2_bonus, surge_cap)
+                target_notional = base_target + extra
+                if not target_notional > 0.0:
+                    target_notional = 0.0
+                to_spend = target_notional - shares * p
+                if not to_spend > 0.0:
+                    to_spend = 0.0
+                if to_spend > 0.0 and cash > 0.0:
+                    budget = to_spend if to_spend < cash else cash
+                    qty = float(int(np.floor(budget / p)))
+                    if qty > 0:
+                        cash -= qty * p
+                        shares += qty
+                        n_tr[dd] += 1
+                        n_buy[dd] += 1
+            elif sell_trig[i] and shares > 0.0:
+                cash += shares * prices[i]
+                shares = 0.0
+                n_tr[dd] += 1
+                n_sell[dd] += 1
+        prev_price = prices[z - 1]
+        eq_end[dd] = cash + shares * prev_price
+        if force_flat_eod and shares > 0.0:
+            cash += shares * prev_price
+            shares = 0.0
+        day_equity_start = cash + shares * prev_price
+    return eq_start, eq_end, n_tr, n_buy, n_sell, cash, shares
@@ -0,0 +1,279 @@
+# regime_store.py
+# Per-day regime / liquidity feature store (dbo.bitcorr_regime_features).
+#
+# The BitCorr analyzers bin on btc_prev_ret, btc_prev_vol, btc_prev_range, btc_overnight_ret,
+# open_gap_z and liq_median / liq_p10 / liq_p90. They only depend on the minute history, so they
+# are computed once here, for every day and symbol in one vectorized pass over lab_btc_history
+# and lab_price_history (grouped reductions, no per-day loops), and stored one row per
+# (user_id, symbol, session, et_date). Builders join the table instead of recomputing them.
+#
+#  - BTC features come from the full 24h BTC history: the previous calendar day's return,
+#    1-minute log-return stdev and high-low range, and the move from the previous trading
+#    day's 16:00 close to today's 09:30 open
+#  - open_gap_z: the stock's RTH opening gap as a z-score against its previous GAP_Z_DAYS gaps
+#  - liq_*: median / 10th / 90th percentile of per-minute dollar volume for the session
+#
+# Updates are incremental: per symbol only the days in [start, end] that have minute history but no
+# stored features are computed (with enough earlier history fetched for the previous-day and
+# rolling-gap context). Each symbol's last stored day is always deleted and rewritten, so a day
+# stored while its session was still trading is completed on the next sync.
+#
+# Run:
+#   python regime_store.py --user-id default --start 2025-01-01
+#   python regime_store.py --user-id default            # fill gaps / catch up every symbol to today
+
+import argparse
+import os
+from datetime import date, timedelta, time as dtime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyodbc
+except Exception:
+    pyodbc = None
+
+FEATURE_COLUMNS = ["btc_prev_ret", "btc_prev_vol", "btc_prev_range", "btc_overnight_ret",
+                   "open_gap_z", "liq_median", "liq_p10", "liq_p90"]
+STORE_COLUMNS = ["user_id", "symbol", "session", "et_date"] + FEATURE_COLUMNS
+GAP_Z_DAYS = 20
+GAP_Z_MIN = 5
+CONTEXT_DAYS = 45  # calendar days fetched before the first new day (previous day + rolling gaps)
+RTH_OPEN, RTH_CLOSE = dtime(9, 30, 0), dtime(16, 0, 0)
+
+SCHEMA_SQL = r"""
+IF OBJECT_ID('dbo.bitcorr_regime_features','U') IS NULL
+BEGIN
+  CREATE TABLE dbo.bitcorr_regime_features (
+    user_id NVARCHAR(64) NOT NULL, symbol NVARCHAR(16) NOT NULL, session NVARCHAR(8) NOT NULL,
+    et_date DATE NOT NULL,
+    btc_prev_ret FLOAT NULL, btc_prev_vol FLOAT NULL, btc_prev_range FLOAT NULL, btc_overnight_ret FLOAT NULL,
+    open_gap_z FLOAT NULL, liq_median FLOAT NULL, liq_p10 FLOAT NULL, liq_p90 FLOAT NULL,
+    CONSTRAINT pk_bitcorr_regime_features PRIMARY KEY (user_id, symbol, session, et_date)
+  );
+END;
+"""
+
+# ---------------- Vectorized features ----------------
+def _times(s: pd.Series) -> pd.Series:
+    if len(s) and not isinstance(s.iloc[0], dtime):
+        s = pd.to_datetime(s.astype(str), errors="coerce").dt.time
+    return s
+
+def btc_day_features(btc: pd.DataFrame, trading_days: Sequence[date]) -> pd.DataFrame:
+    """
+    BTC features per trading day from minute rows (et_date as datetime.date, et_time, c) sorted by time.
+    Index = trading day; columns btc_prev_ret, btc_prev_vol, btc_prev_range, btc_overnight_ret.
+    """
+    cols = FEATURE_COLUMNS[:4]
+    days = pd.Index(sorted(set(trading_days)), name="et_date")
+    if btc.empty or not len(days):
+        return pd.DataFrame(index=days, columns=cols, dtype=float)
+    b = btc[["et_date", "et_time", "c"]].copy()
+    b["c"] = b["c"].astype(float)
+    b = b[np.isfinite(b["c"]) & (b["c"] > 0)]
+    b["et_time"] = _times(b["et_time"])
+    lc = np.log(b["c"].to_numpy())
+    new_day = np.r_[True, b["et_date"].to_numpy()[1:] != b["et_date"].to_numpy()[:-1]]
+    b["lr"] = np.where(new_day, np.nan, np.r_[np.nan, np.diff(lc)])
+
+    g = b.groupby("et_date", sort=True)
+    day = pd.DataFrame({"first": g["c"].first(), "last": g["c"].last(),
+                        "hi": g["c"].max(), "lo": g["c"].min(), "vol": g["lr"].std(ddof=0)})
+    # Previous calendar day (BTC trades every day)
+    prev = day.reindex([d - timedelta(days=1) for d in days])
+    out = pd.DataFrame(index=days)
+    out["btc_prev_ret"] = (prev["last"] / prev["first"] - 1.0).to_numpy()
+    out["btc_prev_vol"] = prev["vol"].to_numpy()
+    out["btc_prev_range"] = ((prev["hi"] - prev["lo"]) / prev["first"]).to_numpy()
+
+    # Previous trading day's 16:00 close -> today's 09:30 open
+    t = b["et_time"]
+    rth_open = b[t >= RTH_OPEN].groupby("et_date")["c"].first()
+    rth_close = b[t <= RTH_CLOSE].groupby("et_date")["c"].last()
+    o = rth_open.reindex(days).to_numpy(float)
+    c_prev = rth_close.reindex(days).shift(1).to_numpy(float)
+    out["btc_overnight_ret"] = o / c_prev - 1.0
+    return out[cols]
+
+def stock_day_features(px: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stock features from minute rows (symbol, et_date as datetime.date, et_time, c, v) sorted by
+    symbol and time, long format:
+    one row per (symbol, session, et_date) with open_gap_z, liq_median, liq_p10, liq_p90.
+    """
+    out_cols = ["symbol", "session", "et_date", "open_gap_z", "liq_median", "liq_p10", "liq_p90"]
+    if px.empty:
+        return pd.DataFrame(columns=out_cols)
+    s = px[["symbol", "et_date", "et_time", "c", "v"]].copy()
+    s["et_time"] = _times(s["et_time"])
+    s["c"] = s["c"].astype(float)
+    s["dv"] = s["c"] * s["v"].astype(float)
+    rth = (s["et_time"] >= RTH_OPEN) & (s["et_time"] <= RTH_CLOSE)
+    s["session"] = np.where(rth, "RTH", "AH")
+
+    # Opening gap vs the symbol's previous RTH close, z-scored on the previous gaps
+    g = s[rth & np.isfinite(s["c"])].groupby(["symbol", "et_date"], sort=True)["c"]
+    oc = pd.DataFrame({"open": g.first(), "close": g.last()}).reset_index()
+    oc["gap"] = oc["open"] / oc.groupby("symbol")["close"].shift(1) - 1.0
+    hist = oc.groupby("symbol")["gap"].shift(1)
+    roll = hist.groupby(oc["symbol"]).rolling(GAP_Z_DAYS, min_periods=GAP_Z_MIN)
+    mu = roll.mean().reset_index(level=0, drop=True)
+    sd = roll.std(ddof=0).reset_index(level=0, drop=True)
+    oc["open_gap_z"] = (oc["gap"] - mu) / sd.where(sd > 0)
+
+    # Session liquidity: quantiles of per-minute dollar volume
+    q = (s[np.isfinite(s["dv"])].groupby(["symbol", "session", "et_date"], sort=True)["dv"]
+         .quantile([0.5, 0.1, 0.9]).unstack())
+    q.columns = ["liq_median", "liq_p10", "liq_p90"]
+    out = q.reset_index().merge(oc[["symbol", "et_date", "open_gap_z"]], on=["symbol", "et_date"], how="left")
+    return out[out_cols]
+
+def build_features(btc: pd.DataFrame, px: pd.DataFrame) -> pd.DataFrame:
+    """All features for every (symbol, session, et_date) in px, as rows of STORE_COLUMNS minus user_id."""
+    st = stock_day_features(px)
+    if st.empty:
+        return pd.DataFrame(columns=STORE_COLUMNS[1:])
+    bf = btc_day_features(btc, st["et_date"].unique().tolist())
+    out = st.merge(bf, left_on="et_date", right_index=True, how="left")
+    return out[STORE_COLUMNS[1:]].sort_values(["symbol", "session", "et_date"]).reset_index(drop=True)
+
+# ---------------- SQL ----------------
+def _conn_str(server, database, trusted=True, username=None, password=None):
+    if trusted:
+        return f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
+    if not (username and password):
+        raise SystemExit("Provide --username and --password when --trusted no")
+    return f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
+
+def connect(conn: dict):
+    if pyodbc is None:
+        raise SystemExit("pyodbc not installed. Install with: pip install pyodbc")
+    return pyodbc.connect(_conn_str(**conn))
+
+def read_sql(conn: dict, sql: str, params=None) -> pd.DataFrame:
+    cn = connect(conn)
+    try:
+        return pd.read_sql(sql, cn, params=params)
+    finally:
+        cn.close()
+
+def watermarks(conn: dict, user_id: str) -> Dict[str, date]:
+    """Last stored et_date per symbol."""
+    wm = read_sql(conn, "SELECT symbol, MAX(et_date) AS d FROM dbo.bitcorr_regime_features WHERE user_id = ? "
+                        "GROUP BY symbol;", params=(user_id,))
+    return {str(r.symbol): pd.Timestamp(r.d).date() for r in wm.itertuples(index=False)}
+
+def _day_keys(conn: dict, table: str, user_id: str, symbols: Sequence[str], d0: date, d1: date) -> set:
+    """Distinct (symbol, et_date) of a table for the symbols between d0 and d1."""
+    df = read_sql(conn, f"""
+        SELECT DISTINCT symbol, et_date FROM {table} WITH (NOLOCK)
+        WHERE user_id = ? AND symbol IN ({",".join("?" * len(symbols))}) AND et_date BETWEEN ? AND ?;""",
+                  params=(user_id, *symbols, str(d0), str(d1)))
+    return set(zip(df["symbol"].astype(str), pd.to_datetime(df["et_date"]).dt.date))
+
+def sync(conn: dict, user_id: str, symbols: Optional[Sequence[str]] = None,
+         start: Optional[date] = None, end: Optional[date] = None, batch_rows: int = 50000) -> int:
+    """
+    Fill the store for `symbols` (default: every symbol the user has) between `start` (default: all
+    history) and `end` (default today): every day with minute history but no stored features is
+    computed, and each symbol's last stored day is rewritten. Returns rows written.
+    """
+    cn = connect(conn)
+    try:
+        cn.cursor().execute(SCHEMA_SQL)
+        cn.commit()
+        if symbols is None:
+            symbols = read_sql(conn, "SELECT DISTINCT symbol FROM dbo.lab_price_history WHERE user_id = ?;",
+                               params=(user_id,))["symbol"].astype(str).tolist()
+        symbols = list(symbols)
+        if not symbols:
+            return 0
+        end = end or date.today()
+        floor = start or date(1900, 1, 1)
+        if floor > end:
+            return 0
+        marks = watermarks(conn, user_id)
+        rewrite = {(s, marks[s]) for s in symbols if s in marks and floor <= marks[s] <= end}
+        source = _day_keys(conn, "dbo.lab_price_history", user_id, symbols, floor, end)
+        stored = _day_keys(conn, "dbo.bitcorr_regime_features", user_id, symbols, floor, end)
+        todo = (source - stored) | (rewrite & source)
+        if not todo:
+            return 0
+        todo_syms = sorted({s for s, _ in todo})
+        lo = min(d for _, d in todo)
+        fetch_lo = lo - timedelta(days=CONTEXT_DAYS)
+
+        marks_sql = ",".join("?" * len(todo_syms))
+        px = read_sql(conn, f"""
+            SELECT symbol, et_date, et_time, c, v FROM dbo.lab_price_history WITH (NOLOCK)
+            WHERE user_id = ? AND symbol IN ({marks_sql}) AND et_date BETWEEN ? AND ?
+            ORDER BY symbol, ts_utc;""", params=(user_id, *todo_syms, str(fetch_lo), str(end)))
+        if px.empty:
+            return 0
+        px["et_date"] = pd.to_datetime(px["et_date"]).dt.date
+        btc = read_sql(conn, """
+            SELECT et_date, et_time, c FROM dbo.lab_btc_history WITH (NOLOCK)
+            WHERE user_id = ? AND et_date BETWEEN ? AND ?
+            ORDER BY ts_utc;""", params=(user_id, str(fetch_lo - timedelta(days=1)), str(end)))
+        btc["et_date"] = pd.to_datetime(btc["et_date"]).dt.date
+
+        feats = build_features(btc, px)
+        keys = pd.Series(list(zip(feats["symbol"].astype(str), feats["et_date"])), index=feats.index)
+        new = feats[keys.isin(todo).to_numpy()]
+        if new.empty:
+            return 0
+        rows = new.assign(user_id=user_id)[STORE_COLUMNS]
+        obj = rows.astype(object).where(rows.notna(), None)
+        obj["et_date"] = rows["et_date"].astype(str)
+        data = list(obj.itertuples(index=False, name=None))
+        cur = cn.cursor()
+        cur.fast_executemany = True
+        # The rewritten days are replaced in the same transaction as the inserts
+        stale = [(user_id, s, str(d)) for s, d in sorted(rewrite & todo)]
+        if stale:
+            cur.executemany("DELETE FROM dbo.bitcorr_regime_features WHERE user_id = ? AND symbol = ? AND et_date = ?;",
+                            stale)
+        sql = (f"INSERT INTO dbo.bitcorr_regime_features ({', '.join(STORE_COLUMNS)}) "
+               f"VALUES ({', '.join('?' * len(STORE_COLUMNS))});")
+        for i in range(0, len(data), batch_rows):
+            cur.executemany(sql, data[i:i + batch_rows])
+        cn.commit()
+        return len(data)
+    finally:
+        cn.close()
+
+def load_features(conn: dict, user_id: str, symbol: str, d0: date, d1: date) -> pd.DataFrame:
+    """Stored features of one symbol, indexed by (session, et_date)."""
+    df = read_sql(conn, f"""
+        SELECT session, et_date, {', '.join(FEATURE_COLUMNS)} FROM dbo.bitcorr_regime_features WITH (NOLOCK)
+        WHERE user_id = ? AND symbol = ? AND et_date BETWEEN ? AND ?;""",
+                  params=(user_id, symbol, str(d0), str(d1)))
+    df["et_date"] = pd.to_datetime(df["et_date"]).dt.date
+    return df.set_index(["session", "et_date"]).sort_index()
+
+def main():
+    ap = argparse.ArgumentParser(description="Build / update dbo.bitcorr_regime_features from the minute history.")
+    ap.add_argument("--server", default=os.environ.get("DB_SERVER", r"LLDT\SQLEXPRESS"))
+    ap.add_argument("--database", default=os.environ.get("DB_NAME", "streamlit"))
+    ap.add_argument("--trusted", default="yes", choices=["yes", "no"])
+    ap.add_argument("--username")
+    ap.add_argument("--password")
+    ap.add_argument("--user-id", default=os.environ.get("WORKER_USER_ID", "default"))
+    ap.add_argument("--symbols", help="Comma-separated (default: every symbol in lab_price_history for the user)")
+    ap.add_argument("--start", help="YYYY-MM-DD, first day to fill (default: all history)")
+    ap.add_argument("--end", help="YYYY-MM-DD (default: today)")
+    args = ap.parse_args()
+    conn = dict(server=args.server, database=args.database, trusted=(args.trusted == "yes"),
+                username=args.username, password=args.password)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    n = sync(conn, args.user_id, symbols,
+             start=pd.Timestamp(args.start).date() if args.start else None,
+             end=pd.Timestamp(args.end).date() if args.end else None)
+    print(f"Wrote {n:,} feature rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# result_browser.py
+# Server-side paging over stored result files for the Streamlit apps (no Streamlit import here).
+#
+# Large leaderboards, trade logs and per-day winner tables are written once to a Parquet file
+# (gzip CSV without pyarrow). Each page request pushes the filters, the sort and LIMIT/OFFSET into
+# a local query engine over that file, so only the visible page is materialized and sent to the
+# browser instead of the whole frame.
+#
+#  - save_results():   write a result frame as the browser's backing file
+#  - column_profile(): per-column kind and filter domain (distinct values / min-max)
+#  - query_page():     (page frame, matching row count) for filters + sort + page
+#
+# Engines: duckdb (SQL over read_parquet / read_csv_auto) when installed, else pyarrow.dataset
+# (filters pushed into the scan), else pandas.
+#
+# Filters are (column, op, value) with op in: "in" (list), ">=", "<=", "contains" (case-insensitive).
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except Exception:
+    duckdb = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as pds
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pc = pds = pq = None
+
+# String columns with at most this many distinct values get a pick-list filter
+MAX_CHOICES = 200
+
+Filter = Tuple[str, str, object]
+
+def save_results(frame: pd.DataFrame, path: str) -> str:
+    """Write frame to path (.parquet, or .csv.gz without pyarrow) and return the path written."""
+    stem = str(path).rsplit(".parquet", 1)[0].rsplit(".csv.gz", 1)[0]
+    if pq is not None:
+        out = stem + ".parquet"
+        frame.reset_index(drop=True).to_parquet(out, index=False, compression="zstd")
+    else:
+        out = stem + ".csv.gz"
+        frame.to_csv(out, index=False, compression="gzip")
+    return out
+
+# ---------------- duckdb ----------------
+def _ident(col: str) -> str:
+    return '"' + str(col).replace('"', '""') + '"'
+
+def _source(path: str) -> str:
+    return "read_csv_auto(?)" if path.endswith(".csv.gz") else "read_parquet(?)"
+
+def _where(filters: Sequence[Filter]) -> Tuple[str, list]:
+    parts, params = [], []
+    for col, op, val in filters:
+        if op == "in":
+            vals = list(val)
+            if not vals:
+                parts.append("FALSE")
+                continue
+            parts.append(f"{_ident(col)} IN ({', '.join('?' for _ in vals)})")
+            params.extend(vals)
+        elif op in (">=", "<="):
+            parts.append(f"{_ident(col)} {op} ?")
+            params.append(val)
+        elif op == "contains":
+            parts.append(f"CAST({_ident(col)} AS VARCHAR) ILIKE ?")
+            params.append(f"%{val}%")
+        else:
+            raise ValueError(f"Unsupported filter op: {op}")
+    return (" WHERE " + " AND ".join(parts)) if parts else "", params
+
+def _duck_page(path, columns, filters, sort, ascending, offset, limit) -> Tuple[pd.DataFrame, int]:
+    where, params = _where(filters)
+    sel = ", ".join(_ident(c) for c in columns) if columns else "*"
+    order = f" ORDER BY {_ident(sort)} {'ASC' if ascending else 'DESC'} NULLS LAST" if sort else ""
+    with duckdb.connect() as cn:
+        total = cn.execute(f"SELECT COUNT(*) FROM {_source(path)}{where}", [path] + params).fetchone()[0]
+        page = cn.execute(f"SELECT {sel} FROM {_source(path)}{where}{order} LIMIT ? OFFSET ?",
+                          [path] + params + [int(limit), int(offset)]).df()
+    return page, int(total)
+
+# ---------------- pyarrow / pandas ----------------
+def _arrow_expr(filters: Sequence[Filter]):
+    expr = None
+    for col, op, val in filters:
+        f = pds.field(col)
+        if op == "in":
+            vals = list(val)
+            e = f.isin(vals) if vals else pds.scalar(False)
+        elif op == ">=":
+            e = f >= val
+        elif op == "<=":
+            e = f <= val
+        elif op == "contains":
+            e = pc.match_substring(f.cast(pa.string()), str(val), ignore_case=True)
+        else:
+            raise ValueError(f"Unsupported filter op: {op}")
+        expr = e if expr is None else (expr & e)
+    return expr
+
+def _arrow_page(path, columns, filters, sort, ascending, offset, limit) -> Tuple[pd.DataFrame, int]:
+    ds = pds.dataset(path, format="parquet")
+    expr = _arrow_expr(filters)
+    if not sort:
+        total = ds.count_rows(filter=expr)
+        return ds.head(offset + limit, columns=columns, filter=expr).slice(offset, limit).to_pandas(), int(total)
+    need = list(columns) if columns else None
+    if need is not None and sort not in need:
+        need = need + [sort]
+    t = ds.to_table(columns=need, filter=expr)
+    if t.num_rows:
+        # nulls sort last in either direction (pyarrow's default), as NULLS LAST does in duckdb
+        order = pc.sort_indices(t, sort_keys=[(sort, "ascending" if ascending else "descending")])
+        t = t.take(order.slice(offset, limit))
+    page = t.to_pandas()
+    return (page[list(columns)] if columns else page), int(ds.count_rows(filter=expr))
+
+def _pandas_mask(df: pd.DataFrame, filters: Sequence[Filter]) -> np.ndarray:
+    m = np.ones(len(df), dtype=bool)
+    for col, op, val in filters:
+        s = df[col]
+        if op == "in":
+            m &= s.isin(list(val)).to_numpy()
+        elif op == ">=":
+            m &= (s >= val).to_numpy()
+        elif op == "<=":
+            m &= (s <= val).to_numpy()
+        elif op == "contains":
+            m &= s.astype(str).str.contains(str(val), case=False, regex=False).to_numpy()
+        else:
+            raise ValueError(f"Unsupported filter op: {op}")
+    return m
+
+def _pandas_page(path, columns, filters, sort, ascending, offset, limit) -> Tuple[pd.DataFrame, int]:
+    df = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    df = df[_pandas_mask(df, filters)]
+    if sort:
+        df = df.sort_values(sort, ascending=ascending, na_position="last", kind="stable")
+    page = df.iloc[offset:offset + limit]
+    return (page[list(columns)] if columns else page).reset_index(drop=True), len(df)
+
+# ---------------- API ----------------
+def query_page(path: str, filters: Sequence[Filter] = (), sort: Optional[str] = None, ascending: bool = True,
+               page: int = 1, page_size: int = 100,
+               columns: Optional[Sequence[str]] = None) -> Tuple[pd.DataFrame, int]:
+    """Rows (page - 1) * page_size .. + page_size of the filtered, sorted file, and the filtered row count."""
+    offset = max(0, int(page) - 1) * int(page_size)
+    cols = list(columns) if columns else None
+    if duckdb is not None:
+        return _duck_page(path, cols, list(filters), sort, ascending, offset, int(page_size))
+    if pds is not None and path.endswith(".parquet"):
+        return _arrow_page(path, cols, list(filters), sort, ascending, offset, int(page_size))
+    return _pandas_page(path, cols, list(filters), sort, ascending, offset, int(page_size))
+
+def column_profile(path: str, columns: Optional[Sequence[str]] = None) -> Dict[str, dict]:
+    """
+    {column: {"kind": "number" | "text", "choices": [...] or None, "min": x, "max": y}} for the
+    filter widgets; text columns with more than MAX_CHOICES distinct values get a substring filter.
+    """
+    if duckdb is not None:
+        with duckdb.connect() as cn:
+            desc = cn.execute(f"DESCRIBE SELECT * FROM {_source(path)}", [path]).fetchall()
+            out = {}
+            for name, typ, *_ in desc:
+                if columns and name not in columns:
+                    continue
+                numeric = any(k in typ.upper() for k in ("INT", "DOUBLE", "FLOAT", "DECIMAL", "REAL"))
+                if numeric:
+                    lo, hi = cn.execute(f"SELECT MIN({_ident(name)}), MAX({_ident(name)}) FROM {_source(path)}",
+                                        [path]).fetchone()
+                    out[name] = {"kind": "number", "choices": None, "min": lo, "max": hi}
+                else:
+                    vals = [r[0] for r in cn.execute(
+                        f"SELECT DISTINCT {_ident(name)} FROM {_source(path)} WHERE {_ident(name)} IS NOT NULL "
+                        f"ORDER BY 1 LIMIT {MAX_CHOICES + 1}", [path]).fetchall()]
+                    out[name] = {"kind": "text", "choices": vals if len(vals) <= MAX_CHOICES else None,
+                                 "min": None, "max": None}
+            return out
+    if pq is not None and path.endswith(".parquet"):
+        t = pq.read_table(path, columns=list(columns) if columns else None)
+        df = None
+    else:
+        df = pd.read_csv(path, usecols=list(columns) if columns else None)
+        t = None
+    out = {}
+    for name in (t.column_names if t is not None else df.columns):
+        s = t.column(name).to_pandas() if t is not None else df[name]
+        if pd.api.types.is_numeric_dtype(s):
+            out[name] = {"kind": "number", "choices": None,
+                         "min": s.min() if s.notna().any() else None, "max": s.max() if s.notna().any() else None}
+        else:
+            vals = sorted(s.dropna().astype(str).unique().tolist())
+            out[name] = {"kind": "text", "choices": vals if len(vals) <= MAX_CHOICES else None,
+                         "min": None, "max": None}
+    return out
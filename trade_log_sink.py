@@ -0,0 +1,192 @@
+# trade_log_sink.py
+# Streaming per-trade log for the Batch (Fast) export (no Streamlit import here, so the scans in
+# grid_runner can write it from worker processes).
+#
+# Trades are buffered as typed column chunks (float64 / int64 / string arrays, no per-trade dicts)
+# and flushed every `chunk_rows` rows as one row group of a zstd-compressed Parquet file, so a large
+# export never holds more than one chunk in memory. Without pyarrow the same chunks are appended to
+# a gzip CSV instead. With path=None the chunks stay in memory and close() returns one DataFrame.
+#
+#  - TradeLogSink:       append(n, **columns) column batches, close() -> file path / DataFrame
+#  - merge_trade_logs(): concatenate per-symbol part files into the one file the download serves
+#                        (optionally removing the parts, so a run keeps one copy of its log)
+#  - trade_log_rows():   row count from the file footer (Parquet) or one streamed pass (CSV)
+#
+# Environment:
+#   BASELINE_TRADE_DIR   folder for per-run trade log files (default: <tmp>/baseline_lab_trades)
+
+import gzip
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
+# Column types of the trade log; columns not listed here are strings
+FLOAT_COLUMNS = {"price", "ratio", "base", "buy_pct", "sell_pct",
+                 "buy_pct_rth", "sell_pct_rth", "buy_pct_ah", "sell_pct_ah",
+                 "final_cash", "final_equity"}
+INT_COLUMNS = {"shares_traded"}
+
+CHUNK_ROWS = 65536
+
+def trade_log_ext() -> str:
+    return ".parquet" if pq is not None else ".csv.gz"
+
+def trade_log_dir(prefix: str = "batch_") -> str:
+    """A fresh folder for one export run under BASELINE_TRADE_DIR."""
+    root = Path(os.environ.get("BASELINE_TRADE_DIR") or Path(tempfile.gettempdir()) / "baseline_lab_trades")
+    root.mkdir(parents=True, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=str(root))
+
+def column_array(name: str, value, n: int) -> np.ndarray:
+    """One column of a batch as a typed array of length n (scalars are broadcast, None is missing)."""
+    if name in INT_COLUMNS:
+        return np.broadcast_to(np.asarray(value if value is not None else 0, dtype=np.int64), (n,))
+    if name in FLOAT_COLUMNS:
+        return np.broadcast_to(np.asarray(np.nan if value is None else value, dtype=np.float64), (n,))
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        return value
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return np.asarray(value, dtype=object)
+    out = np.empty(n, dtype=object)
+    out[:] = value
+    return out
+
+class TradeLogSink:
+    """
+    Column-chunk buffer for one trade log with a fixed column list.
+    append(n, col=array|scalar, ...) adds n rows; columns left out are missing (NaN / null).
+    Full chunks are flushed to `path` (Parquet row groups, or gzip CSV without pyarrow).
+    """
+
+    def __init__(self, columns: Sequence[str], path: Optional[str] = None, chunk_rows: int = CHUNK_ROWS):
+        self.columns = list(columns)
+        self.path = None
+        if path is not None:
+            stem = str(path)
+            for ext in (".parquet", ".csv.gz"):
+                if stem.endswith(ext):
+                    stem = stem[:-len(ext)]
+            self.path = stem + trade_log_ext()
+        self.chunk_rows = int(chunk_rows)
+        self.rows = 0
+        self._parts: Dict[str, List[np.ndarray]] = {c: [] for c in self.columns}
+        self._buffered = 0
+        self._frames: List[pd.DataFrame] = []
+        self._writer = None
+        self._csv_header = True
+
+    def append(self, n: int, **cols) -> None:
+        n = int(n)
+        if n <= 0:
+            return
+        for c in self.columns:
+            self._parts[c].append(column_array(c, cols.get(c), n))
+        self._buffered += n
+        self.rows += n
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def _chunk(self) -> pd.DataFrame:
+        data = {c: np.concatenate(self._parts[c]) for c in self.columns}
+        self._parts = {c: [] for c in self.columns}
+        self._buffered = 0
+        return pd.DataFrame(data, columns=self.columns)
+
+    def flush(self) -> None:
+        if self._buffered == 0:
+            return
+        chunk = self._chunk()
+        if self.path is None:
+            self._frames.append(chunk)
+        elif pq is not None:
+            table = pa.Table.from_pandas(chunk, schema=self._schema(), preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self._writer.write_table(table)
+        else:
+            with gzip.open(self.path, "wt" if self._csv_header else "at", newline="") as fh:
+                chunk.to_csv(fh, index=False, header=self._csv_header)
+            self._csv_header = False
+
+    def _schema(self):
+        return pa.schema([(c, pa.float64() if c in FLOAT_COLUMNS else pa.int64() if c in INT_COLUMNS
+                           else pa.string()) for c in self.columns])
+
+    def close(self) -> Union[pd.DataFrame, Optional[str]]:
+        """In memory: the whole log as one DataFrame. On disk: the file path (None when no rows)."""
+        self.flush()
+        if self.path is None:
+            if not self._frames:
+                return pd.DataFrame(columns=self.columns)
+            return pd.concat(self._frames, ignore_index=True) if len(self._frames) > 1 else self._frames[0]
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        return self.path if self.rows else None
+
+def merge_trade_logs(paths: Sequence[str], out_path: str, remove_parts: bool = False) -> Optional[str]:
+    """
+    Concatenate part files (same format, column sets may differ) into one file, a row group at a
+    time. Returns the merged path (extension follows the parts), or None when there are no parts.
+    remove_parts deletes the part files once the merged file is complete (a single part is moved).
+    """
+    paths = [p for p in paths if p]
+    if not paths:
+        return None
+    out_path = _merge_parts(paths, out_path, move=remove_parts and len(set(paths)) == 1)
+    if remove_parts:
+        for p in set(paths):
+            if os.path.abspath(p) != os.path.abspath(out_path) and os.path.exists(p):
+                os.remove(p)
+    return out_path
+
+def _merge_parts(paths: List[str], out_path: str, move: bool) -> str:
+    if paths[0].endswith(".csv.gz"):
+        out_path = str(out_path).rsplit(".parquet", 1)[0].rsplit(".csv.gz", 1)[0] + ".csv.gz"
+        cols: List[str] = []
+        for p in paths:
+            for c in pd.read_csv(p, nrows=0).columns:
+                if c not in cols:
+                    cols.append(c)
+        with gzip.open(out_path, "wt", newline="") as out:
+            header = True
+            for p in paths:
+                for chunk in pd.read_csv(p, chunksize=CHUNK_ROWS):
+                    chunk.reindex(columns=cols).to_csv(out, index=False, header=header)
+                    header = False
+        return out_path
+
+    out_path = str(out_path).rsplit(".csv.gz", 1)[0].rsplit(".parquet", 1)[0] + ".parquet"
+    if len(paths) == 1:
+        (shutil.move if move else shutil.copyfile)(paths[0], out_path)
+        return out_path
+    fields: Dict[str, object] = {}
+    for p in paths:
+        for f in pq.read_schema(p):
+            fields.setdefault(f.name, f.type)
+    schema = pa.schema(list(fields.items()))
+    with pq.ParquetWriter(out_path, schema, compression="zstd") as writer:
+        for p in paths:
+            pf = pq.ParquetFile(p)
+            for g in range(pf.num_row_groups):
+                t = pf.read_row_group(g)
+                cols = [t.column(f.name) if f.name in t.column_names else pa.nulls(t.num_rows, f.type)
+                        for f in schema]
+                writer.write_table(pa.Table.from_arrays(cols, schema=schema))
+    return out_path
+
+def trade_log_rows(path: str) -> int:
+    if path.endswith(".csv.gz"):
+        return sum(len(c) for c in pd.read_csv(path, chunksize=CHUNK_ROWS, usecols=[0]))
+    return pq.ParquetFile(path).metadata.num_rows
@@ -0,0 +1,71 @@
+"""
+Top-K pruning check for grid_runner.scan_grid_topk.
+
+Builds random minute days for one symbol and compares scan_grid_topk() with the full scan_grid()
+ranked by total_return: the (method, buy, sell) rows and their results must be identical. Every
+case runs a method with no baselines (its rows have no total_return) ahead of methods whose
+baselines are random, so many cases have only losing paths, which is where a threshold taken from rows
+without data would prune paths that belong in the top K.
+
+    python verify_grid_topk.py            # 300 random cases
+    python verify_grid_topk.py 1000       # more cases
+"""
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from grid_runner import grid_inputs, scan_grid, scan_grid_topk
+
+KEYS = ["method", "buy_pct", "sell_pct"]
+
+
+def random_inputs(rng, n_days=4, n_min=120):
+    days = [date(2025, 3, 3) + timedelta(days=i) for i in range(n_days)]
+    # the method without baselines runs first, so its rows are finished before any real path
+    methods = ["NO_DATA", "EQUAL_MEAN", "VWAP_RATIO"][:int(rng.integers(2, 4))]
+    cjs, base = {}, {}
+    px0 = rng.uniform(5, 15)
+    drift = rng.normal(-0.001, 0.001)  # mostly falling prices: often every traded path loses
+    for d in days:
+        px = px0 * np.exp(np.cumsum(rng.normal(drift, 0.004, n_min)))
+        btc = 60000.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n_min)))
+        times = [(pd.Timestamp("09:30") + pd.Timedelta(minutes=i)).time() for i in range(n_min)]
+        cjs[d] = pd.DataFrame({"et_date": d, "et_time": times, "stock_c": px, "btc_c": btc,
+                               "stock_v": rng.integers(100, 5000, n_min).astype(float)})
+        px0 = px[-1]
+        ratio = float(np.median(btc / px))
+        for m in methods:
+            if m != "NO_DATA":
+                base[(d, m)] = ratio * (1 + rng.normal(0, 0.01))
+    return grid_inputs("AAA", methods, days, cjs, base)
+
+
+def main():
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rng = np.random.default_rng(11)
+    fails = 0
+    t0 = time.time()
+    for n in range(cases):
+        inputs = random_inputs(rng)
+        buys = sorted(rng.choice([0.1, 0.2, 0.3, 0.5, 0.8, 1.0, 1.5], size=3, replace=False).tolist())
+        sells = sorted(rng.choice([0.1, 0.2, 0.4, 0.6, 1.0, 2.0], size=3, replace=False).tolist())
+        top_k = int(rng.integers(1, 6))
+        full = scan_grid(inputs, 0, buys, sells, 10000.0)
+        exp = full[full["total_return"].rank(ascending=False, method="min", na_option="bottom") <= top_k]
+        got = scan_grid_topk(inputs, 0, buys, sells, 10000.0, top_k)
+        exp = exp.dropna(subset=["total_return"]).sort_values(KEYS).reset_index(drop=True)
+        got = got.dropna(subset=["total_return"]).sort_values(KEYS).reset_index(drop=True)
+        cols = KEYS + ["n_trades", "days_used", "final_cash", "final_equity", "total_return"]
+        if len(exp) != len(got) or not exp[cols].equals(got[cols]):
+            fails += 1
+            print(f"case {n} ({'/'.join(inputs['methods'])}, k={top_k}): top-K {len(got)} rows, full grid {len(exp)}")
+    print(f"{cases} cases, {time.time() - t0:.1f}s")
+    print("PASS" if fails == 0 else f"FAIL: {fails} mismatches")
+    sys.exit(1 if fails else 0)
+
+
+if __name__ == "__main__":
+    main()
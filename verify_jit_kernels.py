@@ -0,0 +1,234 @@
+"""
+Identical-results check for jit_kernels.py.
+
+Runs every compiled kernel and its non-JIT counterpart on randomized minute data and
+requires exact equality (cash, shares and trade counts compared with ==, not a tolerance).
+Counterparts: baseline_engine's NumPy paths for the single-pair / grid / isolated-day simulators, and
+reference loops below copied from the app fallbacks for the split and curve state machines.
+
+    python verify_jit_kernels.py            # 300 random days per kernel
+    python verify_jit_kernels.py 2000       # more cases
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+import jit_kernels as jk
+from baseline_engine import (simulate_day_jump, simulate_grid_day, split_combos, simulate_split_grid_day,
+                             grid_surge, simulate_curve_grid, simulate_isolated_days)
+
+
+def random_day(rng, n):
+    px = rng.uniform(5, 15, n)
+    vol = rng.integers(0, 2000, n).astype(float)
+    R = 5000.0 * (1 + 0.02 * rng.standard_normal(n))
+    px[rng.random(n) < 0.02] = np.nan
+    R[rng.random(n) < 0.02] = np.nan
+    vol[rng.random(n) < 0.01] = 0.0
+    is_rth = (rng.random(n) < 0.6).astype(np.int64)
+    return px, vol, R, is_rth
+
+
+def split_reference(px, vol, R, sess_col, br, ba, b_rth, s_rth, b_ah, s_ah, cash, shares, cap_lim):
+    trades = 0
+    for i in range(len(px)):
+        p, v, r = px[i], vol[i], R[i]
+        if not np.isfinite(p) or p <= 0 or not np.isfinite(r):
+            continue
+        if sess_col[i] == 1:
+            base, bp, sp = br, b_rth, s_rth
+        else:
+            base, bp, sp = ba, b_ah, s_ah
+        if not np.isfinite(base):
+            continue
+        buy_thr = base * (1.0 + bp / 100.0)
+        sell_thr = base * (1.0 - sp / 100.0)
+        if r >= buy_thr and shares <= 0.0 and cash > 0.0:
+            qty = math.floor(cash / p)
+            if cap_lim and cap_lim > 0:
+                qty = min(qty, int(v * (cap_lim / 100.0)))
+            if qty > 0:
+                cash -= qty * p
+                shares += qty
+                trades += 1
+        elif r <= sell_thr and shares > 0.0:
+            qty = int(shares)
+            cash += qty * p
+            shares = 0.0
+            trades += 1
+    return cash, shares, trades
+
+
+def curve_reference(prices, ratios, base_min, buy_trig, sell_trig, day_starts, init_cap, reinvest,
+                    surge_on, buy_pct, t1_mult, t1_bonus, t2_mult, t2_bonus, surge_cap, force_flat):
+    def surge(ratio_now, baseline_ratio):
+        if (not surge_on) or not np.isfinite(baseline_ratio) or baseline_ratio <= 0 or buy_pct <= 0:
+            return 0.0
+        m = ((ratio_now / baseline_ratio) - 1.0) / (buy_pct / 100.0)
+        extra = 0.0
+        if m >= t1_mult:
+            extra += init_cap * (t1_bonus / 100.0)
+        if m >= t2_mult:
+            extra += init_cap * (t2_bonus / 100.0)
+        return min(extra, init_cap * (surge_cap / 100.0))
+
+    cash, shares, eq0 = init_cap, 0.0, init_cap
+    rows = []
+    bounds = list(day_starts) + [len(prices)]
+    for a, z in zip(bounds[:-1], bounds[1:]):
+        tr = buys = sells = 0
+        for i in range(a, z):
+            if buy_trig[i] and shares <= 0.0:
+                base_target = (cash + shares * prices[i]) if reinvest else init_cap
+                extra = surge(float(ratios[i]), float(base_min[i]))
+                target = max(0.0, base_target + (extra if surge_on else 0.0))
+                to_spend = max(0.0, target - shares * prices[i])
+                if to_spend > 0.0 and cash > 0.0:
+                    qty = int(math.floor(min(cash, to_spend) / prices[i]))
+                    if qty > 0:
+                        cash -= qty * prices[i]
+                        shares += qty
+                        tr += 1
+                        buys += 1
+            elif sell_trig[i] and shares > 0.0:
+                cash += shares * prices[i]
+                shares = 0.0
+                tr += 1
+                sells += 1
+        prev = prices[z - 1]
+        rows.append((eq0, cash + shares * prev, tr, buys, sells))
+        if force_flat and shares > 0.0:
+            cash += shares * prev
+            shares = 0.0
+        eq0 = cash + shares * prev
+    return rows, cash, shares
+
+
+def main():
+    n_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    if not jk.HAVE_JIT:
+        print("numba not available (or BASELINE_JIT=0): kernels run as plain Python; checking logic only.")
+    rng = np.random.default_rng(7)
+    fails = 0
+
+    t0 = time.time()
+    for _ in range(n_cases):
+        px, vol, R, is_rth = random_day(rng, int(rng.integers(1, 900)))
+        base = float(np.nanmedian(R)) * (1 + 0.005 * rng.standard_normal())
+        b, s = float(rng.choice([0.0, 0.3, 1.0, 2.0])), float(rng.choice([0.0, 0.5, 1.5]))
+        cap_pct = float(rng.choice([0, 1, 10]))
+        cash0, sh0 = float(rng.choice([0.0, 900.0, 10000.0])), float(rng.choice([0.0, 0.0, 25.0]))
+
+        # single pair
+        exp = simulate_day_jump(px, vol, R, base, b, s, cash0, sh0, participation_cap_pct=int(cap_pct))[:3]
+        got = jk.day_kernel(px, vol, R, base, b, s, cash0, sh0, cap_pct)
+        if tuple(exp) != (got[0], got[1], int(got[2])):
+            fails += 1
+            print("day_kernel mismatch", exp, got)
+
+        # all pairs
+        bk = np.repeat([0.2, 0.5, 1.0, 2.0], 3)
+        sk = np.tile([0.3, 1.0, 2.5], 4)
+        st_np = (np.full(12, cash0), np.full(12, sh0), np.zeros(12, dtype=np.int64))
+        st_jit = tuple(a.copy() for a in st_np)
+        simulate_grid_day(px, vol, R, base, bk, sk, *st_np, participation_cap_pct=int(cap_pct), export_log=True)
+        jk.grid_day_kernel(px, vol, R, base, bk, sk, *st_jit, cap_pct)
+        if not all(np.array_equal(a, z) for a, z in zip(st_np, st_jit)):
+            fails += 1
+            print("grid_day_kernel mismatch")
+
+        # all pairs with surge sizing (NumPy path via export_log vs kernel)
+        sg = grid_surge([0.2, 0.5, 1.0, 2.0], [0.3, 1.0, 2.5], 2000.0, 0.3, 10.0, 0.6, 25.0, 30.0)
+        st_np = (np.full(12, cash0), np.full(12, sh0), np.zeros(12, dtype=np.int64))
+        st_jit = tuple(a.copy() for a in st_np)
+        simulate_grid_day(px, vol, R, base, bk, sk, *st_np, participation_cap_pct=int(cap_pct), export_log=True, surge=sg)
+        simulate_grid_day(px, vol, R, base, bk, sk, *st_jit, participation_cap_pct=int(cap_pct), surge=sg)
+        if not all(np.array_equal(a, z) for a, z in zip(st_np, st_jit)):
+            fails += 1
+            print("grid_day_surge_kernel mismatch")
+
+        # isolated days: the day split into pieces, every (piece, method, pair) from a fresh wallet
+        cuts = np.unique(np.r_[0, np.sort(rng.integers(1, max(len(px), 2), int(rng.integers(0, 4))))]).astype(np.int64)
+        cuts = cuts[cuts < len(px)]
+        bases = base * (1 + 0.003 * rng.standard_normal((len(cuts), 2)))
+        bases[rng.random(bases.shape) < 0.15] = np.nan
+        iso = simulate_isolated_days(px, vol, R, cuts, bases, bk, sk, cash0 or 1000.0, participation_cap_pct=int(cap_pct))
+        bounds = list(cuts) + [len(px)]
+        for d in range(len(cuts)):
+            a, z = bounds[d], bounds[d + 1]
+            for m in range(2):
+                for k in range(len(bk)):
+                    if np.isfinite(bases[d, m]):
+                        exp = simulate_day_jump(px[a:z], vol[a:z], R[a:z], bases[d, m], bk[k], sk[k], cash0 or 1000.0, 0.0,
+                                                participation_cap_pct=int(cap_pct))[:3]
+                    else:
+                        exp = (cash0 or 1000.0, 0.0, 0)
+                    if tuple(exp) != (iso[0][d, m, k], iso[1][d, m, k], int(iso[2][d, m, k])):
+                        fails += 1
+                        print("simulate_isolated_days mismatch", exp, (iso[0][d, m, k], iso[1][d, m, k], iso[2][d, m, k]))
+
+        # split RTH/AH
+        br = base if rng.random() > 0.1 else np.nan
+        ba = base * (1 + 0.01 * rng.standard_normal()) if rng.random() > 0.1 else np.nan
+        args = (br, ba, b, s, float(rng.choice([0.5, 1.0])), float(rng.choice([0.5, 2.0])), cash0, sh0)
+        exp = split_reference(px, vol, R, is_rth, *args, cap_pct)
+        got = jk.split_day_kernel(px, vol, R, is_rth, *args, cap_pct)
+        if tuple(exp) != (got[0], got[1], int(got[2])):
+            fails += 1
+            print("split_day_kernel mismatch", exp, got)
+
+        # split RTH/AH, every combination at once (kernel with JIT, NumPy path without)
+        combos = split_combos([0.5, 1.0], [0.5, 2.0], [0.3, 1.0], [0.4, 1.5])
+        st_grid = (np.full(len(combos), cash0), np.full(len(combos), sh0), np.zeros(len(combos), dtype=np.int64))
+        simulate_split_grid_day(px, vol, R, is_rth, br, ba, combos, *st_grid, participation_cap_pct=int(cap_pct))
+        exp = [split_reference(px, vol, R, is_rth, br, ba, *c, cash0, sh0, cap_pct) for c in combos.tolist()]
+        if not (np.isfinite(br) or np.isfinite(ba)):
+            exp = [(cash0, sh0, 0)] * len(combos)
+        if exp != list(zip(st_grid[0].tolist(), st_grid[1].tolist(), st_grid[2].tolist())):
+            fails += 1
+            print("simulate_split_grid_day mismatch")
+
+        # daily curve / threshold grid tab
+        n = len(px)
+        prices = np.where(np.isfinite(px), px, 10.0)
+        ratios = R
+        base_min = np.where(rng.random(n) < 0.05, np.nan, base)
+        fin = np.isfinite(base_min)
+        buy_trig = (ratios >= base_min * (1.0 + b / 100.0)) & fin
+        sell_trig = (ratios <= base_min * (1.0 - s / 100.0)) & fin
+        day_starts = np.unique(np.r_[0, np.sort(rng.integers(0, n, int(rng.integers(0, 4))))]).astype(np.int64)
+        cfg = (10000.0, bool(rng.random() < 0.5), bool(rng.random() < 0.5), max(b, 0.1),
+               0.3, 10.0, 0.6, 10.0, 50.0, bool(rng.random() < 0.5))
+        rows, c_ref, s_ref = curve_reference(prices, ratios, base_min, buy_trig, sell_trig, day_starts, *cfg)
+        eq_s, eq_e, ntr, nb, ns, c_jit, s_jit = jk.curve_kernel(prices, ratios, base_min, buy_trig, sell_trig,
+                                                                 day_starts, *cfg)
+        got_rows = list(zip(eq_s.tolist(), eq_e.tolist(), ntr.tolist(), nb.tolist(), ns.tolist()))
+        if rows != got_rows or (c_ref, s_ref) != (c_jit, s_jit):
+            fails += 1
+            print("curve_kernel mismatch", rows[:2], got_rows[:2])
+
+        # Threshold Grid tab: every pair of one continuous run, surge from tier codes
+        init_cap, reinvest, surge_on = cfg[0], cfg[1], cfg[2]
+        buys, sells = [0.2, 0.5, 1.0], [0.3, 1.0]
+        sg = grid_surge(buys, sells, init_cap, *cfg[4:9]) if surge_on else None
+        cash_g, shares_g, trades_g = simulate_curve_grid(prices, ratios, base_min, buys, sells, init_cap, reinvest,
+                                                         surge=sg)
+        for k, (bb, ss) in enumerate((x, y) for x in buys for y in sells):
+            fin_b = (ratios >= base_min * (1.0 + bb / 100.0)) & fin
+            fin_s = (ratios <= base_min * (1.0 - ss / 100.0)) & fin
+            rows, c_ref, s_ref = curve_reference(prices, ratios, base_min, fin_b, fin_s, np.zeros(1, dtype=np.int64),
+                                                 init_cap, reinvest, surge_on, bb, *cfg[4:9], False)
+            if (c_ref, s_ref, rows[0][2]) != (cash_g[k], shares_g[k], trades_g[k]):
+                fails += 1
+                print("simulate_curve_grid mismatch", (c_ref, s_ref, rows[0][2]), (cash_g[k], shares_g[k], trades_g[k]))
+                break
+
+    print(f"{n_cases} cases x 8 kernels in {time.time() - t0:.1f}s (JIT={'on' if jk.HAVE_JIT else 'off'})")
+    print("PASS" if fails == 0 else f"FAIL: {fails} mismatches")
+    sys.exit(1 if fails else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Serial-vs-parallel check for walkforward.py.
+
+Builds random per-day action returns on a few 0.1% steps (so many training-window means tie exactly,
+which is what real exports look like) and runs walkforward_grid() once in-process and once over a
+process pool. Every config's table must be identical (dates, returns and equity compared with ==,
+not a tolerance): the parallel run cuts test days into slices whose windows start on different days,
+so any tie that breaks on float residue shows up here. Each config is also checked against
+walkforward_returns().
+
+    python verify_walkforward.py            # 8 random samples, 4 workers
+    python verify_walkforward.py 20 6       # more samples, more workers
+"""
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from walkforward import config_label, quantile_bins, walkforward_configs, walkforward_grid, walkforward_returns
+
+# a handful of 0.1% steps on one symbol: training means tie often, and their float sums depend on
+# which days were added and dropped to reach the window
+STEPS = np.array([-0.007, -0.003, -0.001, 0.001, 0.002, 0.003, 0.007])
+
+
+def random_base(rng, n_days=80, symbols=("RIOT",), grid=(0.3, 0.6, 0.9)):
+    rows = []
+    for i in range(n_days):
+        d = date(2025, 1, 2) + timedelta(days=i)
+        prev, over = rng.normal(), rng.normal()
+        for sym in symbols:
+            for method in ("EQUAL_MEAN", "VWAP_RATIO"):
+                for b in grid:
+                    for s in grid:
+                        if rng.random() < 0.1:
+                            continue
+                        ret = rng.choice(STEPS) if rng.random() > 0.05 else np.nan
+                        rows.append((sym, "RTH", d, method, b, s, ret, float(rng.integers(50, 100)),
+                                     prev if rng.random() > 0.05 else np.nan, over))
+    return pd.DataFrame(rows, columns=["symbol", "session", "et_date", "method", "buy_pct", "sell_pct",
+                                       "day_return", "confidence_10m", "btc_prev_ret", "btc_overnight_ret"])
+
+
+def same(a, b):
+    a = a.reset_index(drop=True)
+    b = b.reset_index(drop=True)
+    return (len(a) == len(b) and list(a["et_date"]) == list(b["et_date"])
+            and np.array_equal(a["day_return"].to_numpy(float), b["day_return"].to_numpy(float), equal_nan=True)
+            and np.array_equal(a["equity"].to_numpy(float), b["equity"].to_numpy(float), equal_nan=True))
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rng = np.random.default_rng(7)
+    reg_sets = [[], ["btc_prev_ret"], ["btc_prev_ret", "btc_overnight_ret"]]
+    fails = 0
+    t0 = time.time()
+    for k in range(samples):
+        base = random_base(rng)
+        constraints = {} if k % 2 == 0 else dict(min_support=3, conf_col="confidence_10m", conf_min=70.0)
+        # few enough configs that each is cut into several slices over the pool
+        configs = walkforward_configs([5, 20], [3 + k % 2], reg_sets, **constraints)
+        serial = walkforward_grid(base, configs, workers=1)
+        parallel = walkforward_grid(base, configs, workers=workers)
+        for cfg in configs:
+            label = f"sample {k} {config_label(cfg)}"
+            a = serial[serial["config"] == config_label(cfg)]
+            b = parallel[parallel["config"] == config_label(cfg)]
+            if not same(a, b):
+                fails += 1
+                print("serial/parallel mismatch", label)
+
+            b_ = base.copy()
+            keys = []
+            for rv in cfg["reg_vars"]:
+                b_[f"{rv}_bin"] = quantile_bins(b_[rv].to_numpy(np.float64), cfg["bins"])
+                keys.append(f"{rv}_bin")
+            ref = walkforward_returns(b_, keys, cfg["train_win"], min_support=cfg.get("min_support", 1),
+                                      conf_col=cfg.get("conf_col"), conf_min=cfg.get("conf_min"))
+            ref = ref.dropna(subset=["day_return"])
+            if list(ref["et_date"]) != list(a["et_date"]) or not np.array_equal(
+                    ref["day_return"].to_numpy(float), a["day_return"].to_numpy(float)):
+                fails += 1
+                print("grid/walkforward_returns mismatch", label)
+
+    print(f"{samples} samples, {workers} workers, {time.time() - t0:.1f}s")
+    print("PASS" if fails == 0 else f"FAIL: {fails} mismatches")
+    sys.exit(1 if fails else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# walkforward.py
+# Rolling walk-forward policy backtest over BitCorr daily actions (no Streamlit import here).
+#
+# For each test day the policy picks, from the previous `train_win` days, the action
+# (method, buy%, sell%) with the best mean day_return in the test day's regime bucket, and books
+# that action's mean return on the test day. Re-running a groupby over the whole training window
+# for every test day is O(days × window × rows). Here the window's statistics are kept per
+# (regime bucket, action) cell and updated as the window slides: the entering day's per-cell sums
+# are added and the leaving day's are subtracted, so the whole backtest is linear in the rows.
+#
+# Per cell: sum / count of day_return (NaN skipped, as in pandas mean), row count (the "support",
+# pandas size) and sum / count of the confidence column when one is given.
+#
+# Selection matches the analyzers' original loops:
+#  - best action per bucket: mean return desc, support desc (then mean confidence desc when a
+#    confidence column is given), ties to the first action in (method, buy%, sell%) order
+#  - optional constraints: support >= min_support, mean confidence >= conf_min
+#  - the test day's bucket is the per-field mode of its rows' bins; rows with a missing bin never
+#    enter the training statistics
+#  - the booked return is the mean over all of the test day's rows for the chosen action
+#
+# Adding and subtracting days leaves float residue in the window sums (a mean that is exactly
+# tied in a fresh groupby can differ in its last bits), so mean return and mean confidence are
+# rounded to MEAN_DIGITS significant digits before they are ranked or compared with conf_min.
+# Ties then break by action order as in the original loops, whatever day a window started on.
+#
+#  - walkforward_returns(): (et_date, day_return) per test day, NaN where no action applies
+#  - walkforward_configs(): (train window × bins × regime fields) parameter sets
+#  - walkforward_grid():    equity curves of many parameter sets in one run; the actions go into one
+#                           read-only shared-memory block and (config, test-day slice) jobs run in a
+#                           process pool (a slice warms its own window, so slices are independent)
+#  - grid_summary():        one row per parameter set of a walkforward_grid() table
+
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ACTION_KEYS = ["method", "buy_pct", "sell_pct"]
+MEAN_DIGITS = 12
+
+# ---------------- Encoding ----------------
+def _codes(frame: pd.DataFrame, cols: Sequence[str]) -> np.ndarray:
+    """Dense ids of the column combinations in sorted key order (-1 where a key is missing)."""
+    ids = frame.groupby(list(cols), sort=True, observed=True, dropna=True).ngroup()
+    return ids.fillna(-1).to_numpy(np.int64)
+
+def _day_cells(cell: np.ndarray, ret: np.ndarray, conf: Optional[np.ndarray]) -> Tuple[np.ndarray, ...]:
+    """Per-cell (ids, sum ret, n ret, size, sum conf, n conf) for one day's rows with cell >= 0."""
+    keep = cell >= 0
+    cell, ret = cell[keep], ret[keep]
+    u, inv = np.unique(cell, return_inverse=True)
+    ok = ~np.isnan(ret)
+    s = np.bincount(inv, weights=np.where(ok, ret, 0.0), minlength=len(u))
+    c = np.bincount(inv, weights=ok, minlength=len(u))
+    n = np.bincount(inv, minlength=len(u)).astype(np.float64)
+    if conf is None:
+        cs = cc = np.zeros(len(u))
+    else:
+        cf = conf[keep]
+        okc = ~np.isnan(cf)
+        cs = np.bincount(inv, weights=np.where(okc, cf, 0.0), minlength=len(u))
+        cc = np.bincount(inv, weights=okc, minlength=len(u))
+    return u, s, c, n, cs, cc
+
+def _round_sig(x: np.ndarray, digits: int = MEAN_DIGITS) -> np.ndarray:
+    """x rounded to `digits` significant digits (zeros and NaN unchanged)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ok = np.isfinite(x) & (x != 0)
+        scale = 10.0 ** (digits - 1 - np.floor(np.log10(np.abs(np.where(ok, x, 1.0)))))
+        return np.where(ok, np.round(x * scale) / scale, x)
+
+def _mode(values: np.ndarray) -> float:
+    v = values[~np.isnan(values)]
+    if not len(v):
+        return np.nan
+    u, cnt = np.unique(v, return_counts=True)
+    return float(u[np.argmax(cnt)])  # smallest of the most frequent, as Series.mode().iloc[0]
+
+# ---------------- Walk-forward ----------------
+def _day_index(et_date: pd.Series) -> Tuple[np.ndarray, pd.Index, np.ndarray]:
+    """Row order that groups rows by day, the sorted distinct days and each day's row range."""
+    day_id, days = pd.factorize(et_date, sort=True)
+    order = np.argsort(day_id, kind="stable")
+    starts = np.searchsorted(day_id[order], np.arange(len(days) + 1))
+    return order, days, starts
+
+def _walk(starts: np.ndarray, ret: np.ndarray, act: np.ndarray, bins: np.ndarray,
+          conf: Optional[np.ndarray], train_win: int, first: int, last: int,
+          min_support: int = 1, conf_min: Optional[float] = None) -> np.ndarray:
+    """
+    Booked returns of test days first..last-1 (day indices into starts, first >= train_win) over
+    rows already grouped by day. Only the rows of days first - train_win .. last - 1 are read, so a
+    slice of the test days can run on its own: the window is filled from the slice's first test day.
+    """
+    lo = starts[first - train_win]
+    hi = starts[last]
+    starts = starts - lo
+    ret, act, bins = ret[lo:hi], act[lo:hi], bins[lo:hi]
+    if conf is not None:
+        conf = conf[lo:hi]
+    n_keys = bins.shape[1]
+
+    if n_keys:
+        valid = ~np.isnan(bins).any(axis=1)
+        uniq, inv = np.unique(bins[valid], axis=0, return_inverse=True)
+        reg = np.full(len(bins), -1, dtype=np.int64)
+        reg[valid] = inv.ravel()
+        reg_index: Dict[tuple, int] = {tuple(r): i for i, r in enumerate(uniq.tolist())}
+    else:
+        reg = np.zeros(len(ret), dtype=np.int64)
+        reg_index = {(): 0}
+
+    n_act = int(act.max()) + 1 if len(act) and act.max() >= 0 else 1
+    pair = np.where((reg >= 0) & (act >= 0), reg * n_act + act, -1)
+    cell = np.full(len(pair), -1, dtype=np.int64)
+    ok = pair >= 0
+    pair_ids, cell[ok] = np.unique(pair[ok], return_inverse=True)
+    cell_reg, cell_act = pair_ids // n_act, pair_ids % n_act
+    # cells of each bucket, in action order (pair_ids are sorted by bucket, then action)
+    reg_starts = np.searchsorted(cell_reg, np.arange(len(reg_index) + 1))
+
+    n_cells = len(pair_ids)
+    S, C, N, CS, CC = (np.zeros(n_cells) for _ in range(5))
+    per_day: Dict[int, Tuple[np.ndarray, ...]] = {}
+
+    def shift(d: int, sign: float) -> None:
+        if d not in per_day:
+            a, b = starts[d], starts[d + 1]
+            per_day[d] = _day_cells(cell[a:b], ret[a:b], None if conf is None else conf[a:b])
+        u, s, c, n, cs, cc = per_day.pop(d) if sign < 0 else per_day[d]
+        S[u] += sign * s
+        C[u] += sign * c
+        N[u] += sign * n
+        CS[u] += sign * cs
+        CC[u] += sign * cc
+
+    for d in range(first - train_win, first):
+        shift(d, 1.0)
+
+    out = np.full(last - first, np.nan)
+    for i in range(first, last):
+        a, b = starts[i], starts[i + 1]
+        key = tuple(_mode(bins[a:b, j]) for j in range(n_keys))
+        r = reg_index.get(key) if not any(np.isnan(key)) else None
+        if r is not None:
+            cells = np.arange(reg_starts[r], reg_starts[r + 1])
+            n = np.round(N[cells])
+            live = n > 0.5
+            if min_support > 1:
+                live &= n >= min_support
+            with np.errstate(invalid="ignore", divide="ignore"):
+                avg = _round_sig(np.where(C[cells] > 0.5, S[cells] / C[cells], np.nan))
+                mconf = _round_sig(np.where(CC[cells] > 0.5, CS[cells] / CC[cells], np.nan))
+            if conf_min is not None:
+                live &= mconf >= float(conf_min)
+            cells, avg, n, mconf = cells[live], avg[live], n[live], mconf[live]
+            if len(cells):
+                sort_keys = [cell_act[cells]]
+                if conf is not None:
+                    sort_keys += [-np.nan_to_num(mconf, nan=0.0), np.isnan(mconf)]
+                sort_keys += [-n, -np.nan_to_num(avg, nan=0.0), np.isnan(avg)]
+                pick = cell_act[cells[np.lexsort(sort_keys)[0]]]
+                sel = ret[a:b][act[a:b] == pick]
+                sel = sel[~np.isnan(sel)]
+                if len(sel):
+                    out[i - first] = sel.mean()
+        if i + 1 < last:
+            shift(i, 1.0)
+            shift(i - train_win, -1.0)
+    return out
+
+def walkforward_returns(base: pd.DataFrame, key_cols: Sequence[str], train_win: int,
+                        min_support: int = 1, conf_col: Optional[str] = None,
+                        conf_min: Optional[float] = None) -> pd.DataFrame:
+    """
+    Walk-forward over the sorted distinct et_date of base (needs key_cols, ACTION_KEYS, day_return
+    and conf_col when given). Returns one row per test day (et_date, day_return), NaN where the day
+    has no bucket or no training action passes the constraints.
+    """
+    train_win = int(train_win)
+    order, days, starts = _day_index(base["et_date"])
+    ret = base["day_return"].to_numpy(np.float64)[order]
+    conf = base[conf_col].to_numpy(np.float64)[order] if conf_col else None
+    act = _codes(base, ACTION_KEYS)[order]
+    bins = base[list(key_cols)].to_numpy(np.float64)[order] if key_cols else np.empty((len(ret), 0))
+    if train_win >= len(days):
+        out = np.empty(0)
+    else:
+        out = _walk(starts, ret, act, bins, conf, train_win, train_win, len(days),
+                    min_support=min_support, conf_min=conf_min)
+    return pd.DataFrame({"et_date": list(days[train_win:]), "day_return": out})
+
+# ---------------- Parameter grid over a process pool ----------------
+def config_label(cfg: dict) -> str:
+    fields = "+".join(cfg.get("reg_vars") or []) or "no regime"
+    return f"win {int(cfg['train_win'])} · {int(cfg['bins'])} bins · {fields}"
+
+def walkforward_configs(train_wins: Sequence[int], bins_list: Sequence[int],
+                        reg_sets: Sequence[Sequence[str]], **constraints) -> List[dict]:
+    """Every (train_win, bins, regime fields) combination; constraints (min_support, conf_col, conf_min) apply to all."""
+    return [dict(constraints, train_win=int(w), bins=int(b), reg_vars=list(rs))
+            for w in train_wins for b in bins_list for rs in reg_sets]
+
+def quantile_bins(x: np.ndarray, bins: int) -> np.ndarray:
+    """Quantile bin codes of x over the whole sample (NaN where x is missing or binning fails)."""
+    s = pd.Series(x).replace([np.inf, -np.inf], np.nan)
+    try:
+        return pd.qcut(s, q=int(bins), labels=False, duplicates="drop").to_numpy(np.float64)
+    except Exception:
+        return np.full(len(x), np.nan)
+
+def _pack(base: pd.DataFrame, configs: Sequence[dict]) -> Tuple[np.ndarray, Dict[str, int], pd.Index, np.ndarray]:
+    """
+    One (fields, rows) float64 block with rows grouped by day: day_return, action id, then every
+    regime field and confidence column the configs use. Returns (block, {field: row}, days, starts).
+    """
+    order, days, starts = _day_index(base["et_date"])
+    fields = ["day_return", "_action"]
+    for cfg in configs:
+        for c in list(cfg.get("reg_vars") or []) + ([cfg["conf_col"]] if cfg.get("conf_col") else []):
+            if c not in fields:
+                fields.append(c)
+    block = np.empty((len(fields), len(base)))
+    for j, c in enumerate(fields):
+        col = _codes(base, ACTION_KEYS) if c == "_action" else base[c].to_numpy(np.float64)
+        block[j] = col[order]
+    return block, {c: j for j, c in enumerate(fields)}, days, starts
+
+def _walk_config(block: np.ndarray, rows: Dict[str, int], starts: np.ndarray, cfg: dict,
+                 first: int, last: int) -> np.ndarray:
+    reg_vars = list(cfg.get("reg_vars") or [])
+    bins = np.empty((block.shape[1], len(reg_vars)))
+    for j, rv in enumerate(reg_vars):
+        bins[:, j] = quantile_bins(block[rows[rv]], cfg["bins"])
+    conf_col = cfg.get("conf_col")
+    return _walk(starts, block[rows["day_return"]], block[rows["_action"]].astype(np.int64), bins,
+                 block[rows[conf_col]] if conf_col else None, int(cfg["train_win"]), first, last,
+                 min_support=int(cfg.get("min_support") or 1), conf_min=cfg.get("conf_min"))
+
+def _share(arr: np.ndarray) -> Tuple[SharedMemory, dict]:
+    shm = SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, {"name": shm.name, "shape": arr.shape, "dtype": arr.dtype.str}
+
+def _attach(spec: dict) -> Tuple[SharedMemory, np.ndarray]:
+    try:
+        shm = SharedMemory(name=spec["name"], track=False)  # Python 3.13+: the parent owns the segment
+    except TypeError:
+        shm = SharedMemory(name=spec["name"])
+    return shm, np.ndarray(spec["shape"], dtype=np.dtype(spec["dtype"]), buffer=shm.buf)
+
+def _run_slice(job: tuple) -> np.ndarray:
+    """Worker: attach to the shared actions block and walk one config over test days first..last-1."""
+    spec, rows, starts, cfg, first, last = job
+    shm, block = _attach(spec)
+    try:
+        return _walk_config(block, rows, starts, cfg, first, last)
+    finally:
+        # Views must go before the mapping can be closed
+        del block
+        shm.close()
+
+def walkforward_grid(base: pd.DataFrame, configs: Sequence[dict], start_capital: float = 1.0,
+                     workers: int = 1, progress: Optional[Callable[[int, int], None]] = None,
+                     should_stop: Optional[Callable[[], bool]] = None) -> pd.DataFrame:
+    """
+    Walk-forward equity curves for several configs (dicts from walkforward_configs()) in one run.
+    base needs et_date, ACTION_KEYS, day_return and the configs' raw regime / confidence columns;
+    each config bins its regime fields into quantiles over the whole of base.
+
+    With workers > 1 the actions are copied once into a shared-memory block and every config's test
+    days are cut into slices (about two jobs per worker overall) that run in a process pool; each
+    slice rebuilds its own training window, so slices are independent.
+
+    Returns a long table (config, train_win, bins, reg_vars, et_date, day_return, equity) with the
+    days a config skips left out, as the single-config backtests do. If should_stop() turns true,
+    configs with unfinished slices are dropped.
+    """
+    configs = list(configs)
+    cols = ["config", "train_win", "bins", "reg_vars", "et_date", "day_return", "equity"]
+    if base.empty or not configs:
+        return pd.DataFrame(columns=cols)
+    workers = max(1, int(workers))
+    block, rows, days, starts = _pack(base, configs)
+    n_days = len(days)
+
+    n_slices = max(1, math.ceil(2 * workers / len(configs))) if workers > 1 else 1
+    jobs: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    for ci, cfg in enumerate(configs):
+        tw = int(cfg["train_win"])
+        if tw >= n_days:
+            continue
+        bounds = np.linspace(tw, n_days, min(n_slices, n_days - tw) + 1).astype(int)
+        for a, z in zip(bounds[:-1], bounds[1:]):
+            if z > a:
+                jobs[(ci, int(a))] = (int(a), int(z))
+
+    out: Dict[Tuple[int, int], np.ndarray] = {}
+    if workers == 1 or len(jobs) <= 1:
+        for done, (key, (a, z)) in enumerate(jobs.items(), start=1):
+            out[key] = _walk_config(block, rows, starts, configs[key[0]], a, z)
+            if progress:
+                progress(done, len(jobs))
+            if should_stop and done < len(jobs) and should_stop():
+                break
+    else:
+        shm, spec = _share(block)
+        del block
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                futs = {pool.submit(_run_slice, (spec, rows, starts, configs[key[0]], a, z)): key
+                        for key, (a, z) in jobs.items()}
+                for done, fut in enumerate(as_completed(futs), start=1):
+                    out[futs[fut]] = fut.result()
+                    if progress:
+                        progress(done, len(futs))
+                    if should_stop and done < len(futs) and should_stop():
+                        for f in futs:
+                            f.cancel()
+                        break
+        finally:
+            shm.close()
+            shm.unlink()
+
+    parts = []
+    for ci, cfg in enumerate(configs):
+        keys = sorted(k for k in jobs if k[0] == ci)
+        if not keys or any(k not in out for k in keys):
+            continue
+        tw = int(cfg["train_win"])
+        ret = pd.Series(np.concatenate([out[k] for k in keys]))
+        part = pd.DataFrame({"et_date": list(days[tw:]), "day_return": ret}).dropna()
+        part["equity"] = (1.0 + part["day_return"]).cumprod().to_numpy() * float(start_capital)
+        part.insert(0, "config", config_label(cfg))
+        part.insert(1, "train_win", tw)
+        part.insert(2, "bins", int(cfg["bins"]))
+        part.insert(3, "reg_vars", "+".join(cfg.get("reg_vars") or []))
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(parts, ignore_index=True)[cols]
+
+def grid_summary(table: pd.DataFrame) -> pd.DataFrame:
+    """One row per config of a walkforward_grid() table: days traded, final equity, return and drawdown."""
+    rows = []
+    for label, g in table.groupby("config", sort=False):
+        eq = g["equity"].to_numpy()
+        r = g["day_return"].to_numpy()
+        sd = np.nanstd(r)
+        peak = np.maximum.accumulate(eq)
+        rows.append({"config": label, "train_win": g["train_win"].iloc[0], "bins": g["bins"].iloc[0],
+                     "reg_vars": g["reg_vars"].iloc[0], "days": len(g), "final_equity": eq[-1],
+                     "total_return": float(np.prod(1.0 + r) - 1.0),
+                     "sharpe_like": float(np.nanmean(r) / sd) if sd and np.isfinite(sd) else 0.0,
+                     "max_drawdown": float(np.min(eq / peak - 1.0))})
+    return pd.DataFrame(rows).sort_values("final_equity", ascending=False, ignore_index=True)